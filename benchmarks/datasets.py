@@ -0,0 +1,119 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from models.columnar import DEFAULT_CACHE_DIR
+
+DEFAULT_DATA_DIR = os.path.join(DEFAULT_CACHE_DIR, "benchmarks")
+
+MB = 1024 ** 2
+
+# Columns of data/Sales Funnel.csv.
+BASE_COLUMNS = ["lead_id", "month", "leads_source", "trial_attended", "followup_done", "subscribed"]
+LEAD_SOURCES = ["website", "ads", "referral", "email", "event", "partner"]
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Synthetic CSV shaped like the Sales Funnel sample, widened with mixed-dtype columns."""
+    target_bytes: int
+    n_columns: int = 10
+    chunk_rows: int = 100_000
+
+
+DATASETS = {
+    "10mb": DatasetSpec(10 * MB),
+    "100mb": DatasetSpec(100 * MB),
+    "1gb": DatasetSpec(1024 * MB),
+    "4gb": DatasetSpec(4096 * MB),
+    "wide": DatasetSpec(50 * MB, n_columns=1000, chunk_rows=2_000),
+}
+
+
+def sales_funnel_chunk(rows: int, start_id: int, n_columns: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Generate `rows` leads with the Sales Funnel columns plus mixed-dtype extras.
+
+    Extra columns cycle through float (with ~5% missing), int, low-cardinality
+    string and date columns, so wide datasets exercise every summary path.
+    """
+    trial = rng.random(rows) < 0.45
+    followup = rng.random(rows) < np.where(trial, 0.6, 0.3)
+    subscribed = rng.random(rows) < np.where(trial & followup, 0.5, 0.1)
+    data = {
+        "lead_id": np.arange(start_id, start_id + rows),
+        "month": np.char.add("2025-", np.char.zfill(rng.integers(1, 13, rows).astype(str), 2)),
+        "leads_source": rng.choice(LEAD_SOURCES, rows, p=[0.4, 0.2, 0.15, 0.1, 0.1, 0.05]),
+        "trial_attended": trial.astype(np.int8),
+        "followup_done": followup.astype(np.int8),
+        "subscribed": subscribed.astype(np.int8),
+    }
+    for i in range(max(n_columns - len(BASE_COLUMNS), 0)):
+        kind = i % 4
+        if kind == 0:
+            values = rng.lognormal(6, 1, rows).round(2)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"deal_value_{i}"] = values
+        elif kind == 1:
+            data[f"touchpoints_{i}"] = rng.poisson(4, rows)
+        elif kind == 2:
+            data[f"segment_{i}"] = rng.choice(["smb", "mid", "enterprise", "public"], rows)
+        else:
+            days = rng.integers(0, 365, rows)
+            data[f"contact_date_{i}"] = (np.datetime64("2025-01-01") + days).astype(str)
+    return pd.DataFrame(data)
+
+
+def ensure_dataset(name: str, directory: Optional[str] = None, seed: int = 0) -> str:
+    """
+    Return the path of a generated dataset, writing it on first use.
+
+    Files are written chunk by chunk until they reach the spec's size, so
+    multi-GB datasets never have to fit in memory. The same name and seed
+    always produce the same file.
+    """
+    spec = DATASETS[name]
+    directory = directory or DEFAULT_DATA_DIR
+    path = os.path.join(directory, f"sales_funnel_{name}_seed{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tmp = path + ".tmp"
+    written = 0
+    next_id = 1001
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        while written < spec.target_bytes:
+            chunk = sales_funnel_chunk(spec.chunk_rows, next_id, spec.n_columns, rng)
+            text = chunk.to_csv(index=False, header=next_id == 1001)
+            f.write(text)
+            written += len(text)
+            next_id += spec.chunk_rows
+    os.replace(tmp, path)
+    return path
+
+
+def large_reply(n_sections: int = 200, seed: int = 0) -> str:
+    """A long model reply alternating prose with python, sql and unlabelled code fences."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(n_sections):
+        parts.append(
+            f"Step {i}: the conversion rate for {rng.choice(LEAD_SOURCES)} leads looks "
+            f"{rng.choice(['higher', 'lower', 'flat'])} than average, so we compare it by month.\n"
+        )
+        if i % 3 == 0:
+            parts.append(
+                "```python\n"
+                "import seaborn as sns\nimport matplotlib.pyplot as plt\n"
+                f"rate = df.groupby('month')['subscribed'].mean()  # section {i}\n"
+                "sns.lineplot(x=rate.index, y=rate.values)\nplt.show()\n"
+                "```\n"
+            )
+        elif i % 3 == 1:
+            parts.append("```\nmonth   rate\n2025-01 0.12\n```\n")
+    return "".join(parts)
@@ -0,0 +1,275 @@
+"""
+Local stand-ins for the Gemini client and the GPT4All model.
+
+They implement only the surface the apps use, with configurable latency and
+canned replies, so load tests can run without network access or model files.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Iterator, Optional
+
+CANNED_REPLIES = [
+    "Most leads come from the website, but referrals convert best. "
+    "Compare conversion by source next.",
+    "Here is the conversion rate by lead source.\n"
+    "```python\n"
+    "import seaborn as sns\nimport matplotlib.pyplot as plt\n"
+    "rate = df.groupby('leads_source', as_index=False)['subscribed'].mean()\n"
+    "plt.figure(figsize=(10, 6))\n"
+    "sns.barplot(data=rate, x='leads_source', y='subscribed', hue='leads_source', legend=False)\n"
+    "plt.title('Conversion rate by lead source')\nplt.show()\n"
+    "```\n"
+    "Referral leads subscribe most often.",
+    "Monthly subscriptions:\n"
+    "```python\n"
+    "import seaborn as sns\nimport matplotlib.pyplot as plt\n"
+    "plt.figure(figsize=(10, 6))\n"
+    "sns.countplot(data=df, x='month', hue='subscribed')\nplt.show()\n"
+    "```",
+    "Trial attendance and follow-ups by outcome:\n"
+    "```python\n"
+    "print(df.groupby('subscribed')[['trial_attended', 'followup_done']].mean())\n"
+    "```",
+]
+
+
+class FakeLatency:
+    """Latency model: a fixed time to first token plus a per-chunk delay, with jitter."""
+
+    def __init__(self, first_token_s: float = 0.5, per_chunk_s: float = 0.02, jitter: float = 0.2,
+                 seed: Optional[int] = None):
+        self.first_token_s = first_token_s
+        self.per_chunk_s = per_chunk_s
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float) -> float:
+        with self._lock:
+            return seconds * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def _usage(prompt: str, reply: str, cached: bool) -> SimpleNamespace:
+    prompt_tokens = max(len(prompt) // 4, 1)
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=max(len(reply) // 4, 1),
+        cached_content_token_count=prompt_tokens if cached else None,
+        total_token_count=prompt_tokens + max(len(reply) // 4, 1),
+    )
+
+
+def _chunks(text: str, size: int = 24) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class _Replies:
+    def __init__(self, replies: list[str]):
+        self._cycle = itertools.cycle(replies)
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            return next(self._cycle)
+
+
+class FakeAsyncChat:
+    def __init__(self, client: "FakeGeminiClient", config: Any, history: Optional[list]):
+        self.client = client
+        self.config = config
+        self._history = list(history or [])
+
+    def get_history(self) -> list:
+        return list(self._history)
+
+    async def send_message(self, message: str) -> SimpleNamespace:
+        reply = await self.client._complete()
+        self._history += [message, reply]
+        return SimpleNamespace(text=reply, usage_metadata=_usage(message, reply, self.client._is_cached(self.config)))
+
+    async def send_message_stream(self, message: str) -> AsyncIterator[SimpleNamespace]:
+        reply = self.client.replies.next()
+        latency = self.client.latency
+        await self.client._acquire()
+
+        async def stream() -> AsyncIterator[SimpleNamespace]:
+            try:
+                await asyncio.sleep(latency.sample(latency.first_token_s))
+                pieces = _chunks(reply)
+                for i, piece in enumerate(pieces):
+                    usage = _usage(message, reply, self.client._is_cached(self.config)) if i == len(pieces) - 1 else None
+                    yield SimpleNamespace(text=piece, usage_metadata=usage)
+                    await asyncio.sleep(latency.sample(latency.per_chunk_s))
+                self._history += [message, reply]
+            finally:
+                self.client._release()
+
+        return stream()
+
+
+class FakeGeminiClient:
+    """
+    Duck-typed `google.genai.Client`: `aio.chats.create`, `aio.models.generate_content` and `caches`.
+
+    `max_concurrency` models the provider's parallel capacity; requests
+    beyond it queue. `error_rate` makes a fraction of calls fail with a 429
+    so retry behaviour can be exercised.
+    """
+
+    def __init__(self, latency: Optional[FakeLatency] = None, replies: Optional[list[str]] = None,
+                 max_concurrency: Optional[int] = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency or FakeLatency(seed=seed)
+        self.replies = _Replies(replies or CANNED_REPLIES)
+        self.max_concurrency = max_concurrency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache_names: set[str] = set()
+        self.aio = SimpleNamespace(
+            chats=SimpleNamespace(create=self._create_chat),
+            models=SimpleNamespace(generate_content=self._generate_content),
+        )
+        self.caches = SimpleNamespace(create=self._create_cache, update=self._update_cache, delete=self._delete_cache)
+
+    def _create_chat(self, model: str, config: Any = None, history: Optional[list] = None) -> FakeAsyncChat:
+        return FakeAsyncChat(self, config, history)
+
+    async def _generate_content(self, model: str, contents: Any, config: Any = None) -> SimpleNamespace:
+        reply = await self._complete()
+        return SimpleNamespace(text=reply, usage_metadata=_usage(str(contents), reply, self._is_cached(config)))
+
+    async def _acquire(self) -> None:
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise FakeRateLimitError()
+        if self.max_concurrency:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            await self._semaphore.acquire()
+
+    def _release(self) -> None:
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def _complete(self) -> str:
+        reply = self.replies.next()
+        await self._acquire()
+        try:
+            chunks = len(_chunks(reply))
+            await asyncio.sleep(self.latency.sample(self.latency.first_token_s + chunks * self.latency.per_chunk_s))
+        finally:
+            self._release()
+        return reply
+
+    def _is_cached(self, config: Any) -> bool:
+        name = config.get("cached_content") if isinstance(config, dict) else getattr(config, "cached_content", None)
+        return name in self._cache_names
+
+    def _create_cache(self, model: str, config: dict) -> SimpleNamespace:
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        self._cache_names.add(name)
+        return SimpleNamespace(name=name)
+
+    def _update_cache(self, name: str, config: dict) -> None:
+        if name not in self._cache_names:
+            raise KeyError(name)
+
+    def _delete_cache(self, name: str) -> None:
+        self._cache_names.discard(name)
+
+
+class FakeRateLimitError(Exception):
+    code = 429
+
+
+class ContextMismatchError(RuntimeError):
+    """Raised by FakeGPT4All when its context does not hold the conversation it is asked to continue."""
+
+
+class FakeGPT4All:
+    """
+    Duck-typed `gpt4all.GPT4All`: `chat_session`, `generate` and `current_chat_session`.
+
+    Like gpt4all, `generate` feeds only the newest message to the model and
+    resets the context (re-ingesting the system prompt) only while the chat
+    holds just the system message; setting `current_chat_session` changes
+    the history but not what the model has ingested. The fake tracks that
+    context and raises `ContextMismatchError` when a generation would
+    continue a different conversation than the chat history, which is what
+    a server that moves sessions between instances must not do.
+
+    Generation holds a lock for its whole duration, like one llama.cpp
+    context serving every session. Ingesting the system prompt costs
+    `prefill_s_per_kchar` per 1000 characters, like prompt ingestion on CPU.
+    """
+
+    def __init__(self, latency: Optional[FakeLatency] = None, replies: Optional[list[str]] = None,
+                 prefill_s_per_kchar: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency or FakeLatency(first_token_s=1.0, per_chunk_s=0.05, seed=seed)
+        self.replies = _Replies(replies or CANNED_REPLIES)
+        self.prefill_s_per_kchar = prefill_s_per_kchar
+        self.prefills = 0
+        self._history: Optional[list[dict[str, str]]] = None
+        self._context: list[str] = []  # what the model has ingested, in order; survives chat sessions
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def chat_session(self, system_prompt: str = "") -> Iterator["FakeGPT4All"]:
+        self._history = [{"role": "system", "content": system_prompt}]
+        try:
+            yield self
+        finally:
+            self._history = None
+
+    def _prefill(self, system_prompt: str) -> None:
+        time.sleep(self.prefill_s_per_kchar * len(system_prompt) / 1000)
+        self.prefills += 1
+        self._context = [system_prompt]
+
+    @property
+    def current_chat_session(self) -> list[dict[str, str]]:
+        return [] if self._history is None else [dict(message) for message in self._history]
+
+    @current_chat_session.setter
+    def current_chat_session(self, history: list[dict[str, str]]) -> None:
+        if self._history is None:
+            raise ValueError("current_chat_session may only be set when there is an active chat session")
+        self._history[:] = [dict(message) for message in history]
+
+    def generate(self, prompt: str, max_tokens: int = 200, streaming: bool = False, callback: Any = None,
+                 **kwargs: Any) -> Any:
+        reply = self.replies.next()
+        pieces = _chunks(reply)
+
+        def tokens() -> Iterator[str]:
+            with self._lock:
+                if self._history is None:
+                    self._context = []
+                else:
+                    system_prompt = self._history[0]["content"]
+                    if len(self._history) == 1 and self._context != [system_prompt]:
+                        self._prefill(system_prompt)
+                    if self._context != [message["content"] for message in self._history]:
+                        raise ContextMismatchError("the model's context holds a different conversation")
+                    self._history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": ""}]
+                self._context.append(prompt)
+                self._context.append("")
+                time.sleep(self.latency.sample(self.latency.first_token_s))
+                for i, piece in enumerate(pieces):
+                    time.sleep(self.latency.sample(self.latency.per_chunk_s))
+                    self._context[-1] += piece
+                    if self._history is not None:
+                        self._history[-1]["content"] += piece
+                    if callback is not None and callback(i, piece) is False:
+                        return
+                    yield piece
+
+        return tokens() if streaming else "".join(tokens())
+
@@ -0,0 +1,343 @@
+"""
+Headless multi-session load test of the chat pipeline against a local fake LLM.
+
+    python -m benchmarks.loadtest --sessions 1 4 16 64
+    python -m benchmarks.loadtest --sessions 32 --backend gpt4all --first-token 1.5
+
+Each simulated session does what a browser session of streamlit_chatbot_api.py
+does: load the uploaded CSV through the shared dataset cache, build the
+schema context and system prompt, get the opening suggestion (coalesced
+across sessions), then ask a scripted mix of questions. Replies are streamed
+through the shared LLM gateway, code runs as soon as its fence closes and
+figures are rendered to PNG and kept in the shared artifact store. Sessions run on their
+own threads, as Streamlit runs each session's script.
+
+The Streamlit runtime itself is not involved (its test harness cannot drive
+file uploads), so the numbers cover the pipeline, not websocket overhead.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.datasets import DATASETS, ensure_dataset  # noqa: E402
+from benchmarks.fake_llm import FakeGeminiClient, FakeGPT4All, FakeLatency  # noqa: E402
+from models.artifact_store import ArtifactStore  # noqa: E402
+from models.code_validator import validate_code  # noqa: E402
+from models.context_cache import ContextCacheManager  # noqa: E402
+from models.dataset_registry import DatasetRegistry  # noqa: E402
+from models.llm_gateway import LLMGateway  # noqa: E402
+from models.local_model_server import LocalModelServer  # noqa: E402
+from models.profiling import DatasetProfile, profile_dataframe  # noqa: E402
+from models.prompt_template import prompt_seaborn_analyst  # noqa: E402
+from models.response_cache import CachedResponse, ResponseCache, schema_fingerprint  # noqa: E402
+from models.sandbox import SandboxPool, process_rss_bytes  # noqa: E402
+from models.schema_context import build_schema_context  # noqa: E402
+from models.single_flight import SingleFlight, request_key  # noqa: E402
+from models.streaming import iter_stream_events  # noqa: E402
+from models.utils import execute_python_code, extract_python_code_blocks  # noqa: E402
+from models.versioned_frame import VersionedFrame  # noqa: E402
+
+MODEL = "fake-gemini"
+OPENING_MESSAGE = "with the data provided, what is your suggestion?"
+
+SCRIPTED_QUESTIONS = [
+    "Which lead source converts best? Show me the plot.",
+    "How many leads do we get per month? Create the visualization.",
+    "Does attending a trial matter for subscription?",
+    "Show me the plot of subscriptions by month.",
+    "Summarize the funnel drop-off.",
+    "Which lead source converts best? Show me the plot.",  # repeats exercise the response cache
+]
+
+
+@dataclass
+class SessionResult:
+    opening_s: float = 0.0
+    turn_latencies: list[float] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    state_bytes: int = 0
+
+
+class Pipeline:
+    """Process-wide resources shared by every simulated session, like the apps' st.cache_resource getters."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        latency = FakeLatency(args.first_token, args.per_chunk, args.jitter, seed=args.seed)
+        self.datasets = DatasetRegistry()
+        self.artifacts = ArtifactStore()
+        self.single_flight: SingleFlight[str] = SingleFlight()
+        self.response_cache = ResponseCache(path=args.response_cache) if args.response_cache else None
+        self.sandbox = SandboxPool(size=args.sandbox) if args.sandbox else None
+        self._profiles: dict[str, DatasetProfile] = {}
+        self._lock = threading.Lock()
+        if args.backend == "gemini":
+            client = FakeGeminiClient(latency, max_concurrency=args.provider_concurrency,
+                                      error_rate=args.error_rate, seed=args.seed)
+            self.gateway = LLMGateway(client, max_concurrency=args.gateway_concurrency,
+                                      requests_per_minute=args.requests_per_minute, base_delay=0.1)
+            self.context_cache = ContextCacheManager(client)
+        else:
+            self.model_server = LocalModelServer(
+                lambda: FakeGPT4All(latency, prefill_s_per_kchar=args.prefill_per_kchar, seed=args.seed),
+                instances=args.local_instances, max_queue_depth=args.local_queue_depth,
+            )
+
+    def profile(self, df: pd.DataFrame, fingerprint: str) -> DatasetProfile:
+        with self._lock:
+            profile = self._profiles.get(fingerprint)
+        if profile is None:
+            profile = profile_dataframe(df, max_workers=4)
+            with self._lock:
+                self._profiles[fingerprint] = profile
+        return profile
+
+    def execute(self, code: str, df: pd.DataFrame, fingerprint: str, session_id: str) -> tuple[Optional[str], Optional[str]]:
+        validation = validate_code(code, df.columns, n_rows=len(df))
+        if not validation.ok:
+            return f"❌ {validation.feedback()}", None
+        code = validation.code
+        if self.sandbox is not None:
+            output, _, figure = self.sandbox.execute(code, df, key=fingerprint)
+        else:
+            output, _, figure = execute_python_code(code, df)
+        figure_id = self.artifacts.put_figure(session_id, figure) if figure is not None else None
+        return output, figure_id
+
+    def close(self) -> None:
+        if self.sandbox is not None:
+            self.sandbox.close()
+        if self.args.backend == "gemini":
+            self.gateway.close()
+        else:
+            self.model_server.close()
+
+
+def run_gemini_session(pipeline: Pipeline, csv_path: str, questions: list[str]) -> SessionResult:
+    result = SessionResult()
+    started = time.perf_counter()
+    df, error, fingerprint = pipeline.datasets.load(csv_path)
+    if df is None:
+        result.errors.append(f"load: {error}")
+        return result
+    context = build_schema_context(df, pipeline.profile(df, fingerprint))
+    system_instruction = prompt_seaborn_analyst.format(df_info=context.text, df_head=context.head)
+    cached_content = pipeline.context_cache.get_cache_name(MODEL, fingerprint, system_instruction)
+    config = {"cached_content": cached_content} if cached_content else {"system_instruction": system_instruction}
+    gateway = pipeline.gateway
+
+    opening, _ = pipeline.single_flight.do(
+        request_key(MODEL, system_instruction, OPENING_MESSAGE),
+        lambda: gateway.generate(MODEL, OPENING_MESSAGE, config=config).text,
+    )
+    chat = gateway.create_chat(MODEL, config=config, history=[OPENING_MESSAGE, opening])
+    dataset = VersionedFrame(df, fingerprint)
+    session_id = uuid.uuid4().hex
+    result.opening_s = time.perf_counter() - started
+
+    schema_fp = schema_fingerprint(df)
+    asked: list[str] = []
+    for question in questions:
+        time.sleep(pipeline.args.think_time)
+        turn_started = time.perf_counter()
+        try:
+            key = ResponseCache.make_key(MODEL, schema_fp, fingerprint, question, asked)
+            asked.append(question)
+            if pipeline.response_cache is not None and pipeline.response_cache.get(key) is not None:
+                result.turn_latencies.append(time.perf_counter() - turn_started)
+                continue
+            chunks = (chunk.text or "" for chunk in gateway.stream_message(chat, question))
+            reply = []
+            for kind, text in iter_stream_events(chunks):
+                reply.append(text)
+                if kind == "code":
+                    output, _ = pipeline.execute(text, dataset.checkout(), fingerprint, session_id)
+                    if output and output.startswith("❌"):
+                        result.errors.append(f"exec: {output[:80]}")
+            if pipeline.response_cache is not None:
+                pipeline.response_cache.put(key, CachedResponse("".join(reply), None, None, None, None))
+        except Exception as e:
+            result.errors.append(f"turn: {type(e).__name__}: {e}")
+        result.turn_latencies.append(time.perf_counter() - turn_started)
+
+    result.state_bytes = (
+        dataset.memory()["owned_bytes"] + pipeline.artifacts.footprint(session_id)["resident_bytes"]
+    )
+    return result
+
+
+def run_gpt4all_session(pipeline: Pipeline, csv_path: str, questions: list[str]) -> SessionResult:
+    result = SessionResult()
+    started = time.perf_counter()
+    df, error, fingerprint = pipeline.datasets.load(csv_path)
+    if df is None:
+        result.errors.append(f"load: {error}")
+        return result
+    context = build_schema_context(df, pipeline.profile(df, fingerprint))
+    system_prompt = prompt_seaborn_analyst.format(df_info=context.text, df_head=context.head)
+    server = pipeline.model_server
+    session_id = uuid.uuid4().hex
+    server.open_session(session_id, system_prompt)
+    opening, shared = pipeline.single_flight.do(
+        request_key("fake-gpt4all", system_prompt, "initiate conversation"),
+        lambda: server.generate(session_id, "initiate conversation"),
+    )
+    if shared:
+        server.record_exchange(session_id, "initiate conversation", opening)
+    dataset = VersionedFrame(df, fingerprint)
+    result.opening_s = time.perf_counter() - started
+
+    for question in questions:
+        time.sleep(pipeline.args.think_time)
+        turn_started = time.perf_counter()
+        try:
+            reply = server.generate(session_id, question)
+            for code in extract_python_code_blocks(reply)[:1]:
+                pipeline.execute(code, dataset.checkout(), fingerprint, session_id)
+        except Exception as e:
+            result.errors.append(f"turn: {type(e).__name__}: {e}")
+        result.turn_latencies.append(time.perf_counter() - turn_started)
+
+    server.close_session(session_id)
+    result.state_bytes = (
+        dataset.memory()["owned_bytes"] + pipeline.artifacts.footprint(session_id)["resident_bytes"]
+    )
+    return result
+
+
+class RssMonitor:
+    """Sample this process's resident set size in the background and keep the peak."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = process_rss_bytes(os.getpid())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, process_rss_bytes(os.getpid()))
+
+    def __enter__(self) -> "RssMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_level(pipeline: Pipeline, csv_path: str, sessions: int) -> dict[str, Any]:
+    args = pipeline.args
+    rng = random.Random(args.seed)
+    scripts = [rng.choices(SCRIPTED_QUESTIONS, k=args.questions) for _ in range(sessions)]
+    run_session = run_gemini_session if args.backend == "gemini" else run_gpt4all_session
+
+    def start(i: int) -> SessionResult:
+        time.sleep(args.ramp * i / max(sessions, 1))
+        try:
+            return run_session(pipeline, csv_path, scripts[i])
+        except Exception as e:
+            return SessionResult(errors=[f"session: {type(e).__name__}: {e}"])
+
+    rss_before = process_rss_bytes(os.getpid())
+    started = time.perf_counter()
+    with RssMonitor() as monitor, ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(start, range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([t for r in results for t in r.turn_latencies])
+    openings = np.array([r.opening_s for r in results if r.opening_s])
+    errors = [e for r in results for e in r.errors]
+    pct = lambda values, q: float(np.percentile(values, q)) if len(values) else float("nan")
+    return {
+        "sessions": sessions,
+        "turns": int(len(latencies)),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "elapsed_s": elapsed,
+        "throughput_turns_s": len(latencies) / elapsed if elapsed else 0.0,
+        "turn_p50_s": pct(latencies, 50),
+        "turn_p95_s": pct(latencies, 95),
+        "turn_p99_s": pct(latencies, 99),
+        "opening_p50_s": pct(openings, 50),
+        "opening_p95_s": pct(openings, 95),
+        "rss_peak_mb": monitor.peak / 1024 ** 2,
+        "rss_per_session_mb": max(monitor.peak - rss_before, 0) / sessions / 1024 ** 2,
+        "state_per_session_mb": float(np.mean([r.state_bytes for r in results])) / 1024 ** 2,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 4, 16],
+                        help="Concurrency levels to run, in order.")
+    parser.add_argument("--questions", type=int, default=4, help="Questions per session.")
+    parser.add_argument("--dataset", default="10mb", choices=sorted(DATASETS))
+    parser.add_argument("--csv", default=None, help="Use this CSV instead of a generated dataset.")
+    parser.add_argument("--backend", default="gemini", choices=["gemini", "gpt4all"])
+    parser.add_argument("--first-token", type=float, default=0.5, help="Fake LLM time to first token (s).")
+    parser.add_argument("--per-chunk", type=float, default=0.02, help="Fake LLM delay per streamed chunk (s).")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake calls failing with 429.")
+    parser.add_argument("--provider-concurrency", type=int, default=None,
+                        help="Requests the fake provider serves in parallel (unbounded by default).")
+    parser.add_argument("--gateway-concurrency", type=int, default=16)
+    parser.add_argument("--local-instances", type=int, default=1, help="Model instances for the gpt4all backend.")
+    parser.add_argument("--local-queue-depth", type=int, default=256)
+    parser.add_argument("--prefill-per-kchar", type=float, default=0.0,
+                        help="Fake local prompt ingestion cost per 1000 prompt characters (s).")
+    parser.add_argument("--requests-per-minute", type=float, default=6000)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause before each question (s).")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Spread session starts over this many seconds.")
+    parser.add_argument("--sandbox", type=int, default=0, help="Run code in a sandbox pool of this size.")
+    parser.add_argument("--response-cache", default=None, help="SQLite path to enable the response cache.")
+    parser.add_argument("--slo-p95", type=float, default=10.0, help="p95 turn latency treated as falling over (s).")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    csv_path = args.csv or ensure_dataset(args.dataset)
+    pipeline = Pipeline(args)
+    header = (f"{'sessions':>8} {'turns':>6} {'err':>4} {'turns/s':>8} {'p50 s':>7} {'p95 s':>7} "
+              f"{'p99 s':>7} {'open p95':>8} {'rss MB':>8} {'MB/sess':>8}")
+    print(header)
+    breaking_point = None
+    try:
+        for sessions in args.sessions:
+            r = run_level(pipeline, csv_path, sessions)
+            print(f"{r['sessions']:>8} {r['turns']:>6} {r['errors']:>4} {r['throughput_turns_s']:>8.2f} "
+                  f"{r['turn_p50_s']:>7.2f} {r['turn_p95_s']:>7.2f} {r['turn_p99_s']:>7.2f} "
+                  f"{r['opening_p95_s']:>8.2f} {r['rss_peak_mb']:>8.0f} {r['rss_per_session_mb']:>8.1f}",
+                  flush=True)
+            for sample in r["error_samples"]:
+                print(f"         error: {sample}")
+            error_rate = r["errors"] / max(r["turns"], 1)
+            if r["turn_p95_s"] > args.slo_p95 or error_rate > args.max_error_rate:
+                breaking_point = sessions
+                break
+    finally:
+        pipeline.close()
+
+    if breaking_point is None:
+        print(f"Within the SLO (p95 <= {args.slo_p95}s, errors <= {args.max_error_rate:.0%}) at every level.")
+    else:
+        print(f"Falls over at {breaking_point} concurrent sessions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
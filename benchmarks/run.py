@@ -0,0 +1,219 @@
+"""
+Benchmarks for the ingestion, profiling, extraction and execution hot paths.
+
+    python -m benchmarks.run                       # 10mb and wide datasets
+    python -m benchmarks.run --datasets 10mb 1gb   # pick dataset sizes
+    python -m benchmarks.run --save-baseline       # record the current numbers
+
+Each case is timed over several repeats without tracing, then run once more
+under tracemalloc for peak memory. Results are compared with the JSON
+baseline in benchmarks/baselines/; a case whose median time or peak memory
+grows past the tolerance is flagged and the run exits non-zero.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.datasets import DATASETS, ensure_dataset, large_reply  # noqa: E402
+from models.profiling import profile_dataframe  # noqa: E402
+from models.prompt_template import prompt_seaborn_analyst  # noqa: E402
+from models.schema_context import build_schema_context  # noqa: E402
+from models.utils import (  # noqa: E402
+    execute_python_code,
+    extract_non_code_text,
+    extract_python_code_blocks,
+    load_csv,
+    summarize_categorical,
+    summarize_numerical,
+)
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Representative generated snippets, in the style the system prompt asks for.
+SEABORN_SNIPPETS = {
+    "countplot": """
+import seaborn as sns
+import matplotlib.pyplot as plt
+plt.figure(figsize=(10, 6))
+sns.countplot(data=df, x='leads_source', hue='subscribed', palette='colorblind')
+plt.title('Subscriptions by lead source')
+sns.despine()
+plt.show()
+""",
+    "barplot_groupby": """
+import seaborn as sns
+import matplotlib.pyplot as plt
+rate = df.groupby('month', as_index=False)['subscribed'].mean()
+plt.figure(figsize=(10, 6))
+sns.barplot(data=rate, x='month', y='subscribed', hue='month', palette='colorblind', legend=False)
+plt.title('Conversion rate by month')
+plt.show()
+""",
+    "heatmap_crosstab": """
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+table = pd.crosstab(df['leads_source'], df['month'], values=df['subscribed'], aggfunc='mean')
+plt.figure(figsize=(12, 6))
+sns.heatmap(table, annot=True, fmt='.2f', cmap='Blues')
+plt.show()
+""",
+}
+
+
+@dataclass
+class Result:
+    name: str
+    repeats: int
+    median_s: float
+    min_s: float
+    peak_bytes: int
+
+
+def measure(name: str, fn: Callable[[], Any], repeats: int) -> Result:
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+        plt.close("all")
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        plt.close("all")
+    return Result(name, repeats, statistics.median(timings), min(timings), peak)
+
+
+def dataset_cases(dataset: str, path: str) -> dict[str, Callable[[], Any]]:
+    df, error = load_csv(path)
+    if df is None:
+        raise RuntimeError(f"Could not load {path}: {error}")
+    profile = profile_dataframe(df)
+
+    def system_prompt() -> str:
+        context = build_schema_context(df, profile_dataframe(df))
+        return prompt_seaborn_analyst.format(df_info=context.text, df_head=context.head)
+
+    cases: dict[str, Callable[[], Any]] = {
+        "load_csv": lambda: load_csv(path),
+        "summarize_numerical": lambda: summarize_numerical(df),
+        "summarize_categorical": lambda: summarize_categorical(df),
+        "system_prompt": system_prompt,
+        "schema_context_cached_profile": lambda: build_schema_context(df, profile),
+    }
+    for snippet, code in SEABORN_SNIPPETS.items():
+        cases[f"execute_python_code[{snippet}]"] = lambda code=code: execute_python_code(code, df)
+    return {f"{dataset}/{name}": fn for name, fn in cases.items()}
+
+
+def reply_cases() -> dict[str, Callable[[], Any]]:
+    reply = large_reply(2000)
+    return {
+        "reply/extract_python_code_blocks": lambda: extract_python_code_blocks(reply),
+        "reply/extract_non_code_text": lambda: extract_non_code_text(reply),
+    }
+
+
+def compare(
+    results: list[Result], baseline: dict[str, Any], time_tolerance: float, memory_tolerance: float
+) -> list[str]:
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        # Absolute floors keep timer and allocator noise on tiny cases from tripping the check.
+        if result.median_s > max(base["median_s"] * (1 + time_tolerance), base["median_s"] + 0.005):
+            regressions.append(
+                f"{result.name}: median {result.median_s:.4f}s vs baseline {base['median_s']:.4f}s"
+            )
+        if result.peak_bytes > max(base["peak_bytes"] * (1 + memory_tolerance), base["peak_bytes"] + 1024 ** 2):
+            regressions.append(
+                f"{result.name}: peak {result.peak_bytes:,} B vs baseline {base['peak_bytes']:,} B"
+            )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", nargs="+", default=["10mb", "wide"], choices=sorted(DATASETS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--data-dir", default=None, help="Where generated datasets are kept.")
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.10)
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file.")
+    args = parser.parse_args(argv)
+
+    cases = reply_cases()
+    for dataset in args.datasets:
+        print(f"Preparing dataset {dataset}...", flush=True)
+        cases.update(dataset_cases(dataset, ensure_dataset(dataset, args.data_dir)))
+
+    results = []
+    print(f"{'case':<52} {'median s':>10} {'min s':>10} {'peak MB':>10}")
+    for name, fn in cases.items():
+        result = measure(name, fn, args.repeats)
+        results.append(result)
+        print(f"{name:<52} {result.median_s:>10.4f} {result.min_s:>10.4f} {result.peak_bytes / 1024 ** 2:>10.1f}")
+
+    run = {
+        "machine": {"python": sys.version.split()[0], "platform": platform.platform(),
+                    "pandas": pd.__version__, "cpus": os.cpu_count()},
+        "results": {r.name: asdict(r) for r in results},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.setdefault("results", {}).update(run["results"])
+        baseline["machine"] = run["machine"]
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != run["machine"]:
+        print("Warning: baseline was recorded on a different machine or library versions.")
+    regressions = compare(results, baseline.get("results", {}), args.time_tolerance, args.memory_tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+from models.columnar import DEFAULT_CACHE_DIR
+
+FIGURE_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def render_figure(figure: Figure, fmt: str = "png", dpi: int = 100) -> bytes:
+    """
+    Render a Matplotlib figure to PNG, or to gzip-compressed SVG.
+
+    PNG is already deflate-compressed; SVG is XML text and shrinks several
+    times under gzip; `ArtifactStore.get` returns it decompressed.
+    """
+    if fmt not in FIGURE_FORMATS:
+        raise ValueError(f"unsupported figure format: {fmt}")
+    buf = io.BytesIO()
+    figure.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+    data = buf.getvalue()
+    return gzip.compress(data) if fmt == "svg" else data
+
+
+@dataclass
+class Artifact:
+    """A stored chat result; `data` is None once it has been spilled to disk."""
+    mime: str
+    nbytes: int
+    compressed: bool
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+
+@dataclass
+class _Session:
+    artifacts: "OrderedDict[str, Artifact]" = field(default_factory=OrderedDict)
+    resident_bytes: int = 0
+    spilled_bytes: int = 0
+    last_seen: float = field(default_factory=time.time)
+
+
+class ArtifactStore:
+    """
+    Process-wide store for the figures and long outputs of chat sessions.
+
+    Session state keeps artifact ids instead of live objects: a figure is
+    rendered once when it is created and then closed, which frees its
+    artists. Each session keeps at most `max_session_bytes` in memory; the
+    least recently used artifacts beyond that are written to `spill_dir`
+    and read back from disk when shown. Sessions not seen for
+    `idle_seconds` are dropped along with their files, since Streamlit
+    does not report sessions that end.
+    """
+
+    def __init__(
+        self,
+        max_session_bytes: int = 16 * 1024 ** 2,
+        idle_seconds: float = 2 * 3600,
+        spill_dir: str = os.path.join(DEFAULT_CACHE_DIR, "artifacts"),
+        figure_format: str = "png",
+        dpi: int = 100,
+    ):
+        if figure_format not in FIGURE_FORMATS:
+            raise ValueError(f"unsupported figure format: {figure_format}")
+        self.max_session_bytes = max_session_bytes
+        self.idle_seconds = idle_seconds
+        self.spill_dir = spill_dir
+        self.figure_format = figure_format
+        self.dpi = dpi
+        self.spills = 0
+        self.spill_failures = 0
+        self.last_spill_error: Optional[str] = None
+        self.collected = 0
+        self._sessions: dict[str, _Session] = {}
+        self._last_collect = time.time()
+        self._lock = threading.Lock()
+
+    # ── Writing ─────────────────────────────────────────────────────────────
+
+    def put_figure(self, session_id: str, figure: Figure) -> str:
+        """Render `figure`, close it and return the id of the stored image."""
+        try:
+            data = render_figure(figure, self.figure_format, self.dpi)
+        finally:
+            plt.close(figure)
+        return self.put(
+            session_id, data, FIGURE_FORMATS[self.figure_format], compressed=self.figure_format == "svg"
+        )
+
+    def put_text(self, session_id: str, text: str) -> str:
+        """Store a long output string gzip-compressed and return its id."""
+        return self.put(session_id, gzip.compress(text.encode()), "text/plain", compressed=True)
+
+    def put(self, session_id: str, data: bytes, mime: str, compressed: bool = False) -> str:
+        """
+        Store encoded bytes for a session.
+
+        Parameters:
+            session_id (str): The owning session.
+            data (bytes): The artifact, gzip-compressed if `compressed`.
+            mime (str): Media type of the decoded artifact.
+            compressed (bool): Whether `get` must decompress `data`.
+
+        Returns:
+            str: The artifact id to keep in session state.
+        """
+        artifact_id = uuid.uuid4().hex
+        with self._lock:
+            session = self._touch(session_id)
+            session.artifacts[artifact_id] = Artifact(mime, len(data), compressed, data=data)
+            session.resident_bytes += len(data)
+            victims = self._over_budget(session_id, session)
+        self._spill(session_id, victims)
+        self.collect_idle()
+        return artifact_id
+
+    # ── Reading ─────────────────────────────────────────────────────────────
+
+    def get(self, session_id: str, artifact_id: str) -> Optional[tuple[bytes, str]]:
+        """
+        Return an artifact's decoded bytes and media type, or None if it is gone.
+
+        Spilled artifacts are read from disk each time rather than brought
+        back into memory, since a rerun reads the whole history in order.
+        """
+        with self._lock:
+            session = self._touch(session_id)
+            artifact = session.artifacts.get(artifact_id)
+            if artifact is None:
+                return None
+            data, path = artifact.data, artifact.path
+            if data is not None:
+                session.artifacts.move_to_end(artifact_id)
+        if data is None:
+            try:
+                with open(path, "rb") as fh:  # type: ignore[arg-type]
+                    data = fh.read()
+            except OSError:
+                return None
+        return (gzip.decompress(data) if artifact.compressed else data), artifact.mime
+
+    def get_text(self, session_id: str, artifact_id: str) -> Optional[str]:
+        found = self.get(session_id, artifact_id)
+        return found[0].decode() if found is not None else None
+
+    # ── Memory ──────────────────────────────────────────────────────────────
+
+    def _touch(self, session_id: str) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        session.last_seen = time.time()
+        return session
+
+    def _over_budget(self, session_id: str, session: _Session) -> list[tuple[str, Artifact]]:
+        """Pick resident artifacts to spill, least recently used first, keeping the newest."""
+        victims = []
+        resident = session.resident_bytes
+        for artifact_id, artifact in list(session.artifacts.items())[:-1]:
+            if resident <= self.max_session_bytes:
+                break
+            if artifact.data is not None and artifact.path is None:
+                # Setting the path claims it; the bytes stay readable until the write completes.
+                artifact.path = os.path.join(self.spill_dir, session_id, f"{artifact_id}.bin")
+                victims.append((artifact_id, artifact))
+                resident -= artifact.nbytes
+        return victims
+
+    def _spill(self, session_id: str, victims: list[tuple[str, Artifact]]) -> None:
+        """Write artifacts to disk outside the lock, then drop their bytes from memory."""
+        for artifact_id, artifact in victims:
+            path: str = artifact.path  # type: ignore[assignment]
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as fh:
+                    fh.write(artifact.data)  # type: ignore[arg-type]
+            except OSError as e:
+                with self._lock:
+                    artifact.path = None  # Stays in memory; a later put tries again
+                    self.spill_failures += 1
+                    self.last_spill_error = f"Could not spill artifact {artifact_id}: {e}"
+                continue
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is None or artifact_id not in session.artifacts:
+                    continue  # Collected meanwhile; its directory is already removed
+                artifact.data = None
+                session.resident_bytes -= artifact.nbytes
+                session.spilled_bytes += artifact.nbytes
+                self.spills += 1
+
+    def drop_session(self, session_id: str) -> None:
+        """Forget a session and delete its spilled artifacts."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
+
+    def collect_idle(self, force: bool = False) -> int:
+        """
+        Drop sessions idle for longer than `idle_seconds`; returns how many.
+
+        Runs at most once a minute unless `force` is set.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_collect < 60:
+                return 0
+            self._last_collect = now
+            idle = [sid for sid, s in self._sessions.items() if now - s.last_seen > self.idle_seconds]
+        for session_id in idle:
+            self.drop_session(session_id)
+        with self._lock:
+            self.collected += len(idle)
+        return len(idle)
+
+    def footprint(self, session_id: str) -> dict[str, int]:
+        """Artifacts a session holds and their bytes in memory and on disk."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {"artifacts": 0, "resident_bytes": 0, "spilled_bytes": 0}
+            return {
+                "artifacts": len(session.artifacts),
+                "resident_bytes": session.resident_bytes,
+                "spilled_bytes": session.spilled_bytes,
+            }
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "resident_bytes": sum(s.resident_bytes for s in self._sessions.values()),
+                "spilled_bytes": sum(s.spilled_bytes for s in self._sessions.values()),
+                "spills": self.spills,
+                "spill_failures": self.spill_failures,
+                "last_spill_error": self.last_spill_error,
+                "collected": self.collected,
+            }
@@ -0,0 +1,402 @@
+import ast
+import builtins
+import difflib
+import importlib
+import importlib.util
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import pandas as pd
+
+# Names the execution namespace always provides (see utils._exec_namespace).
+NAMESPACE_NAMES = {"df", "pd", "plt", "sns"}
+
+# Imports added automatically when generated code uses a well-known alias without importing it.
+IMPORT_FIXES = {
+    "np": ("numpy", "import numpy as np"),
+    "pd": ("pandas", "import pandas as pd"),
+    "plt": ("matplotlib", "import matplotlib.pyplot as plt"),
+    "sns": ("seaborn", "import seaborn as sns"),
+    "mpl": ("matplotlib", "import matplotlib as mpl"),
+    "math": ("math", "import math"),
+    "stats": ("scipy", "from scipy import stats"),
+    "Prophet": ("prophet", "from prophet import Prophet"),
+}
+
+# Modules whose attributes can be checked statically, keyed by import path.
+CHECKABLE_MODULES = {"numpy", "pandas", "matplotlib.pyplot", "seaborn"}
+
+FORBIDDEN_MODULES = {
+    "os", "sys", "subprocess", "shutil", "socket", "pathlib", "requests", "urllib", "http",
+    "pickle", "ctypes", "multiprocessing", "threading", "importlib", "builtins", "glob",
+}
+FORBIDDEN_CALLS = {"eval", "exec", "compile", "open", "__import__", "input", "breakpoint", "exit", "quit"}
+# DataFrame / pyplot methods that touch the file system.
+FORBIDDEN_METHODS = {
+    "to_csv", "to_excel", "to_pickle", "to_parquet", "to_feather", "to_sql", "to_hdf", "to_json", "savefig",
+    "read_csv", "read_excel", "read_parquet", "read_pickle", "read_json", "read_sql", "read_feather",
+}
+# Row-wise Python loops that scale badly with the number of rows.
+ROW_WISE_METHODS = {"iterrows", "itertuples"}
+
+# Seaborn keyword arguments that name columns of `data`.
+SEABORN_COLUMN_KWARGS = {"x", "y", "hue", "col", "row", "size", "style", "units", "weights"}
+# DataFrame methods whose arguments name columns: positional indexes and keywords.
+COLUMN_ARGS = {
+    "groupby": ((0,), ("by",)),
+    "sort_values": ((0,), ("by",)),
+    "set_index": ((0,), ("keys",)),
+    "drop": ((), ("columns",)),
+    "dropna": ((), ("subset",)),
+    "drop_duplicates": ((0,), ("subset",)),
+    "value_counts": ((0,), ("subset",)),
+    "pivot_table": ((), ("index", "columns", "values")),
+    "pivot": ((), ("index", "columns", "values")),
+    "melt": ((), ("id_vars", "value_vars")),
+    "nlargest": ((1,), ("columns",)),
+    "nsmallest": ((1,), ("columns",)),
+    "explode": ((0,), ("column",)),
+}
+
+FUZZY_CUTOFF = 0.75
+_DATAFRAME_ATTRS = set(dir(pd.DataFrame))
+
+
+@dataclass
+class ValidationIssue:
+    """One finding; `severity` is "fixed" (repaired in place), "warning" or "error"."""
+    severity: str
+    kind: str  # "syntax", "column", "attribute", "import", "undefined", "forbidden" or "expensive"
+    message: str
+    line: Optional[int] = None
+
+
+@dataclass
+class ValidationResult:
+    """The (possibly repaired) code and what was found in it."""
+    code: str
+    issues: list[ValidationIssue] = field(default_factory=list)
+
+    @property
+    def errors(self) -> list[ValidationIssue]:
+        return [i for i in self.issues if i.severity == "error"]
+
+    @property
+    def fixes(self) -> list[ValidationIssue]:
+        return [i for i in self.issues if i.severity == "fixed"]
+
+    @property
+    def ok(self) -> bool:
+        """True when the code can run: nothing is left that needs a regeneration."""
+        return not self.errors
+
+    def feedback(self) -> str:
+        """Problems the model has to fix, phrased for a regeneration prompt."""
+        lines = [f"- line {i.line}: {i.message}" if i.line else f"- {i.message}" for i in self.errors]
+        return "The code was rejected before running:\n" + "\n".join(lines)
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s_\-]+", "", name).lower()
+
+
+def closest_column(name: str, columns: Iterable[str]) -> Optional[str]:
+    """Best match for a misspelled column: case/separator-insensitive first, then difflib."""
+    columns = [str(c) for c in columns]
+    by_normalized = {_normalize(c): c for c in columns}
+    if _normalize(name) in by_normalized:
+        return by_normalized[_normalize(name)]
+    matches = difflib.get_close_matches(name, columns, n=1, cutoff=FUZZY_CUTOFF)
+    return matches[0] if matches else None
+
+
+class _Validator(ast.NodeVisitor):
+    def __init__(self, source: str, columns: list[str], namespace: set[str], n_rows: int, expensive_row_limit: int):
+        self.lines = source.splitlines(keepends=True)
+        self.columns = set(columns)
+        self.namespace = namespace
+        self.n_rows = n_rows
+        self.expensive_row_limit = expensive_row_limit
+        self.issues: list[ValidationIssue] = []
+        self.replacements: list[tuple[int, int, int, int, str]] = []  # (line, col, end_line, end_col, text)
+        self.module_aliases: dict[str, str] = {"pd": "pandas", "plt": "matplotlib.pyplot", "sns": "seaborn"}
+        self.defined: set[str] = set()
+        self.loaded: list[ast.Name] = []
+        # False once the code changes df's columns in a way not tracked here
+        # (reassigning df, .loc/.iloc stores, insert, df.columns = ...).
+        self.columns_known = True
+
+    # ── Helpers ─────────────────────────────────────────────────────────────
+
+    def issue(self, severity: str, kind: str, message: str, node: Optional[ast.AST] = None) -> None:
+        self.issues.append(ValidationIssue(severity, kind, message, getattr(node, "lineno", None)))
+
+    def replace(self, node: ast.AST, text: str) -> None:
+        self.replacements.append((node.lineno, node.col_offset, node.end_lineno, node.end_col_offset, text))  # type: ignore[attr-defined]
+
+    def check_column(self, node: ast.AST) -> None:
+        """Check a string constant (or list/tuple of them) used as a column name of df."""
+        if isinstance(node, (ast.List, ast.Tuple)):
+            for element in node.elts:
+                self.check_column(element)
+            return
+        if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+            return
+        name = node.value
+        if name in self.columns:
+            return
+        if not self.columns_known:
+            # The column may well be created by the code; only point out the doubt.
+            self.issue("warning", "column", f"column '{name}' is not in the loaded data", node)
+            return
+        match = closest_column(name, self.columns)
+        if match is not None:
+            self.replace(node, repr(match))
+            self.issue("fixed", "column", f"column '{name}' does not exist; using '{match}'", node)
+        else:
+            self.issue("error", "column", f"column '{name}' does not exist (columns: {', '.join(sorted(self.columns)[:20])})", node)
+
+    def is_df(self, node: ast.AST) -> bool:
+        return isinstance(node, ast.Name) and node.id == "df"
+
+    def expensive(self, message: str, node: ast.AST) -> None:
+        severity = "error" if self.n_rows >= self.expensive_row_limit else "warning"
+        self.issue(severity, "expensive", f"{message} ({self.n_rows:,} rows)", node)
+
+    # ── Definitions ─────────────────────────────────────────────────────────
+
+    def collect_definitions(self, tree: ast.AST) -> None:
+        """Columns created by the code and every name it binds, so later checks skip them."""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                self.defined.add(node.id)
+                if node.id == "df":
+                    self.columns_known = False
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.defined.add(node.name)
+            elif isinstance(node, ast.arg):
+                self.defined.add(node.arg)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                self.defined.add(node.name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    bound = alias.asname or alias.name.split(".")[0]
+                    self.defined.add(bound)
+                    if isinstance(node, ast.Import):
+                        self.module_aliases[bound] = alias.name if alias.asname else alias.name.split(".")[0]
+            elif isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store) and self.is_df(node.value):
+                if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+                    self.columns.add(node.slice.value)
+                else:
+                    self.columns_known = False
+            elif (
+                isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store)
+                and isinstance(node.value, ast.Attribute) and node.value.attr in ("loc", "iloc", "at", "iat")
+                and self.is_df(node.value.value)
+            ):
+                self.columns_known = False
+            elif (
+                isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store)
+                and node.attr == "columns" and self.is_df(node.value)
+            ):
+                self.columns_known = False
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and self.is_df(node.func.value):
+                if node.func.attr == "assign":
+                    self.columns.update(k.arg for k in node.keywords if k.arg)
+                elif node.func.attr == "insert":
+                    self.columns_known = False
+                elif node.func.attr == "rename":
+                    for keyword in node.keywords:
+                        if keyword.arg == "columns" and isinstance(keyword.value, ast.Dict):
+                            self.columns.update(
+                                v.value for v in keyword.value.values
+                                if isinstance(v, ast.Constant) and isinstance(v.value, str)
+                            )
+
+    # ── Visitors ────────────────────────────────────────────────────────────
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            if alias.name.split(".")[0] in FORBIDDEN_MODULES:
+                self.issue("error", "forbidden", f"importing '{alias.name}' is not allowed", node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.module and node.module.split(".")[0] in FORBIDDEN_MODULES:
+            self.issue("error", "forbidden", f"importing from '{node.module}' is not allowed", node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.append(node)
+
+    def visit_Subscript(self, node: ast.Subscript) -> None:
+        target = node.value
+        if self.is_df(target) and not isinstance(node.ctx, ast.Store):
+            self.check_column(node.slice)
+        elif (
+            isinstance(target, ast.Attribute) and target.attr in ("loc", "at") and not isinstance(node.ctx, ast.Store)
+            and self.is_df(target.value) and isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2
+        ):
+            self.check_column(node.slice.elts[1])
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if node.attr.startswith("__"):
+            self.issue("error", "forbidden", f"access to '{node.attr}' is not allowed", node)
+        elif self.is_df(node.value) and isinstance(node.ctx, ast.Load) and node.attr not in _DATAFRAME_ATTRS:
+            if node.attr not in self.columns:
+                self.check_df_attribute(node)
+        elif isinstance(node.value, ast.Name) and node.value.id in self.module_aliases:
+            self.check_module_attribute(node)
+        self.generic_visit(node)
+
+    def check_df_attribute(self, node: ast.Attribute) -> None:
+        if not self.columns_known:
+            self.issue("warning", "column", f"'{node.attr}' is not a column of the loaded data", node)
+            return
+        match = closest_column(node.attr, self.columns)
+        if match is not None and match.isidentifier() and match not in _DATAFRAME_ATTRS:
+            self.replace(node, f"df.{match}")
+            self.issue("fixed", "column", f"column '{node.attr}' does not exist; using '{match}'", node)
+            return
+        method = difflib.get_close_matches(node.attr, [a for a in _DATAFRAME_ATTRS if not a.startswith("_")], n=1, cutoff=0.85)
+        if method:
+            self.replace(node, f"df.{method[0]}")
+            self.issue("fixed", "attribute", f"DataFrame has no attribute '{node.attr}'; using '{method[0]}'", node)
+        else:
+            self.issue("error", "attribute", f"DataFrame has no attribute or column '{node.attr}'", node)
+
+    def check_module_attribute(self, node: ast.Attribute) -> None:
+        alias = node.value.id  # type: ignore[attr-defined]
+        module_name = self.module_aliases[alias]
+        if module_name not in CHECKABLE_MODULES:
+            return
+        module = importlib.import_module(module_name)
+        if hasattr(module, node.attr):
+            return
+        public = [name for name in dir(module) if not name.startswith("_")]
+        match = difflib.get_close_matches(node.attr, public, n=1, cutoff=0.85)
+        if match:
+            self.replace(node, f"{alias}.{match[0]}")
+            self.issue("fixed", "attribute", f"{module_name} has no '{node.attr}'; using '{match[0]}'", node)
+        else:
+            self.issue("error", "attribute", f"{module_name} has no attribute '{node.attr}'", node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Name) and func.id in FORBIDDEN_CALLS:
+            self.issue("error", "forbidden", f"calling '{func.id}' is not allowed", node)
+        elif isinstance(func, ast.Attribute):
+            receiver = func.value
+            if func.attr in FORBIDDEN_METHODS:
+                self.issue("error", "forbidden", f"'{func.attr}' reads or writes files; use the loaded `df`", node)
+            if self.is_df(receiver):
+                self.check_df_call(func.attr, node)
+            if isinstance(receiver, ast.Name) and self.module_aliases.get(receiver.id) == "seaborn":
+                self.check_seaborn_call(func.attr, node)
+        self.generic_visit(node)
+
+    def check_df_call(self, method: str, node: ast.Call) -> None:
+        positions, keywords = COLUMN_ARGS.get(method, ((), ()))
+        for index in positions:
+            if index < len(node.args):
+                self.check_column(node.args[index])
+        for keyword in node.keywords:
+            if keyword.arg in keywords:
+                self.check_column(keyword.value)
+        if method in ROW_WISE_METHODS:
+            self.expensive(f"df.{method}() loops over rows in Python; use vectorized operations", node)
+        if method == "apply" and any(
+            k.arg == "axis" and isinstance(k.value, ast.Constant) and k.value.value in (1, "columns")
+            for k in node.keywords
+        ):
+            self.expensive("df.apply(axis=1) calls Python once per row; use vectorized operations", node)
+
+    def check_seaborn_call(self, function: str, node: ast.Call) -> None:
+        data = next((k.value for k in node.keywords if k.arg == "data"), node.args[0] if node.args else None)
+        if data is not None and self.is_df(data):
+            for keyword in node.keywords:
+                if keyword.arg in SEABORN_COLUMN_KWARGS:
+                    self.check_column(keyword.value)
+            if function == "pairplot" and len(self.columns) > 10:
+                vars_given = any(k.arg in ("vars", "x_vars", "y_vars") for k in node.keywords)
+                if not vars_given:
+                    self.expensive(f"sns.pairplot over {len(self.columns)} columns draws a plot per pair; pass vars=", node)
+
+    # ── Undefined names ─────────────────────────────────────────────────────
+
+    def check_undefined(self, imports: list[str]) -> None:
+        known = self.defined | self.namespace | set(dir(builtins))
+        reported: set[str] = set()
+        for node in self.loaded:
+            name = node.id
+            if name in known or name in reported:
+                continue
+            reported.add(name)
+            fix = IMPORT_FIXES.get(name)
+            if fix is not None and importlib.util.find_spec(fix[0]) is not None:
+                imports.append(fix[1])
+                self.issue("fixed", "import", f"added missing '{fix[1]}'", node)
+            else:
+                self.issue("error", "undefined", f"name '{name}' is not defined", node)
+
+
+def _apply_replacements(lines: list[str], replacements: list[tuple[int, int, int, int, str]]) -> str:
+    # Offsets are UTF-8 byte columns; splice from the end so earlier positions stay valid.
+    encoded = [line.encode("utf-8") for line in lines]
+    for line, col, end_line, end_col, text in sorted(set(replacements), reverse=True):
+        head = encoded[line - 1][:col]
+        tail = encoded[end_line - 1][end_col:]
+        encoded[line - 1: end_line] = [head + text.encode("utf-8") + tail]
+    return b"".join(encoded).decode("utf-8")
+
+
+def validate_code(
+    code: str,
+    columns: Iterable[str],
+    namespace: Iterable[str] = (),
+    n_rows: int = 0,
+    expensive_row_limit: int = 1_000_000,
+) -> ValidationResult:
+    """
+    Statically check generated code before it runs, repairing what can be repaired.
+
+    Parses the code and checks column references (df["col"], df.col,
+    df.loc[:, "col"], column arguments of common DataFrame methods and of
+    seaborn calls with data=df) against the schema, module attributes of
+    numpy/pandas/pyplot/seaborn, undefined names, forbidden calls (file
+    and process access, eval/exec, dunder attributes) and row-wise loops.
+    Misspelled columns and attributes with a close match are rewritten in
+    place and missing imports for well-known aliases are added. When the
+    code changes df's columns in ways not tracked (reassigning df, .loc or
+    .iloc stores, insert, assigning df.columns), unknown columns are only
+    warnings and are left as written.
+
+    Parameters:
+        code (str): The generated code block.
+        columns: Column names of the DataFrame the code will see as `df`.
+        namespace: Extra names the execution namespace provides.
+        n_rows (int): Row count, used to decide when row-wise loops are too expensive.
+        expensive_row_limit (int): Row count from which expensive calls are errors instead of warnings.
+
+    Returns:
+        ValidationResult: The repaired code and the issues found; `ok` is
+        False only when a regeneration is needed.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return ValidationResult(code, [ValidationIssue("error", "syntax", f"syntax error: {e.msg}", e.lineno)])
+
+    validator = _Validator(code, [str(c) for c in columns], NAMESPACE_NAMES | set(namespace), n_rows, expensive_row_limit)
+    validator.collect_definitions(tree)
+    validator.visit(tree)
+    imports: list[str] = []
+    validator.check_undefined(imports)
+
+    repaired = code
+    if validator.replacements:
+        repaired = _apply_replacements(validator.lines, validator.replacements)
+    if imports:
+        repaired = "\n".join(imports) + "\n" + repaired
+    return ValidationResult(repaired, validator.issues)
@@ -0,0 +1,172 @@
+import os
+import tempfile
+import warnings
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from models.utils import fingerprint_file, load_csv
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.csv as pacsv  # type: ignore
+    import pyarrow.feather as feather  # type: ignore
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DATAVERSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dataverse")
+)
+
+
+def columnar_cache_path(fingerprint: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Return the Feather file path used to persist a parsed dataset."""
+    return os.path.join(cache_dir, f"{fingerprint}.feather")
+
+
+def _arrow_source(file: Any) -> Any:
+    """Return something pyarrow can read without copying the upload."""
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        return file
+    if hasattr(file, "getbuffer"):
+        return pa.BufferReader(pa.py_buffer(file.getbuffer()))
+    file.seek(0)
+    return file
+
+
+def _convert_options(columns: Optional[Sequence[str]] = None) -> "pacsv.ConvertOptions":
+    """Arrow CSV conversion matching `pd.read_csv`: empty and quoted-empty cells are missing."""
+    return pacsv.ConvertOptions(
+        include_columns=list(columns) if columns else None,
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+
+
+def _to_pandas(table: "pa.Table", arrow_dtypes: bool) -> pd.DataFrame:
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+
+def write_columnar_cache(table: "pa.Table", path: str) -> None:
+    """Persist an Arrow table as uncompressed Feather so it can be memory-mapped."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A unique temp file per writer: sessions are threads of one process and may write the same path.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_columnar_cache(path: str) -> "pa.Table":
+    """Memory-map a Feather file written by `write_columnar_cache`."""
+    return feather.read_table(path, memory_map=True)
+
+
+def read_csv_columnar(
+    file: Any,
+    fingerprint: Optional[str] = None,
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    arrow_dtypes: bool = False,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """
+    Load a CSV file with the multithreaded Arrow reader and cache it on disk.
+
+    The parsed table is written to a Feather file keyed by the content
+    fingerprint, so re-uploads, restarts and other sessions memory-map it
+    instead of parsing the CSV again. Falls back to `load_csv` when pyarrow
+    is not installed.
+
+    Parameters:
+        file: Uploaded file object or file path.
+        fingerprint (str, optional): Precomputed content fingerprint.
+        cache_dir (str, optional): Directory for Feather files; None disables the disk cache.
+        arrow_dtypes (bool): Return Arrow-backed dtypes instead of NumPy ones.
+        columns (list, optional): Read only these columns. A partial table is not cached,
+            but an existing cache of the whole file is read from.
+
+    Returns:
+        tuple: (Loaded DataFrame if valid, otherwise None; Error message or None)
+    """
+    if pa is None:
+        df, error = load_csv(file)
+        if df is not None and columns is not None:
+            df = df[list(columns)]
+        return df, error
+
+    try:
+        path = None
+        if cache_dir is not None:
+            path = columnar_cache_path(fingerprint or fingerprint_file(file), cache_dir)
+            if os.path.exists(path):
+                try:
+                    table = read_columnar_cache(path)
+                    return _to_pandas(table.select(list(columns)) if columns else table, arrow_dtypes), None
+                except KeyError as e:
+                    return None, f"Unknown column: {e}"
+                except (OSError, pa.ArrowInvalid):
+                    os.remove(path)  # Corrupt or truncated cache file, parse again
+
+        table = pacsv.read_csv(
+            _arrow_source(file),
+            read_options=pacsv.ReadOptions(use_threads=True),
+            convert_options=_convert_options(columns),
+        )
+        if table.num_rows == 0:
+            return None, "The CSV file is empty."
+
+        if path is not None and columns is None:
+            try:
+                write_columnar_cache(table, path)
+            except OSError as e:
+                # The parse itself succeeded; only later loads lose the shortcut.
+                warnings.warn(f"Could not write columnar cache {path}: {e}", RuntimeWarning, stacklevel=2)
+
+        return _to_pandas(table, arrow_dtypes), None
+
+    except pa.ArrowInvalid as e:
+        if "empty" in str(e).lower():
+            return None, "The file is empty or invalid."
+        return None, "The file could not be parsed. Check if it's a valid CSV."
+    except Exception as e:
+        return None, str(e)  # Handle unexpected errors
+
+
+def iter_csv_columnar(
+    path: str, chunksize: int = 200_000, columns: Optional[Sequence[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV file as DataFrames of `chunksize` rows with the Arrow reader.
+
+    Gives the same column types as `read_csv_columnar` for files too large to
+    load at once. Falls back to pandas' chunked reader when pyarrow is not
+    installed.
+    """
+    if pa is None:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+        return
+
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=_convert_options(columns),
+    )
+    pending: list = []
+    rows = 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(pending)
+            yield _to_pandas(table.slice(0, chunksize), False)
+            rest = table.slice(chunksize)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield _to_pandas(pa.Table.from_batches(pending), False)
@@ -0,0 +1,179 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class _CacheEntry:
+    name: Optional[str]  # None records a failed create, retried after `retry_after_seconds`
+    expires_at: float
+
+
+class ContextCacheManager:
+    """
+    Create and reuse provider-side cached contexts for the system instruction.
+
+    One cached context is kept per (model, dataset fingerprint, instruction
+    hash). Chats for the same dataset reference it through `cached_content`
+    instead of resending the prompt. Entries are refreshed when they come
+    within `refresh_margin_seconds` of expiry, and recreated once expired.
+    If the provider refuses to cache (e.g. the prompt is below the model's
+    minimum size), chats fall back to a plain `system_instruction`.
+    Expired entries are dropped whenever one is stored, and at most
+    `max_entries` are kept, the soonest to expire going first; those are
+    deleted on the provider so they stop accruing storage.
+
+    The client is duck-typed: it needs `caches.create(model=, config=)`,
+    `caches.update(name=, config=)` and `caches.delete(name=)`, so a local
+    fake can stand in for `google.genai.Client` in tests.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 600,
+        retry_after_seconds: int = 900,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.created = 0
+        self.refreshed = 0
+        self.reused = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._entries: dict[tuple[str, str, str], _CacheEntry] = {}
+        self._key_locks: dict[tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model: str, fingerprint: str, system_instruction: str) -> tuple[str, str, str]:
+        digest = hashlib.sha256(system_instruction.encode()).hexdigest()
+        return model, fingerprint, digest
+
+    def get_cache_name(self, model: str, fingerprint: str, system_instruction: str) -> Optional[str]:
+        """
+        Return the name of a live cached context, creating or refreshing it as needed.
+
+        Call this on every turn of a chat that uses the cache: it is a
+        dictionary lookup unless the entry is close to expiry.
+
+        Returns:
+            str or None: The cached content name, or None if caching is unavailable.
+        """
+        key = self._key(model, fingerprint, system_instruction)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry.name is None and now < entry.expires_at:
+                return None
+            if entry is not None and entry.name is not None:
+                if entry.expires_at - now > self.refresh_margin_seconds:
+                    self.reused += 1
+                    return entry.name
+                if entry.expires_at > now and self._refresh(entry, now):
+                    return entry.name
+
+            return self._create(key, model, fingerprint, system_instruction, now)
+
+    def _refresh(self, entry: _CacheEntry, now: float) -> bool:
+        try:
+            self.client.caches.update(name=entry.name, config={"ttl": f"{self.ttl_seconds}s"})
+        except Exception as e:
+            self._record_failure(f"Could not refresh cached context {entry.name}: {e}")
+            return False
+        entry.expires_at = now + self.ttl_seconds
+        self.refreshed += 1
+        return True
+
+    def _create(
+        self, key: tuple[str, str, str], model: str, fingerprint: str, system_instruction: str, now: float
+    ) -> Optional[str]:
+        try:
+            cached = self.client.caches.create(
+                model=model,
+                config={
+                    "system_instruction": system_instruction,
+                    "display_name": f"dataverse-{fingerprint[:12]}",
+                    "ttl": f"{self.ttl_seconds}s",
+                },
+            )
+        except Exception as e:
+            self._record_failure(f"Context caching unavailable for {model}: {e}")
+            self._store(key, _CacheEntry(None, now + self.retry_after_seconds), now)
+            return None
+        self._store(key, _CacheEntry(cached.name, now + self.ttl_seconds), now)
+        self.created += 1
+        return cached.name
+
+    def _store(self, key: tuple[str, str, str], entry: _CacheEntry, now: float) -> None:
+        """
+        Add an entry, dropping expired ones and, beyond `max_entries`, those
+        expiring soonest. The provider deletes expired contexts itself; the
+        live ones evicted here are deleted outside the lock.
+        """
+        with self._lock:
+            self._entries[key] = entry
+            expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+            live = sorted(
+                (k for k, e in self._entries.items() if e.expires_at > now and k != key),
+                key=lambda k: self._entries[k].expires_at,
+            )
+            overflow = live[:max(len(live) + 1 - self.max_entries, 0)]
+            evicted = [self._entries[k].name for k in overflow if self._entries[k].name is not None]
+            for k in expired + overflow:
+                del self._entries[k]
+                lock = self._key_locks.get(k)
+                if lock is not None and not lock.locked():
+                    del self._key_locks[k]
+        for name in evicted:
+            self._delete(name)
+
+    def chat_config(self, model: str, fingerprint: str, system_instruction: str) -> dict[str, str]:
+        """Return a GenerateContentConfig dict that uses the cached context when available."""
+        name = self.get_cache_name(model, fingerprint, system_instruction)
+        if name is None:
+            return {"system_instruction": system_instruction}
+        return {"cached_content": name}
+
+    def delete_all(self) -> None:
+        """Delete every cached context this manager created."""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        for entry in entries.values():
+            if entry.name is not None:
+                self._delete(entry.name)
+
+    def _delete(self, name: str) -> None:
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            self._record_failure(f"Could not delete cached context {name}: {e}")
+
+    def _record_failure(self, message: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = message
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "refreshed": self.refreshed,
+                "reused": self.reused,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "live": sum(1 for e in self._entries.values() if e.name is not None),
+                "entries": len(self._entries),
+            }
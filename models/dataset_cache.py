@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+import pandas as pd
+
+from models.columnar import read_csv_columnar
+from models.utils import fingerprint_file
+
+# Loaders receive the file and its precomputed fingerprint.
+Loader = Callable[[Any, str], Tuple[Optional[pd.DataFrame], Optional[str]]]
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Return the deep memory footprint of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class DatasetCache:
+    """
+    Bounded LRU cache of parsed DataFrames keyed by file fingerprint.
+
+    A file is only parsed again when its contents change. Entries are
+    evicted least-recently-used first once either `max_entries` or
+    `max_bytes` is exceeded. Failed loads are not cached.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 2 * 1024 ** 3,
+        max_entries: int = 8,
+        loader: Loader = read_csv_columnar,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, file: Any) -> Tuple[Optional[pd.DataFrame], Optional[str], str]:
+        """
+        Return the parsed DataFrame for `file`, parsing it only on a miss.
+
+        Parameters:
+            file: Uploaded file object or file path.
+
+        Returns:
+            tuple: (DataFrame or None, error message or None, fingerprint)
+        """
+        fingerprint = fingerprint_file(file)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                return entry[0], None, fingerprint
+            self.misses += 1
+
+        df, error = self.loader(file, fingerprint)
+        if df is not None:
+            self._put(fingerprint, df)
+        return df, error, fingerprint
+
+    def _put(self, fingerprint: str, df: pd.DataFrame) -> None:
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            if fingerprint in self._entries:
+                return
+            self._entries[fingerprint] = (df, nbytes)
+            self._total_bytes += nbytes
+            self._evict()
+
+    def _evict(self) -> None:
+        # Always keep the most recent entry, even if it alone exceeds max_bytes.
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._total_bytes -= nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached DataFrame."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Return hit/miss counters and current cache size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,289 @@
+import atexit
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from models.columnar import DEFAULT_CACHE_DIR, read_columnar_cache, read_csv_columnar, write_columnar_cache
+from models.dataset_cache import DatasetCache, Loader, frame_nbytes
+from models.single_flight import SingleFlight
+from models.utils import fingerprint_file
+
+try:
+    import pyarrow as pa  # type: ignore
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+
+class DatasetLease:
+    """
+    A session's hold on a registered dataset.
+
+    `frame` is the session's own shallow view of the shared data; with
+    copy-on-write, changes to it never reach the registry or other sessions.
+    The hold is released by `release()` or when the lease is garbage
+    collected, e.g. with the Streamlit session that stored it.
+    """
+
+    def __init__(
+        self, registry: "DatasetRegistry", fingerprint: str, frame: pd.DataFrame, holder: Optional[Hashable] = None
+    ):
+        self.fingerprint = fingerprint
+        self.frame = frame
+        self._finalizer = weakref.finalize(self, registry._release, fingerprint, holder)
+
+    def release(self) -> None:
+        self._finalizer()
+
+    @property
+    def released(self) -> bool:
+        return not self._finalizer.alive
+
+
+class DatasetRegistry(DatasetCache):
+    """
+    Process-wide, reference-counted registry of parsed datasets keyed by content fingerprint.
+
+    Each distinct file is parsed once, even when sessions upload it at the
+    same moment, and every session gets a `DatasetLease` on the one shared
+    frame. Datasets no session holds are evicted least-recently-released
+    first once resident data exceeds `max_bytes` (or `max_entries`); they
+    are spilled to an uncompressed Feather file first, so the next session
+    to open them memory-maps the file instead of parsing the CSV again.
+    Datasets in use are never evicted, so the ceiling can be exceeded while
+    leases are held. Spill files beyond `max_spill_bytes` are deleted oldest
+    first, and the rest when the process exits.
+
+    Passing a `holder` (e.g. the session id) to `acquire` makes hits count
+    sessions rather than lookups: a holder that already has a lease on the
+    dataset, as on every Streamlit rerun, does not count again.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 2 * 1024 ** 3,
+        max_entries: int = 8,
+        loader: Loader = read_csv_columnar,
+        spill_dir: Optional[str] = os.path.join(DEFAULT_CACHE_DIR, "registry"),
+        max_spill_bytes: int = 8 * 1024 ** 3,
+    ):
+        super().__init__(max_bytes=max_bytes, max_entries=max_entries, loader=loader)
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.spills = 0
+        self.spill_failures = 0
+        self.last_spill_error: Optional[str] = None
+        self.reloads = 0
+        self._refs: dict[str, int] = {}
+        self._holders: dict[Tuple[str, Hashable], int] = {}
+        self._spilled: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # path, bytes; oldest first
+        self._spilled_bytes = 0
+        self._spilling: dict[str, pd.DataFrame] = {}  # evicted, still being written out
+        self._flight: SingleFlight[Tuple[Optional[pd.DataFrame], Optional[str]]] = SingleFlight()
+        self._spill_lock = threading.Lock()
+        atexit.register(self.remove_spills)
+
+    def acquire(
+        self, file: Any, holder: Optional[Hashable] = None
+    ) -> Tuple[Optional[DatasetLease], Optional[str], str]:
+        """
+        Return a lease on the dataset for `file`, parsing it only if no session has it.
+
+        Parameters:
+            file: Uploaded file object or file path.
+            holder (hashable, optional): Who takes the lease, e.g. a session id.
+
+        Returns:
+            tuple: (DatasetLease or None, error message or None, fingerprint)
+        """
+        fingerprint = fingerprint_file(file)
+        with self._lock:
+            frame = self._resident(fingerprint)
+            if frame is not None:
+                self._count_hit(fingerprint, holder)
+                return self._lease(fingerprint, frame, holder), None, fingerprint
+
+        (frame, error), shared = self._flight.do(fingerprint, lambda: self._materialize(file, fingerprint))
+        if frame is None:
+            return None, error, fingerprint
+        with self._lock:
+            if shared:
+                self._count_hit(fingerprint, holder)  # Parsed once for a concurrent upload of the same file
+            resident = self._resident(fingerprint)
+            if resident is None:
+                # Evicted before this caller got to it (a small ceiling under load): re-admit.
+                self._entries[fingerprint] = (frame, frame_nbytes(frame))
+                self._total_bytes += self._entries[fingerprint][1]
+                resident = frame
+            return self._lease(fingerprint, resident, holder), None, fingerprint
+
+    def load(self, file: Any) -> Tuple[Optional[pd.DataFrame], Optional[str], str]:
+        """`DatasetCache.load` compatibility: a view of the shared frame, without holding it."""
+        lease, error, fingerprint = self.acquire(file)
+        return (lease.frame if lease is not None else None), error, fingerprint
+
+    def _resident(self, fingerprint: str) -> Optional[pd.DataFrame]:
+        """The shared frame if it is in memory, re-admitting one that is being spilled."""
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            self._entries.move_to_end(fingerprint)
+            return entry[0]
+        frame = self._spilling.get(fingerprint)
+        if frame is not None:
+            self._entries[fingerprint] = (frame, frame_nbytes(frame))
+            self._total_bytes += self._entries[fingerprint][1]
+        return frame
+
+    def _count_hit(self, fingerprint: str, holder: Optional[Hashable]) -> None:
+        if holder is None or not self._holders.get((fingerprint, holder)):
+            self.hits += 1
+
+    def _lease(self, fingerprint: str, frame: pd.DataFrame, holder: Optional[Hashable] = None) -> DatasetLease:
+        self._refs[fingerprint] = self._refs.get(fingerprint, 0) + 1
+        if holder is not None:
+            self._holders[(fingerprint, holder)] = self._holders.get((fingerprint, holder), 0) + 1
+        return DatasetLease(self, fingerprint, frame.copy(deep=False), holder)
+
+    def _materialize(self, file: Any, fingerprint: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        with self._lock:
+            spilled = self._spilled.get(fingerprint)
+        if spilled is not None:
+            try:
+                frame = read_columnar_cache(spilled[0]).to_pandas()
+            except (OSError, pa.ArrowException):
+                with self._lock:
+                    self._forget_spill(fingerprint)
+            else:
+                with self._lock:
+                    self.reloads += 1
+                self._put(fingerprint, frame)
+                return frame, None
+        with self._lock:
+            self.misses += 1
+        frame, error = self.loader(file, fingerprint)
+        if frame is not None:
+            self._put(fingerprint, frame)
+        return frame, error
+
+    def _release(self, fingerprint: str, holder: Optional[Hashable] = None) -> None:
+        """Drop one lease; the dataset becomes evictable once no session holds it."""
+        with self._lock:
+            refs = self._refs.get(fingerprint, 0) - 1
+            if refs > 0:
+                self._refs[fingerprint] = refs
+            else:
+                self._refs.pop(fingerprint, None)
+            if holder is not None:
+                held = self._holders.get((fingerprint, holder), 0) - 1
+                if held > 0:
+                    self._holders[(fingerprint, holder)] = held
+                else:
+                    self._holders.pop((fingerprint, holder), None)
+            victims = self._evict()
+        self._spill(victims)
+
+    def _put(self, fingerprint: str, df: pd.DataFrame) -> None:
+        nbytes = frame_nbytes(df)
+        with self._lock:
+            if fingerprint not in self._entries:
+                self._entries[fingerprint] = (df, nbytes)
+                self._total_bytes += nbytes
+            victims = self._evict()
+        self._spill(victims)
+
+    def _evict(self) -> list[Tuple[str, pd.DataFrame]]:  # type: ignore[override]
+        """Drop unreferenced datasets, oldest first, until under the limits; returns them for spilling."""
+        # As in DatasetCache the newest entry stays, so a dataset just parsed survives until leased.
+        victims = []
+        for fingerprint in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            if self._refs.get(fingerprint) or fingerprint == next(reversed(self._entries)):
+                continue
+            frame, nbytes = self._entries.pop(fingerprint)
+            self._total_bytes -= nbytes
+            self.evictions += 1
+            if self.spill_dir is not None and pa is not None and fingerprint not in self._spilled:
+                self._spilling[fingerprint] = frame
+                victims.append((fingerprint, frame))
+        return victims
+
+    def _spill(self, victims: list[Tuple[str, pd.DataFrame]]) -> None:
+        """Write evicted frames to Feather outside the registry lock."""
+        for fingerprint, frame in victims:
+            path = os.path.join(self.spill_dir, f"{fingerprint}.feather")  # type: ignore[arg-type]
+            try:
+                with self._spill_lock:
+                    write_columnar_cache(pa.Table.from_pandas(frame), path)
+                nbytes = os.path.getsize(path)
+                error = None
+            except (OSError, pa.ArrowException) as e:
+                error = f"Could not spill dataset {fingerprint[:12]}: {e}"
+            stale = []
+            with self._lock:
+                self._spilling.pop(fingerprint, None)
+                if error is not None:
+                    self.spill_failures += 1
+                    self.last_spill_error = error
+                else:
+                    self._spilled[fingerprint] = (path, nbytes)
+                    self._spilled_bytes += nbytes
+                    self.spills += 1
+                    while self._spilled_bytes > self.max_spill_bytes:
+                        stale.append(self._forget_spill(next(iter(self._spilled))))
+            for stale_path in stale:
+                _remove(stale_path)
+
+    def _forget_spill(self, fingerprint: str) -> Optional[str]:
+        """Drop a spill file from the index (under the lock); returns its path for deletion."""
+        spilled = self._spilled.pop(fingerprint, None)
+        if spilled is None:
+            return None
+        self._spilled_bytes -= spilled[1]
+        return spilled[0]
+
+    def remove_spills(self) -> None:
+        """Delete every spill file this registry wrote."""
+        with self._lock:
+            paths = [self._forget_spill(fingerprint) for fingerprint in list(self._spilled)]
+        for path in paths:
+            _remove(path)
+
+    def clear(self) -> None:
+        """Drop every resident dataset that no session holds."""
+        with self._lock:
+            for fingerprint in [fp for fp in self._entries if not self._refs.get(fp)]:
+                _, nbytes = self._entries.pop(fingerprint)
+                self._total_bytes -= nbytes
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters, resident size, leases held, evictions, spills and spill failures."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.reloads
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "spill_failures": self.spill_failures,
+                "last_spill_error": self.last_spill_error,
+                "entries": len(self._entries),
+                "spilled": len(self._spilled),
+                "spilled_bytes": self._spilled_bytes,
+                "bytes": self._total_bytes,
+                "leases": sum(self._refs.values()),
+            }
+
+
+def _remove(path: Optional[str]) -> None:
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Already gone, or still mapped on a platform that forbids deleting it
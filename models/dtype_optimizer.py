@@ -0,0 +1,185 @@
+import re
+import warnings
+from typing import Any, MutableMapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.dataset_cache import Loader
+
+DATE_NAME_HINT = re.compile(r"date|month|time|day|period|year", re.IGNORECASE)
+DATE_VALUE_HINT = re.compile(r"^\s*\d{1,4}[-/.]\d{1,2}(?:[-/.]\d{1,4})?(?:[ T]\d{1,2}:\d{2}.*)?\s*$")
+INT32 = np.iinfo(np.int32)
+
+
+def _looks_like_dates(name: str, values: pd.Series, min_ratio: float) -> bool:
+    """Check a sample of string values for a consistent date-like shape."""
+    sample = values.dropna().astype(str).head(1000)
+    if sample.empty:
+        return False
+    shaped = sample.str.match(DATE_VALUE_HINT).mean()
+    if shaped < min_ratio and not (DATE_NAME_HINT.search(name) and shaped > 0):
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(sample, errors="coerce")
+    return parsed.notna().mean() >= min_ratio
+
+
+def _optimize_strings(
+    name: str,
+    col: pd.Series,
+    parse_dates: bool,
+    category_max_ratio: float,
+    date_min_ratio: float,
+) -> pd.Series:
+    if parse_dates and _looks_like_dates(name, col, date_min_ratio):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(col, errors="coerce")
+        # Only accept the parse when it does not drop existing values.
+        if parsed.notna().sum() >= col.notna().sum() * date_min_ratio:
+            return parsed
+
+    n_unique = col.nunique(dropna=True)
+    if len(col) and n_unique / len(col) <= category_max_ratio:
+        return col.astype("category")
+    return col
+
+
+def _optimize_numbers(col: pd.Series, downcast_floats: bool) -> pd.Series:
+    if pd.api.types.is_bool_dtype(col):
+        return col
+    if pd.api.types.is_integer_dtype(col):
+        # Narrower or unsigned types overflow or wrap silently in generated
+        # arithmetic (e.g. a sum of int8 values, or a difference of uint8 values).
+        if col.dtype == np.int64 and len(col) and col.min() >= INT32.min and col.max() <= INT32.max:
+            return col.astype(np.int32)
+        return col
+
+    values = col.dropna()
+    if col.hasnans and len(values) and (values == values.round()).all():
+        # Whole numbers that were only promoted to float because of NaNs.
+        for dtype in ("Int32", "Int64"):
+            bounds = np.iinfo(dtype.lower())
+            if values.min() >= bounds.min and values.max() <= bounds.max:
+                return col.astype(dtype)
+    if downcast_floats:
+        return pd.to_numeric(col, downcast="float")
+    return col
+
+
+def optimize_dtypes(
+    df: pd.DataFrame,
+    category_max_ratio: float = 0.5,
+    parse_dates: bool = True,
+    date_min_ratio: float = 0.95,
+    downcast_floats: bool = False,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Shrink a DataFrame's memory footprint by choosing tighter dtypes.
+
+    Low-cardinality strings become `category`, int64 columns that fit
+    become int32 (never narrower, never unsigned), date-like string columns
+    are parsed once into datetimes, and float columns holding whole numbers
+    plus NaNs become nullable integers.
+    Floats are only downcast to float32 when `downcast_floats` is set,
+    since that loses precision.
+
+    Parameters:
+        df (pd.DataFrame): The DataFrame to optimize.
+        category_max_ratio (float): Max distinct/rows ratio for a string column to become categorical.
+        parse_dates (bool): Parse date-like string columns into datetimes.
+        date_min_ratio (float): Share of values that must parse for a column to be treated as dates.
+        downcast_floats (bool): Allow float64 -> float32.
+
+    Returns:
+        tuple: (optimized DataFrame, per-column report with bytes saved)
+    """
+    columns = {}
+    rows = []
+    for name in df.columns:
+        col = df[name]
+        before = int(col.memory_usage(deep=True, index=False))
+        if pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+            new_col = _optimize_strings(str(name), col, parse_dates, category_max_ratio, date_min_ratio)
+        elif pd.api.types.is_numeric_dtype(col) and not isinstance(col.dtype, pd.ArrowDtype):
+            new_col = _optimize_numbers(col, downcast_floats)
+        else:
+            new_col = col
+        after = int(new_col.memory_usage(deep=True, index=False))
+        columns[name] = new_col
+        rows.append({
+            "column": name,
+            "before_dtype": str(col.dtype),
+            "after_dtype": str(new_col.dtype),
+            "before_bytes": before,
+            "after_bytes": after,
+            "saved_bytes": before - after,
+        })
+
+    optimized = pd.DataFrame(columns, index=df.index)
+    report = pd.DataFrame(rows).set_index("column")
+    return optimized, report
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: pd.Series) -> pd.DataFrame:
+    """
+    Give a frame read from the same file the dtypes `optimize_dtypes` chose for another part of it.
+
+    Used for full-data reads next to an optimized sample, so code written
+    against the sample sees the same types. Categories are not fixed to the
+    sample's values, and a column whose values do not fit (e.g. a larger
+    integer than the sample held) keeps the type it was read with.
+    """
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        dtype = dtypes.get(name)
+        if dtype is not None and col.dtype != dtype:
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    if isinstance(dtype, pd.CategoricalDtype):
+                        col = col.astype("category")
+                    elif pd.api.types.is_datetime64_any_dtype(dtype):
+                        col = pd.to_datetime(col, errors="coerce")
+                    elif isinstance(dtype, np.dtype) and dtype.kind == "i":
+                        # NumPy wraps out-of-range integers instead of raising.
+                        bounds = np.iinfo(dtype)
+                        if col.dtype.kind == "i" and (not len(col) or bounds.min <= col.min() and col.max() <= bounds.max):
+                            col = col.astype(dtype)
+                    else:
+                        col = col.astype(dtype)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        columns[name] = col
+    return pd.DataFrame(columns, index=df.index)
+
+
+def with_dtype_optimization(
+    loader: Loader,
+    reports: Optional[MutableMapping[str, pd.DataFrame]] = None,
+    **options: Any,
+) -> Loader:
+    """
+    Wrap a dataset loader so every parsed frame goes through `optimize_dtypes`.
+
+    Parameters:
+        loader: A `DatasetCache` loader, e.g. `read_csv_columnar`.
+        reports (dict, optional): Receives each optimization report keyed by fingerprint.
+        **options: Keyword arguments forwarded to `optimize_dtypes`.
+
+    Returns:
+        A loader with the same `(file, fingerprint) -> (df, error)` signature.
+    """
+    def optimizing_loader(file: Any, fingerprint: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        df, error = loader(file, fingerprint)
+        if df is None:
+            return df, error
+        df, report = optimize_dtypes(df, **options)
+        if reports is not None:
+            reports[fingerprint] = report
+        return df, error
+
+    return optimizing_loader
@@ -0,0 +1,118 @@
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, MutableMapping, TextIO
+
+from matplotlib import _pylab_helpers  # type: ignore
+
+_install_lock = threading.Lock()
+
+
+class ThreadLocalStream:
+    """
+    Stand-in for sys.stdout/sys.stderr that writes to a per-thread target.
+
+    Threads that have not redirected anything keep writing to the stream
+    that was installed before this proxy.
+    """
+
+    def __init__(self, default: TextIO):
+        self._default = default
+        self._local = threading.local()
+
+    def _target(self) -> TextIO:
+        return getattr(self._local, "target", None) or self._default
+
+    @contextmanager
+    def redirect(self, target: TextIO) -> Iterator[TextIO]:
+        previous = getattr(self._local, "target", None)
+        self._local.target = target
+        try:
+            yield target
+        finally:
+            self._local.target = previous
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+
+class ThreadLocalFigures(MutableMapping):
+    """
+    Per-thread replacement for pyplot's global figure registry (`Gcf.figs`).
+
+    pyplot tracks the "current" figure in a process-wide OrderedDict, so
+    `plt.gcf()` in one thread can return a figure created by another. With
+    this mapping installed, `plt.figure()`, `plt.gcf()`, `plt.get_fignums()`
+    and `plt.close("all")` only see the calling thread's figures.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @property
+    def _figs(self) -> "OrderedDict[int, Any]":
+        figs = getattr(self._local, "figs", None)
+        if figs is None:
+            figs = self._local.figs = OrderedDict()
+        return figs
+
+    def __getitem__(self, key: int) -> Any:
+        return self._figs[key]
+
+    def __setitem__(self, key: int, value: Any) -> None:
+        self._figs[key] = value
+
+    def __delitem__(self, key: int) -> None:
+        del self._figs[key]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._figs))
+
+    def __len__(self) -> int:
+        return len(self._figs)
+
+    # pyplot iterates these in reverse, which the generic MutableMapping views do not support.
+    def keys(self) -> Any:
+        return self._figs.keys()
+
+    def values(self) -> Any:
+        return self._figs.values()
+
+    def items(self) -> Any:
+        return self._figs.items()
+
+    def clear(self) -> None:
+        self._figs.clear()
+
+    def move_to_end(self, key: int, last: bool = True) -> None:
+        self._figs.move_to_end(key, last)
+
+
+def install_thread_isolation() -> None:
+    """Install the per-thread stdout/stderr proxies and figure registry (idempotent)."""
+    with _install_lock:
+        if not isinstance(sys.stdout, ThreadLocalStream):
+            sys.stdout = ThreadLocalStream(sys.stdout)  # type: ignore
+        if not isinstance(sys.stderr, ThreadLocalStream):
+            sys.stderr = ThreadLocalStream(sys.stderr)  # type: ignore
+        gcf = _pylab_helpers.Gcf
+        if not isinstance(gcf.figs, ThreadLocalFigures):
+            existing = list(gcf.figs.items())
+            gcf.figs = ThreadLocalFigures()
+            for num, manager in existing:
+                gcf.figs[num] = manager
+
+
+@contextmanager
+def capture_output(stdout: TextIO, stderr: TextIO) -> Iterator[None]:
+    """Redirect this thread's stdout and stderr without touching other threads."""
+    install_thread_isolation()
+    with sys.stdout.redirect(stdout), sys.stderr.redirect(stderr):  # type: ignore
+        yield
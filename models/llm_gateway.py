@@ -0,0 +1,232 @@
+import asyncio
+import concurrent.futures
+import queue
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+try:
+    import httpx  # type: ignore
+    TRANSPORT_ERRORS: tuple[type[BaseException], ...] = (httpx.TransportError,)
+except ImportError:  # pragma: no cover - httpx comes with google-genai
+    TRANSPORT_ERRORS = ()
+
+T = TypeVar("T")
+RetryCallback = Callable[[BaseException], None]
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_STREAM_END = object()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError, TimeoutError) + TRANSPORT_ERRORS)
+
+
+class _StreamInterrupted(Exception):
+    """A stream failed after chunks were delivered; wraps the cause so it is not retried."""
+
+
+class TokenBucket:
+    """Async token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+        self.waited_seconds = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+
+
+class LLMGateway:
+    """
+    Process-wide gateway that runs every session's LLM calls on one event loop.
+
+    All sessions share one client (and therefore one pooled HTTP connection
+    set) through its async API. Calls are bounded by `max_concurrency`,
+    paced by a token bucket so bursts stay under the provider quota, and
+    retried with exponential backoff and jitter on 429/5xx and transport
+    errors. Streamlit script threads submit work and block on the result
+    while other sessions' I/O continues on the loop.
+
+    The client is duck-typed: anything with `.aio.chats.create(...)` and
+    `.aio.models.generate_content(...)` works, e.g. a local fake.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_concurrency: int = 16,
+        requests_per_minute: float = 60,
+        burst: Optional[int] = None,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._bucket = TokenBucket(requests_per_minute / 60, burst or max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._semaphore: asyncio.Semaphore
+        self._thread = threading.Thread(target=self._run_loop, name="llm-gateway", daemon=True)
+        self._started = threading.Event()
+        self._max_concurrency = max_concurrency
+        self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._started.set()
+        self._loop.run_forever()
+
+    def submit(
+        self, request: Callable[[], Awaitable[T]], on_retry: Optional[RetryCallback] = None
+    ) -> "concurrent.futures.Future[T]":
+        """
+        Schedule an async call on the gateway loop.
+
+        Parameters:
+            request: Zero-argument callable returning a fresh awaitable; it is
+                called again for every retry.
+            on_retry: Called with the error before each retry, e.g. to count
+                retries per chat turn.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the call's result.
+        """
+        return asyncio.run_coroutine_threadsafe(self._call(request, on_retry), self._loop)
+
+    async def _call(self, request: Callable[[], Awaitable[T]], on_retry: Optional[RetryCallback] = None) -> T:
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await self._with_retries(request, on_retry)
+            finally:
+                self.in_flight -= 1
+
+    async def _with_retries(self, request: Callable[[], Awaitable[T]], on_retry: Optional[RetryCallback]) -> T:
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                result = await request()
+                self.completed += 1
+                return result
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failed += 1
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                if on_retry is not None:
+                    on_retry(e)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    # ── Convenience wrappers used by the apps ────────────────────────────────
+
+    def create_chat(self, model: str, config: Any = None, history: Optional[list] = None) -> Any:
+        """Create an async chat bound to the shared client (no network call)."""
+        return self.client.aio.chats.create(model=model, config=config, history=history)
+
+    def send_message(
+        self, chat: Any, message: str, timeout: Optional[float] = None, on_retry: Optional[RetryCallback] = None
+    ) -> Any:
+        """Send a chat message through the gateway and wait for the reply."""
+        return self.submit(lambda: chat.send_message(message), on_retry).result(timeout)
+
+    def generate(
+        self,
+        model: str,
+        contents: Any,
+        config: Any = None,
+        timeout: Optional[float] = None,
+        on_retry: Optional[RetryCallback] = None,
+    ) -> Any:
+        """Stateless generate_content call through the gateway."""
+        return self.submit(
+            lambda: self.client.aio.models.generate_content(model=model, contents=contents, config=config),
+            on_retry,
+        ).result(timeout)
+
+    def stream_message(self, chat: Any, message: str, on_retry: Optional[RetryCallback] = None) -> Iterator[Any]:
+        """
+        Stream a chat reply through the gateway as a blocking iterator of chunks.
+
+        Retries only happen before the first chunk arrives; a stream that
+        fails midway raises in the consuming thread, since retrying would
+        repeat text (and code) the caller has already received.
+        """
+        chunks: "queue.Queue[Any]" = queue.Queue()
+        emitted = False
+
+        async def pump() -> None:
+            nonlocal emitted
+            stream = await chat.send_message_stream(message)
+            try:
+                async for chunk in stream:
+                    emitted = True
+                    chunks.put(chunk)
+            except Exception as e:
+                if emitted:
+                    raise _StreamInterrupted() from e
+                raise
+
+        async def run() -> None:
+            try:
+                await self._call(pump, on_retry)
+            except _StreamInterrupted as e:
+                chunks.put(e.__cause__)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_STREAM_END)
+
+        asyncio.run_coroutine_threadsafe(run(), self._loop)
+        while True:
+            item = chunks.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited_seconds": round(self._bucket.waited_seconds, 3),
+        }
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
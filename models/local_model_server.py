@@ -0,0 +1,381 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+ModelFactory = Callable[[], Any]
+TokenCallback = Callable[[int, str], bool]
+
+_STREAM_END = object()
+
+# Turn format used to replay history when a model exposes no prompt template.
+DEFAULT_TURN_TEMPLATE = "### Human:\n{0}\n\n### Assistant:\n{1}\n\n"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the server's request queue is at its depth cap."""
+
+
+def available_memory_bytes() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, or None where it cannot be read."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_instance_count(model_bytes: int, threads_per_instance: int = 4, memory_fraction: float = 0.8) -> int:
+    """How many model instances the machine can run: bounded by cores and by available RAM."""
+    by_cores = max((os.cpu_count() or 1) // threads_per_instance, 1)
+    memory = available_memory_bytes()
+    if memory is None or model_bytes <= 0:
+        return by_cores
+    return max(min(by_cores, int(memory * memory_fraction) // model_bytes), 1)
+
+
+def render_history(model: Any, history: list[dict[str, str]]) -> str:
+    """
+    Render past turns in the model's prompt template, as they would have been ingested.
+
+    gpt4all keeps the template of the open chat session in
+    `_current_prompt_template`, with `{0}`/`{1}` (or `%1`/`%2`) for the user
+    message and the reply.
+    """
+    template = getattr(model, "_current_prompt_template", None) or DEFAULT_TURN_TEMPLATE
+    turns = []
+    for i in range(0, len(history) - 1, 2):
+        user, reply = history[i]["content"], history[i + 1]["content"]
+        if "{0}" in template:
+            turns.append(template.format(user, reply))
+        else:
+            turns.append(template.replace("%1", user).replace("%2", reply))
+    return "".join(turns)
+
+
+@dataclass
+class _Session:
+    system_prompt: str
+    history: list[dict[str, str]] = field(default_factory=list)
+    pending: deque = field(default_factory=deque)
+    busy: bool = False
+    instance: Optional[int] = None  # instance whose context last held this conversation
+
+
+@dataclass
+class _Instance:
+    index: int
+    model: Any
+    session_id: Optional[str] = None  # conversation currently loaded in the model's context
+    turns: int = 0  # history length of that conversation when it was loaded
+    chat: Any = None  # the open chat_session context manager
+
+
+class TokenStream:
+    """Tokens of one generation, consumed by the requesting session as they are produced."""
+
+    def __init__(self, session_id: str, prompt: str, callback: Optional[TokenCallback], kwargs: dict[str, Any]):
+        self.session_id = session_id
+        self.prompt = prompt
+        self.callback = callback
+        self.kwargs = kwargs
+        self.enqueued_at = time.perf_counter()
+        self.queue_wait_s: Optional[float] = None
+        self.tokens = 0
+        self.tokens_per_s: Optional[float] = None
+        self.cancelled = False
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def text(self) -> str:
+        """Wait for the whole reply."""
+        return "".join(self)
+
+    def cancel(self) -> None:
+        """Stop generating at the next token (or drop the request if it has not started)."""
+        self.cancelled = True
+
+
+class LocalModelServer:
+    """
+    Schedule generations from many sessions onto a fixed set of local model instances.
+
+    Each instance is driven by one worker thread, so a model is never
+    entered concurrently. Conversation state lives here, per session, and
+    is installed on whichever instance serves the request; one request per
+    session runs at a time so turns stay in order. Sessions with pending
+    work are served round-robin, so one chatty session cannot starve the
+    rest, and `submit` refuses work once `max_queue_depth` requests are
+    waiting.
+
+    An instance keeps its chat session open between requests, and sessions
+    prefer the instance that served them last, so consecutive turns of one
+    conversation continue from the model's context. gpt4all's `generate`
+    feeds only the newest message and resets the context only while the
+    chat holds just its system prompt, so a conversation moved to another
+    instance is replayed: a fresh chat session whose system prompt is
+    followed by the rendered history, which the next `generate` ingests
+    after resetting the context.
+
+    Models are duck-typed on the gpt4all API: `chat_session(system_prompt=)`,
+    `current_chat_session` and `generate(prompt, streaming=True, callback=)`.
+    """
+
+    def __init__(
+        self,
+        model_factory: ModelFactory,
+        instances: int = 1,
+        max_queue_depth: int = 32,
+        max_sessions: int = 256,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_sessions = max_sessions
+        self.completed = 0
+        self.rejected = 0
+        self.context_reuses = 0
+        self.replays = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._ready: deque[str] = deque()  # sessions with pending work, in service order
+        self._depth = 0
+        self._waits: deque[float] = deque(maxlen=1000)
+        self._rates: deque[float] = deque(maxlen=1000)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._instances = [_Instance(i, model_factory()) for i in range(instances)]
+        self._workers = [
+            threading.Thread(target=self._work, args=(instance,), name=f"local-model-{instance.index}", daemon=True)
+            for instance in self._instances
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # ── Sessions ────────────────────────────────────────────────────────────
+
+    def open_session(self, session_id: str, system_prompt: str,
+                     history: Optional[list[dict[str, str]]] = None) -> None:
+        """
+        Start (or restart) a conversation; the least recently used idle session is dropped past `max_sessions`.
+
+        `history` (alternating user and assistant messages) resumes a
+        conversation, e.g. one dropped here while its user was away.
+        """
+        with self._cond:
+            self._sessions[session_id] = _Session(system_prompt, list(history or []))
+            self._sessions.move_to_end(session_id)
+            for sid in list(self._sessions):
+                if len(self._sessions) <= self.max_sessions:
+                    break
+                state = self._sessions[sid]
+                if sid != session_id and not state.busy and not state.pending:
+                    del self._sessions[sid]
+
+    def close_session(self, session_id: str) -> None:
+        with self._cond:
+            state = self._sessions.pop(session_id, None)
+            if session_id in self._ready:
+                self._ready.remove(session_id)
+            if state is not None:
+                for request in state.pending:
+                    request.cancel()
+                    request._queue.put(_STREAM_END)
+                self._depth -= len(state.pending)
+
+    def has_session(self, session_id: str) -> bool:
+        with self._cond:
+            return session_id in self._sessions
+
+    def history(self, session_id: str) -> list[dict[str, str]]:
+        with self._cond:
+            return list(self._sessions[session_id].history)
+
+    def record_exchange(self, session_id: str, prompt: str, reply: str) -> None:
+        """Append a turn produced elsewhere (e.g. a coalesced opening reply) to a session's history."""
+        with self._cond:
+            self._sessions[session_id].history += [
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": reply},
+            ]
+
+    # ── Requests ────────────────────────────────────────────────────────────
+
+    def submit(self, session_id: str, prompt: str, callback: Optional[TokenCallback] = None,
+               **generate_kwargs: Any) -> TokenStream:
+        """
+        Queue a generation for a session and return its token stream.
+
+        Parameters:
+            session_id: A session opened with `open_session`; check
+                `has_session` first, since idle sessions may have been dropped.
+            prompt: The user message.
+            callback: Optional gpt4all-style `(token_id, token) -> bool`
+                callback; returning False stops generation.
+            generate_kwargs: Passed to the model's `generate`.
+
+        Raises:
+            QueueFullError: If `max_queue_depth` requests are already waiting.
+            KeyError: If the session is not open.
+        """
+        request = TokenStream(session_id, prompt, callback, generate_kwargs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LocalModelServer is closed")
+            if self._depth >= self.max_queue_depth:
+                self.rejected += 1
+                raise QueueFullError(f"{self._depth} requests already queued; try again shortly.")
+            state = self._sessions[session_id]
+            state.pending.append(request)
+            self._depth += 1
+            if not state.busy and session_id not in self._ready:
+                self._ready.append(session_id)
+            self._cond.notify()
+        return request
+
+    def generate(self, session_id: str, prompt: str, callback: Optional[TokenCallback] = None,
+                 **generate_kwargs: Any) -> str:
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(session_id, prompt, callback, **generate_kwargs).text()
+
+    def _next_request(self, instance: _Instance) -> Optional[tuple[_Session, TokenStream]]:
+        with self._cond:
+            while not self._ready and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            # Round-robin, except that among the next few sessions in line one
+            # whose conversation is already in this instance's context goes first.
+            position = 0
+            for i, sid in enumerate(itertools.islice(self._ready, len(self._instances))):
+                if self._sessions[sid].instance == instance.index:
+                    position = i
+                    break
+            session_id = self._ready[position]
+            del self._ready[position]
+            state = self._sessions[session_id]
+            request = state.pending.popleft()
+            self._depth -= 1
+            state.busy = True
+            return state, request
+
+    def _finish(self, request: TokenStream) -> None:
+        with self._cond:
+            state = self._sessions.get(request.session_id)
+            if state is None:
+                return
+            state.busy = False
+            if state.pending and request.session_id not in self._ready:
+                self._ready.append(request.session_id)
+                self._cond.notify()
+
+    def _work(self, instance: _Instance) -> None:
+        while True:
+            item = self._next_request(instance)
+            if item is None:
+                self._release(instance)
+                return
+            state, request = item
+            try:
+                if not request.cancelled:
+                    self._run(instance, state, request)
+            except BaseException as e:
+                request._queue.put(e)
+            finally:
+                request._queue.put(_STREAM_END)
+                self._finish(request)
+
+    def _release(self, instance: _Instance) -> None:
+        if instance.chat is not None:
+            instance.chat.__exit__(None, None, None)
+        instance.chat = None
+        instance.session_id = None
+
+    def _load_conversation(self, instance: _Instance, session_id: str, state: _Session) -> None:
+        """Make the instance's context hold `state`'s conversation, reusing what is already there."""
+        model = instance.model
+        if instance.session_id == session_id and instance.turns == len(state.history):
+            self.context_reuses += 1
+            return
+        self._release(instance)
+        instance.chat = model.chat_session(system_prompt=state.system_prompt)
+        instance.chat.__enter__()
+        instance.session_id = session_id
+        if state.history:
+            # Setting the history itself would not reach the model's context; replaying
+            # it as part of the system prompt makes the next generate() ingest all of it.
+            model.current_chat_session = [
+                {"role": "system", "content": state.system_prompt + render_history(model, state.history)}
+            ]
+            self.replays += 1
+
+    def _run(self, instance: _Instance, state: _Session, request: TokenStream) -> None:
+        started = time.perf_counter()
+        request.queue_wait_s = started - request.enqueued_at
+        self._waits.append(request.queue_wait_s)
+
+        def on_token(token_id: int, token: str) -> bool:
+            if request.cancelled:
+                return False
+            return request.callback(token_id, token) if request.callback else True
+
+        model = instance.model
+        try:
+            self._load_conversation(instance, request.session_id, state)
+            turns_before = len(model.current_chat_session)
+            for token in model.generate(request.prompt, streaming=True, callback=on_token, **request.kwargs):
+                request.tokens += 1
+                request._queue.put(token)
+            state.history = state.history + list(model.current_chat_session[turns_before:])
+        except BaseException:
+            self._release(instance)  # the context may hold a partial turn
+            raise
+        instance.turns = len(state.history)
+        state.instance = instance.index
+
+        elapsed = time.perf_counter() - started
+        request.tokens_per_s = request.tokens / elapsed if elapsed > 0 else None
+        if request.tokens_per_s is not None:
+            self._rates.append(request.tokens_per_s)
+        self.completed += 1
+
+    # ── Metrics ─────────────────────────────────────────────────────────────
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, active sessions, and recent queue-wait and tokens/sec figures."""
+        waits = sorted(self._waits)
+        rates = list(self._rates)
+        pick = lambda values, q: values[min(int(q * len(values)), len(values) - 1)] if values else None
+        with self._cond:
+            busy = sum(1 for s in self._sessions.values() if s.busy)
+            depth = self._depth
+        return {
+            "instances": len(self._instances),
+            "queue_depth": depth,
+            "busy": busy,
+            "sessions": len(self._sessions),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_p50_s": pick(waits, 0.5),
+            "queue_wait_p95_s": pick(waits, 0.95),
+            "tokens_per_s": sum(rates) / len(rates) if rates else None,
+            "context_reuses": self.context_reuses,
+            "replays": self.replays,
+        }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
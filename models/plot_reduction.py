@@ -0,0 +1,342 @@
+import builtins
+import functools
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.axes import Axes
+
+# Seaborn functions whose cost grows with every row (KDEs, swarms, bootstrapped fits);
+# they are drawn from a uniform sample of large inputs.
+SAMPLED_FUNCTIONS = {
+    "kdeplot", "violinplot", "swarmplot", "stripplot", "regplot", "lmplot",
+    "residplot", "jointplot", "pairplot",
+}
+_NOTE_GID = "plot-reduction"
+
+
+@dataclass(frozen=True)
+class PlotReduction:
+    """Thresholds above which plotting calls are drawn from reduced data."""
+    line_max_points: int = 5_000  # per chart; lines are downsampled with LTTB
+    scatter_max_points: int = 20_000  # scatters become hexbins (or a sample when colored by group)
+    hexbin_gridsize: int = 60
+    bar_max_rows: int = 100_000  # bars/counts are pre-aggregated without error bars
+    max_categories: int = 50  # bars beyond this are limited to the most frequent categories
+    sample_rows: int = 20_000  # for SAMPLED_FUNCTIONS
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points.
+
+    `x` must be sorted. The first and last points are always kept; from
+    each bucket in between, the point forming the largest triangle with
+    the previously kept point and the next bucket's average is chosen, so
+    peaks and troughs survive.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf = np.asarray(x, dtype="float64")
+    yf = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[end:next_end].mean()
+        avg_y = yf[end:next_end].mean()
+        area = np.abs((xf[a] - avg_x) * (yf[start:end] - yf[a]) - (xf[a] - xf[start:end]) * (avg_y - yf[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _numeric(values: Any) -> Optional[np.ndarray]:
+    """Values as float64 (datetimes as nanoseconds), or None for non-numeric data."""
+    series = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype("float64")
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+    return None
+
+
+def annotate_reduction(target: Any, text: str) -> None:
+    """Note on a chart that it was drawn from reduced data; notes on one Axes are combined."""
+    if isinstance(target, Axes):
+        for existing in target.texts:
+            if existing.get_gid() == _NOTE_GID:
+                existing.set_text(f"{existing.get_text()}\n{text}")
+                return
+        target.text(
+            0.99, 0.01, text, transform=target.transAxes, ha="right", va="bottom",
+            fontsize=7, color="dimgray", gid=_NOTE_GID,
+            bbox={"facecolor": "white", "alpha": 0.7, "edgecolor": "none", "pad": 1.5},
+        )
+    else:  # seaborn figure-level grids
+        figure = getattr(target, "figure", None) or plt.gcf()
+        figure.text(0.99, 0.005, text, ha="right", va="bottom", fontsize=7, color="dimgray", gid=_NOTE_GID)
+
+
+class _ModuleProxy:
+    """A module whose listed attributes are replaced; everything else is the real module's."""
+
+    def __init__(self, module: Any, overrides: dict[str, Any]):
+        self._module = module
+        self._overrides = overrides
+
+    def __getattr__(self, name: str) -> Any:
+        if name in self._overrides:
+            return self._overrides[name]
+        return getattr(self._module, name)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._module)
+
+    def __repr__(self) -> str:
+        return f"<reduced {self._module!r}>"
+
+
+class PlotReducer:
+    """
+    Reducing wrappers around seaborn and pyplot plotting entry points.
+
+    Large inputs are reduced before drawing: line charts keep an LTTB
+    selection of points (after averaging repeated x values, which seaborn
+    would otherwise bootstrap), scatters become hexbins, bar and count
+    charts are pre-aggregated, and KDE/swarm/regression plots use a uniform
+    sample. Each reduced chart is annotated. Calls that do not match a
+    supported shape (e.g. no `data=` DataFrame, unsorted x for `plt.plot`)
+    are passed through unchanged, as are methods called on Axes directly.
+    """
+
+    def __init__(self, config: PlotReduction):
+        self.config = config
+        wrapped = {
+            "lineplot": self._lineplot,
+            "scatterplot": self._scatterplot,
+            "barplot": self._barplot,
+            "countplot": self._countplot,
+        }
+        for name in SAMPLED_FUNCTIONS:
+            wrapped[name] = functools.partial(self._sampled, getattr(sns, name))
+        self.sns = _ModuleProxy(sns, wrapped)
+        self.plt = _ModuleProxy(plt, {"plot": self._plt_plot, "scatter": self._plt_scatter})
+        self.matplotlib = _ModuleProxy(matplotlib, {"pyplot": self.plt})
+
+    def exec_globals(self) -> dict[str, Any]:
+        """`sns`/`plt` proxies plus an `__import__` that hands them out for `import seaborn` etc."""
+        return {
+            "sns": self.sns,
+            "plt": self.plt,
+            "__builtins__": dict(vars(builtins), __import__=self._import),
+        }
+
+    def _import(self, name: str, globals: Any = None, locals: Any = None, fromlist: Any = (), level: int = 0) -> Any:
+        module = builtins.__import__(name, globals, locals, fromlist, level)
+        if level != 0:
+            return module
+        if name == "seaborn":
+            return self.sns
+        if name == "matplotlib.pyplot":
+            return self.plt if fromlist else self.matplotlib
+        if name == "matplotlib":
+            return self.matplotlib
+        return module
+
+    # ── Seaborn ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _split_data(args: tuple, kwargs: dict[str, Any]) -> tuple[Optional[pd.DataFrame], tuple]:
+        data = kwargs.get("data")
+        if data is None and args and isinstance(args[0], pd.DataFrame):
+            data, args = args[0], args[1:]
+        return (data if isinstance(data, pd.DataFrame) else None), args
+
+    @staticmethod
+    def _columns(data: pd.DataFrame, kwargs: dict[str, Any], names: tuple[str, ...]) -> Optional[list[str]]:
+        """The string column arguments among `names`, or None if any argument is not a column name."""
+        columns = []
+        for name in names:
+            value = kwargs.get(name)
+            if value is None:
+                continue
+            if not isinstance(value, str) or value not in data.columns:
+                return None
+            columns.append(value)
+        return columns
+
+    def _lineplot(self, *args: Any, **kwargs: Any) -> Any:
+        data, args = self._split_data(args, kwargs)
+        limit = self.config.line_max_points
+        x, y = kwargs.get("x"), kwargs.get("y")
+        groups = self._columns(data, kwargs, ("hue", "style", "size")) if data is not None else None
+        estimator = kwargs.get("estimator", "mean")
+        if (
+            data is None or args or groups is None or len(data) <= limit or "units" in kwargs
+            or estimator not in ("mean", np.mean) or not self._columns(data, kwargs, ("x", "y"))
+            or x is None or y is None
+        ):
+            return sns.lineplot(*args, **({**kwargs, "data": data} if data is not None else kwargs))
+
+        rows = len(data)
+        frame = data[list(dict.fromkeys([x, y, *groups]))]
+        method = []
+        if frame.duplicated([*groups, x]).any():
+            frame = frame.groupby([*groups, x], observed=True, sort=True)[y].mean().reset_index()
+            method.append("mean per x")
+        if len(frame) > limit and _numeric(frame[x]) is not None:
+            parts = [part for _, part in frame.groupby(groups, observed=True)] if groups else [frame]
+            budget = max(limit // len(parts), 3)
+            kept = []
+            for part in parts:
+                part = part.dropna(subset=[x, y]).sort_values(x)
+                kept.append(part.iloc[lttb(_numeric(part[x]), _numeric(part[y]), budget)])
+            frame = pd.concat(kept)
+            method.append("LTTB")
+        kwargs.update(data=frame, errorbar=None)
+        ax = sns.lineplot(**kwargs)
+        annotate_reduction(ax, f"Reduced: {rows:,} rows → {len(frame):,} points ({', '.join(method)})")
+        return ax
+
+    def _scatterplot(self, *args: Any, **kwargs: Any) -> Any:
+        data, args = self._split_data(args, kwargs)
+        limit = self.config.scatter_max_points
+        if data is None or args or len(data) <= limit or not self._columns(data, kwargs, ("x", "y")) \
+                or kwargs.get("x") is None or kwargs.get("y") is None:
+            return sns.scatterplot(*args, **({**kwargs, "data": data} if data is not None else kwargs))
+
+        x, y = kwargs["x"], kwargs["y"]
+        xs, ys = _numeric(data[x]), _numeric(data[y])
+        grouped = any(kwargs.get(name) is not None for name in ("hue", "size", "style"))
+        if grouped or xs is None or ys is None:
+            kwargs["data"] = data.sample(n=limit, random_state=0)
+            ax = sns.scatterplot(**kwargs)
+            annotate_reduction(ax, f"Reduced: random sample of {limit:,} of {len(data):,} rows")
+            return ax
+        ax = kwargs.get("ax") or plt.gca()
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        return self._hexbin(ax, xs, ys)
+
+    def _hexbin(self, ax: Axes, xs: np.ndarray, ys: np.ndarray) -> Axes:
+        mask = ~(np.isnan(xs) | np.isnan(ys))
+        cells = ax.hexbin(xs[mask], ys[mask], gridsize=self.config.hexbin_gridsize, bins="log", mincnt=1, cmap="viridis")
+        ax.figure.colorbar(cells, ax=ax, label="rows (log scale)")
+        annotate_reduction(ax, f"Reduced: {int(mask.sum()):,} points binned into hexagons")
+        return ax
+
+    def _bar_frame(self, data: pd.DataFrame, category: str, hue: Optional[str]) -> tuple[pd.DataFrame, Optional[str]]:
+        """Limit `data` to the most frequent categories; returns the frame and a note if any were dropped."""
+        counts = data[category].value_counts()
+        if len(counts) <= self.config.max_categories:
+            return data, None
+        top = counts.index[: self.config.max_categories]
+        return data[data[category].isin(top)], f"top {len(top)} of {len(counts):,} categories"
+
+    def _barplot(self, *args: Any, **kwargs: Any) -> Any:
+        data, args = self._split_data(args, kwargs)
+        estimator = kwargs.get("estimator", "mean")
+        columns = self._columns(data, kwargs, ("x", "y", "hue")) if data is not None else None
+        x, y, hue = kwargs.get("x"), kwargs.get("y"), kwargs.get("hue")
+        if (
+            data is None or args or columns is None or len(data) <= self.config.bar_max_rows
+            or x is None or y is None or not isinstance(estimator, str)
+        ):
+            return sns.barplot(*args, **({**kwargs, "data": data} if data is not None else kwargs))
+
+        category, value = (y, x) if _numeric(data[x]) is not None and _numeric(data[y]) is None else (x, y)
+        frame, dropped = self._bar_frame(data, category, hue)
+        keys = [category] + ([hue] if hue is not None and hue != category else [])
+        aggregated = frame.groupby(keys, observed=True, sort=False)[value].agg(estimator).reset_index()
+        for name in ("estimator", "errorbar", "n_boot", "seed", "ci"):
+            kwargs.pop(name, None)
+        kwargs.update(data=aggregated, errorbar=None)
+        ax = sns.barplot(**kwargs)
+        note = f"Reduced: {len(data):,} rows pre-aggregated ({estimator}), no error bars"
+        annotate_reduction(ax, f"{note}; {dropped}" if dropped else note)
+        return ax
+
+    def _countplot(self, *args: Any, **kwargs: Any) -> Any:
+        data, args = self._split_data(args, kwargs)
+        x, y, hue = kwargs.get("x"), kwargs.get("y"), kwargs.get("hue")
+        columns = self._columns(data, kwargs, ("x", "y", "hue")) if data is not None else None
+        if (
+            data is None or args or columns is None or len(data) <= self.config.bar_max_rows
+            or (x is None) == (y is None) or kwargs.get("stat", "count") != "count"
+        ):
+            return sns.countplot(*args, **({**kwargs, "data": data} if data is not None else kwargs))
+
+        category = x if x is not None else y
+        frame, dropped = self._bar_frame(data, category, hue)
+        keys = [category] + ([hue] if hue is not None and hue != category else [])
+        counts = frame.groupby(keys, observed=True, sort=False).size().reset_index(name="count")
+        if x is not None:
+            kwargs["y"] = "count"
+        else:
+            kwargs["x"] = "count"
+        kwargs.update(data=counts, errorbar=None)
+        ax = sns.barplot(**kwargs)
+        note = f"Reduced: {len(data):,} rows pre-counted"
+        annotate_reduction(ax, f"{note}; {dropped}" if dropped else note)
+        return ax
+
+    def _sampled(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        data, args = self._split_data(args, kwargs)
+        limit = self.config.sample_rows
+        if data is None or len(data) <= limit:
+            return function(*args, **({**kwargs, "data": data} if data is not None else kwargs))
+        kwargs["data"] = data.sample(n=limit, random_state=0)
+        result = function(*args, **kwargs)
+        annotate_reduction(result, f"Reduced: random sample of {limit:,} of {len(data):,} rows")
+        return result
+
+    # ── Pyplot ──────────────────────────────────────────────────────────────
+
+    def _plt_plot(self, *args: Any, **kwargs: Any) -> Any:
+        limit = self.config.line_max_points
+        fmt = args[-1:] if args and isinstance(args[-1], str) else ()
+        values = args[: len(args) - len(fmt)]
+        if len(values) not in (1, 2) or "data" in kwargs:
+            return plt.plot(*args, **kwargs)
+        if len(values) == 1:
+            y = values[0]
+            x = y.index if isinstance(y, pd.Series) else np.arange(len(y))
+        else:
+            x, y = values
+        if np.ndim(y) != 1 or len(y) <= limit:
+            return plt.plot(*args, **kwargs)
+        xs, ys = _numeric(x), _numeric(y)
+        if xs is None or ys is None or len(xs) != len(ys) or np.isnan(xs).any() or (np.diff(xs) < 0).any():
+            return plt.plot(*args, **kwargs)
+        keep = lttb(xs, ys, limit)
+        take = lambda v: v.iloc[keep] if isinstance(v, pd.Series) else np.asarray(v)[keep]
+        lines = plt.plot(take(x), take(y), *fmt, **kwargs)
+        annotate_reduction(plt.gca(), f"Reduced: {len(ys):,} points → {limit:,} (LTTB)")
+        return lines
+
+    def _plt_scatter(self, x: Any, y: Any, *args: Any, **kwargs: Any) -> Any:
+        limit = self.config.scatter_max_points
+        n = len(x) if hasattr(x, "__len__") else 0
+        if n <= limit or "data" in kwargs:
+            return plt.scatter(x, y, *args, **kwargs)
+        per_point = lambda v: np.ndim(v) == 1 and len(v) == n
+        xs, ys = _numeric(x), _numeric(y)
+        if xs is None or ys is None or any(per_point(v) for v in [*args, *kwargs.values()]):
+            # Sizes or colors per point: keep a sample so they stay aligned with the points.
+            keep = np.sort(np.random.default_rng(0).choice(n, size=limit, replace=False))
+            take = lambda v: (v.iloc[keep] if isinstance(v, pd.Series) else np.asarray(v)[keep]) if per_point(v) else v
+            collection = plt.scatter(
+                take(x), take(y), *map(take, args), **{name: take(v) for name, v in kwargs.items()}
+            )
+            annotate_reduction(plt.gca(), f"Reduced: random sample of {limit:,} of {n:,} points")
+            return collection
+        return self._hexbin(plt.gca(), xs, ys).collections[-1]
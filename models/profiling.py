@@ -0,0 +1,190 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.25, 0.5, 0.75)
+NUMERIC_SUMMARY_COLUMNS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max", "missing_values"]
+
+
+@dataclass
+class ColumnProfile:
+    """Statistics of one column, computed in a single pass over its values."""
+    name: str
+    dtype: str
+    kind: str  # "numeric", "categorical", "datetime", "boolean" or "other"
+    count: int
+    missing: int
+    distinct: int
+    top: list[tuple[Any, int]] = field(default_factory=list)
+    mode: Any = None
+    min: Any = None
+    max: Any = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    quantiles: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class DatasetProfile:
+    """Machine-readable profile of a DataFrame; cacheable via `to_dict`/`from_dict`."""
+    n_rows: int
+    columns: dict[str, ColumnProfile]
+
+    def numerical_summary(self) -> pd.DataFrame:
+        """Same layout as `summarize_numerical`: describe() statistics plus missing_values."""
+        rows = {
+            name: {
+                "count": float(col.count),
+                "mean": col.mean,
+                "std": col.std,
+                "min": col.min,
+                **{f"{q:.0%}": col.quantiles.get(f"{q:.0%}") for q in QUANTILES},
+                "max": col.max,
+                "missing_values": col.missing,
+            }
+            for name, col in self.columns.items() if col.kind == "numeric"
+        }
+        summary = pd.DataFrame.from_dict(rows, orient="index", columns=NUMERIC_SUMMARY_COLUMNS)
+        return summary.astype({c: float for c in NUMERIC_SUMMARY_COLUMNS[:-1]})
+
+    def categorical_summary(self) -> pd.DataFrame:
+        """Same layout as `summarize_categorical`: unique count, top value, its frequency and missing values."""
+        categorical_summary = {
+            name: {
+                "unique_values": col.distinct,
+                "most_frequent": None if col.mode is None else str(col.mode),
+                "frequency": col.top[0][1] if col.top else None,
+                "missing_values": col.missing,
+            }
+            for name, col in self.columns.items() if col.kind == "categorical"
+        }
+        return pd.DataFrame(categorical_summary).T
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"n_rows": self.n_rows, "columns": [asdict(col) for col in self.columns.values()]}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "DatasetProfile":
+        columns = {}
+        for col in data["columns"]:
+            col = dict(col, top=[tuple(item) for item in col["top"]])
+            columns[col["name"]] = ColumnProfile(**col)
+        return cls(n_rows=data["n_rows"], columns=columns)
+
+
+def column_kind(series: pd.Series) -> str:
+    """Classify a column the way the summaries group them."""
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if (
+        isinstance(dtype, pd.CategoricalDtype)
+        or pd.api.types.is_object_dtype(dtype)
+        or pd.api.types.is_string_dtype(dtype)
+    ):
+        return "categorical"
+    return "other"
+
+
+def _python_scalar(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _mode_from_counts(counts: pd.Series) -> Any:
+    """Pick the value `Series.mode()[0]` would return: the smallest of the most frequent."""
+    tied = counts.index[counts.to_numpy() == counts.iloc[0]]
+    try:
+        return _python_scalar(min(tied))
+    except TypeError:
+        return _python_scalar(tied[0])
+
+
+def _profile_numeric(name: str, series: pd.Series, top_k: int) -> ColumnProfile:
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    values = values[~np.isnan(values)]
+    values.sort()  # one sort gives min/max, quantiles, distinct count and top values
+    count = len(values)
+    profile = ColumnProfile(
+        name=str(name), dtype=str(series.dtype), kind="numeric",
+        count=count, missing=len(series) - count, distinct=0,
+    )
+    if count == 0:
+        profile.quantiles = {f"{q:.0%}": np.nan for q in QUANTILES}
+        profile.mean = profile.std = profile.min = profile.max = np.nan
+        return profile
+
+    boundaries = np.flatnonzero(np.diff(values)) + 1
+    starts = np.concatenate(([0], boundaries))
+    run_lengths = np.diff(np.concatenate((starts, [count])))
+    order = np.argsort(-run_lengths, kind="stable")[:top_k]
+
+    profile.distinct = len(starts)
+    profile.top = [(float(values[starts[i]]), int(run_lengths[i])) for i in order]
+    profile.mode = profile.top[0][0]
+    profile.min = float(values[0])
+    profile.max = float(values[-1])
+    profile.mean = float(values.mean())
+    profile.std = float(values.std(ddof=1)) if count > 1 else np.nan
+    profile.quantiles = {
+        f"{q:.0%}": float(v) for q, v in zip(QUANTILES, np.quantile(values, QUANTILES))
+    }
+    return profile
+
+
+def _profile_values(name: str, series: pd.Series, kind: str, top_k: int) -> ColumnProfile:
+    counts = series.value_counts(dropna=True, sort=True)
+    count = int(counts.sum())
+    profile = ColumnProfile(
+        name=str(name), dtype=str(series.dtype), kind=kind,
+        count=count, missing=len(series) - count, distinct=len(counts),
+        top=[(_python_scalar(v), int(n)) for v, n in counts.head(top_k).items()],
+    )
+    if len(counts):
+        profile.mode = _mode_from_counts(counts)
+        if kind == "datetime":
+            profile.min = str(counts.index.min())
+            profile.max = str(counts.index.max())
+    return profile
+
+
+def profile_column(series: pd.Series, top_k: int = 5) -> ColumnProfile:
+    """Compute counts, missing values, distinct count, top-k and range statistics for one column."""
+    kind = column_kind(series)
+    if kind == "numeric":
+        return _profile_numeric(series.name, series, top_k)
+    return _profile_values(series.name, series, kind, top_k)
+
+
+def profile_dataframe(
+    df: pd.DataFrame,
+    top_k: int = 5,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> DatasetProfile:
+    """
+    Profile every column of a DataFrame in one pass per column.
+
+    Parameters:
+        df (pd.DataFrame): The DataFrame to profile.
+        top_k (int): Number of most frequent values kept per column.
+        max_workers (int, optional): Profile columns in parallel with this many workers; None runs serially.
+        use_processes (bool): Use a process pool instead of threads (pays for pickling each column).
+
+    Returns:
+        DatasetProfile: Per-column profiles, convertible to the summary frames.
+    """
+    series = [df.iloc[:, i] for i in range(df.shape[1])]
+    if max_workers and len(series) > 1:
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_cls(max_workers=max_workers) as pool:
+            profiles = list(pool.map(profile_column, series, [top_k] * len(series)))
+    else:
+        profiles = [profile_column(s, top_k) for s in series]
+    return DatasetProfile(n_rows=len(df), columns={p.name: p for p in profiles})
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from models.columnar import DEFAULT_CACHE_DIR
+
+
+@dataclass
+class CachedResponse:
+    """Everything needed to replay a turn without calling the model or running code."""
+    reply: str
+    code: Optional[str] = None
+    output: Optional[str] = None
+    figure_png: Optional[bytes] = None
+    scope: Optional[str] = None
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Hash column names and dtypes, so a changed schema never reuses cached answers."""
+    schema = "\n".join(f"{name}\t{dtype}" for name, dtype in df.dtypes.items())
+    return hashlib.blake2b(schema.encode(), digest_size=16).hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Fold case, unicode forms, punctuation and whitespace that do not change a question's meaning.
+
+    Operators and quotes are kept: "sales > 100" and "sales < 100" are different questions.
+    """
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = re.sub(r"[^\w\s%.,<>=!*/+^'\"-]", " ", text)  # keep identifiers, numbers, operators and quotes
+    text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)
+    return " ".join(text.split())
+
+
+def figure_to_png(figure: Figure) -> bytes:
+    """Render a Matplotlib figure to PNG bytes."""
+    buf = io.BytesIO()
+    figure.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of model replies and their rendered results.
+
+    Entries are keyed by model, dataset schema and content fingerprints
+    and the normalized prompt. They expire after `ttl_seconds`, and the
+    least recently used are evicted once `max_entries` or `max_bytes` is
+    exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join(DEFAULT_CACHE_DIR, "responses.sqlite3"),
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        max_bytes: int = 512 * 1024 ** 2,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                reply TEXT NOT NULL,
+                code TEXT,
+                output TEXT,
+                figure_png BLOB,
+                scope TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(
+        model: str, schema_fp: str, content_fp: str, prompt: str, prior_prompts: Sequence[str] = ()
+    ) -> str:
+        """
+        Build the cache key for a question about a given dataset.
+
+        `prior_prompts` are the conversation's earlier questions: follow-ups
+        such as "now by month" only mean the same thing after the same turns.
+        """
+        history = "\x1e".join(normalize_prompt(p) for p in prior_prompts)
+        raw = "\x1f".join([model, schema_fp, content_fp, history, normalize_prompt(prompt)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the cached response for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, reply, code, output, figure_png, scope FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or now - row[0] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return CachedResponse(*row[1:])
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        """Store a response and evict expired or least recently used entries."""
+        now = time.time()
+        size = sum(
+            len(value) for value in (
+                response.reply.encode(), (response.code or "").encode(),
+                (response.output or "").encode(), response.figure_png or b"",
+            )
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, now, now, size, response.reply, response.code,
+                 response.output, response.figure_png, response.scope),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def stats(self) -> dict[str, float]:
+        """Return hit/miss counters, hit rate and current cache size."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": count,
+                "bytes": total,
+            }
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from models.columnar import DEFAULT_CACHE_DIR, iter_csv_columnar, read_csv_columnar
+from models.dtype_optimizer import apply_dtypes
+from models.utils import fingerprint_file
+
+ROW_ORDINAL = "__row__"
+
+
+@dataclass
+class SampledDataset:
+    """A reservoir sample of a large CSV plus the on-disk path of the full file."""
+    sample: pd.DataFrame
+    path: str
+    total_rows: int
+
+    @property
+    def is_sampled(self) -> bool:
+        return len(self.sample) < self.total_rows
+
+    def full_data_access(self) -> "FullDataAccess":
+        """Return per-execution helpers that record whether the full file was read."""
+        return FullDataAccess(self.path, self.total_rows, self.sample.dtypes)
+
+
+class FullDataAccess:
+    """
+    Helpers injected into generated code for exact computations on the full file.
+
+    The file is read with the same Arrow reader as the sample and given the
+    sample's dtypes (`dtypes`), so code written against `df` runs unchanged.
+    """
+
+    def __init__(self, path: str, total_rows: int, dtypes: Optional[pd.Series] = None):
+        self.path = path
+        self.total_rows = total_rows
+        self.dtypes = dtypes
+        self.used = False
+
+    def iter_full_data(
+        self, chunksize: int = 200_000, columns: Optional[Sequence[str]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the full dataset from disk in chunks."""
+        self.used = True
+        for chunk in iter_csv_columnar(self.path, chunksize, columns):
+            yield chunk if self.dtypes is None else apply_dtypes(chunk, self.dtypes)
+
+    def load_full_df(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Load the full dataset (optionally only some columns) into memory."""
+        self.used = True
+        df, error = read_csv_columnar(self.path, cache_dir=None, columns=columns)
+        if df is None:
+            raise ValueError(error)
+        return df if self.dtypes is None else apply_dtypes(df, self.dtypes)
+
+    def exec_globals(self) -> dict[str, object]:
+        return {
+            "iter_full_data": self.iter_full_data,
+            "load_full_df": self.load_full_df,
+            "total_rows": self.total_rows,
+        }
+
+
+def spill_upload(file: Any, path: str, chunk_size: int = 1 << 20) -> str:
+    """Copy an uploaded file to `path` in chunks, unless it already exists there."""
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        return os.fspath(file)  # type: ignore
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temp file per writer: sessions are threads of one process and may spill the same upload.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        file.seek(0)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file, out, chunk_size)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    file.seek(0)
+    return path
+
+
+def reservoir_sample_csv(
+    path: str,
+    sample_rows: int = 100_000,
+    chunksize: int = 200_000,
+    seed: Optional[int] = 0,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Draw a uniform random sample of rows from a CSV without loading it whole.
+
+    Uses reservoir sampling (Algorithm R) vectorized per chunk, so memory
+    stays bounded by `sample_rows + chunksize` rows.
+
+    Parameters:
+        path (str): Path of the CSV file.
+        sample_rows (int): Size of the reservoir.
+        chunksize (int): Rows read per chunk.
+        seed (int, optional): Seed for a reproducible sample.
+
+    Returns:
+        tuple: (sample in original row order, total number of rows)
+    """
+    rng = np.random.default_rng(seed)
+    reservoir: Optional[pd.DataFrame] = None
+    seen = 0
+    for chunk in iter_csv_columnar(path, chunksize):
+        chunk.index = pd.RangeIndex(seen, seen + len(chunk), name=ROW_ORDINAL)
+        n_fill = 0
+        if reservoir is None or len(reservoir) < sample_rows:
+            n_fill = min(sample_rows - (0 if reservoir is None else len(reservoir)), len(chunk))
+            head = chunk.iloc[:n_fill]
+            reservoir = head if reservoir is None else pd.concat([reservoir, head])
+
+        rest = chunk.iloc[n_fill:]
+        if len(rest):
+            ordinals = np.arange(seen + n_fill, seen + len(chunk))
+            slots = rng.integers(0, ordinals + 1)
+            picked = np.flatnonzero(slots < sample_rows)
+            if len(picked):
+                # Later rows overwrite earlier ones that drew the same slot.
+                slot_ids, last = np.unique(slots[picked][::-1], return_index=True)
+                winners = picked[::-1][last]
+                reservoir = pd.concat([
+                    reservoir.drop(reservoir.index[slot_ids]),  # type: ignore
+                    rest.iloc[winners],
+                ])
+        seen += len(chunk)
+
+    if reservoir is None:
+        return pd.DataFrame(), 0
+    return reservoir.sort_index(), seen
+
+
+def load_csv_sampled(
+    file: Any,
+    fingerprint: Optional[str] = None,
+    sample_rows: int = 100_000,
+    chunksize: int = 200_000,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+) -> Tuple[Optional[SampledDataset], Optional[str]]:
+    """
+    Load a CSV that may not fit in memory as a sample plus an on-disk copy.
+
+    Parameters:
+        file: Uploaded file object or file path.
+        fingerprint (str, optional): Precomputed content fingerprint.
+        sample_rows (int): Number of rows kept in memory for prompting and plotting.
+        chunksize (int): Rows read per chunk while sampling.
+        cache_dir (str): Directory where uploads are spilled to disk.
+
+    Returns:
+        tuple: (SampledDataset if valid, otherwise None; Error message or None)
+    """
+    try:
+        fingerprint = fingerprint or fingerprint_file(file)
+        path = spill_upload(file, os.path.join(cache_dir, f"{fingerprint}.csv"))
+        sample, total_rows = reservoir_sample_csv(path, sample_rows, chunksize)
+        if sample.empty:
+            return None, "The CSV file is empty."
+        return SampledDataset(sample=sample, path=path, total_rows=total_rows), None
+
+    except pd.errors.EmptyDataError:
+        return None, "The file is empty or invalid."
+    except pd.errors.ParserError:
+        return None, "The file could not be parsed. Check if it's a valid CSV."
+    except Exception as e:
+        return None, str(e)  # Handle unexpected errors
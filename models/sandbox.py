@@ -0,0 +1,249 @@
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+from matplotlib.figure import Figure
+
+from models.dataset_cache import frame_nbytes
+from models.plot_reduction import PlotReduction
+from models.utils import describe_error
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore
+
+ExecResult = Tuple[Optional[str], Optional[pd.DataFrame], Optional[Figure]]
+
+# Datasets kept resident per worker; older ones are dropped first.
+MAX_RESIDENT_DATASETS = 2
+
+
+def process_rss_bytes(pid: int) -> int:
+    """Return the resident set size of a process, or 0 where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _worker_main(conn: Any, max_address_space_bytes: Optional[int] = None) -> None:
+    """Worker loop: import the plotting stack once, then serve execution requests."""
+    if max_address_space_bytes is not None and resource is not None:
+        # A single huge allocation fails with MemoryError here instead of
+        # growing past the RSS limit between two polls of the parent.
+        resource.setrlimit(resource.RLIMIT_AS, (max_address_space_bytes, max_address_space_bytes))
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from models.utils import execute_python_code
+
+    datasets: dict[str, pd.DataFrame] = {}
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        kind = message[0]
+        if kind == "load":
+            _, key, df = message
+            datasets.pop(key, None)
+            datasets[key] = df
+            while len(datasets) > MAX_RESIDENT_DATASETS:
+                datasets.pop(next(iter(datasets)))
+            conn.send(("loaded", key))
+        elif kind == "exec":
+            _, key, df, code, extra_globals, plot_reduction = message
+            if df is None:
+                # A shallow copy: with copy-on-write, code cannot modify the resident frame
+                df = datasets[key].copy(deep=False)
+            result = execute_python_code(code, df, extra_globals=extra_globals, plot_reduction=plot_reduction)
+            if result[2] is not None:
+                # Unregistered from pyplot, the figure unpickles without joining the parent's figure list.
+                plt.close(result[2])
+            conn.send(("result", result, extra_globals))
+
+
+class _Worker:
+    def __init__(self, ctx: Any, max_address_space_bytes: Optional[int] = None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, max_address_space_bytes), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.ready = False
+        self.datasets: dict[str, int] = {}  # resident dataset keys and their bytes, oldest first
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SandboxError(Exception):
+    """Raised inside the pool when a worker breaches a limit or dies."""
+
+
+class SandboxPool:
+    """
+    Pool of long-lived worker processes for running generated code.
+
+    Workers import pandas/matplotlib/seaborn once at start-up and keep the
+    session's DataFrame resident between calls, so a snippet only pays for
+    its own work. Each call is bounded by a wall-clock timeout and an RSS
+    limit of `max_rss_bytes` on top of the data the worker holds (its
+    resident datasets, or the frame sent with the call), so a large
+    dataset does not get its worker recycled after every call. A worker
+    that breaches either limit is killed and replaced, and every
+    worker is recycled after `max_tasks_per_worker` executions. Where the
+    platform supports it, workers also run under an address-space limit
+    (`RLIMIT_AS`), since the RSS limit is only checked between polls.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout: float = 60.0,
+        max_rss_bytes: int = 2 * 1024 ** 3,
+        max_tasks_per_worker: int = 50,
+        poll_interval: float = 0.05,
+        max_address_space_bytes: Optional[int] = 8 * 1024 ** 3,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.max_address_space_bytes = max_address_space_bytes
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.poll_interval = poll_interval
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.recycled = 0
+        for _ in range(size):
+            self._idle.put(_Worker(self._ctx, self.max_address_space_bytes))
+        atexit.register(self.close)
+
+    def execute(
+        self,
+        code: str,
+        df: pd.DataFrame,
+        key: Optional[str] = None,
+        extra_globals: Optional[dict[str, object]] = None,
+        plot_reduction: Optional[PlotReduction] = None,
+    ) -> ExecResult:
+        """
+        Run `code` in a worker, mirroring `execute_python_code`.
+
+        Parameters:
+            code (str): The Python code to execute.
+            df (DataFrame): The dataset to use in execution.
+            key (str, optional): Stable dataset key (e.g. its fingerprint); lets
+                workers keep `df` resident instead of receiving it every call.
+            extra_globals (dict, optional): Additional picklable names exposed to the code.
+            plot_reduction (PlotReduction, optional): Thresholds for drawing large plots from reduced data.
+
+        Returns:
+            tuple: (output_str, final_df, figure)
+        """
+        worker = self._idle.get()
+        recycle = False
+        try:
+            deadline = time.monotonic() + self.timeout
+            if not worker.ready:
+                self._receive(worker, deadline, self.max_rss_bytes)
+                worker.ready = True
+            send_df: Optional[pd.DataFrame] = df
+            sent_bytes = 0
+            if key is not None:
+                if key not in worker.datasets:
+                    nbytes = frame_nbytes(df)
+                    worker.conn.send(("load", key, df))
+                    self._receive(worker, deadline, self._rss_limit(worker, 2 * nbytes))
+                    worker.datasets.pop(key, None)
+                    worker.datasets[key] = nbytes
+                    while len(worker.datasets) > MAX_RESIDENT_DATASETS:
+                        worker.datasets.pop(next(iter(worker.datasets)))
+                send_df = None
+            else:
+                sent_bytes = 2 * frame_nbytes(df)
+            limit = self._rss_limit(worker, sent_bytes)
+            worker.conn.send(("exec", key, send_df, code, extra_globals, plot_reduction))
+            _, result, returned_globals = self._receive(worker, deadline, limit)
+            _sync_helper_state(extra_globals, returned_globals)
+            worker.tasks += 1
+            recycle = (
+                worker.tasks >= self.max_tasks_per_worker
+                or process_rss_bytes(worker.process.pid) > limit
+            )
+            return result
+        except SandboxError as e:
+            recycle = True
+            return f"❌ Error executing code: {e}", None, None
+        except Exception as e:
+            recycle = True
+            return f"❌ Error executing code: {describe_error(e)}", None, None
+        finally:
+            if recycle:
+                worker.kill()
+                with self._lock:
+                    self.recycled += 1
+                worker = _Worker(self._ctx, self.max_address_space_bytes)
+            if not self._closed:
+                self._idle.put(worker)
+            else:
+                worker.kill()
+
+    def _rss_limit(self, worker: _Worker, extra_bytes: int = 0) -> int:
+        """
+        RSS allowed for `worker`: `max_rss_bytes` beyond its resident
+        datasets and `extra_bytes`. A frame in transit counts twice, since
+        the worker holds its pickle and the unpickled copy at once.
+        """
+        return self.max_rss_bytes + sum(worker.datasets.values()) + extra_bytes
+
+    def _receive(self, worker: _Worker, deadline: float, rss_limit: int) -> Any:
+        """Wait for the worker's reply while enforcing the timeout and `rss_limit`."""
+        while not worker.conn.poll(self.poll_interval):
+            if not worker.process.is_alive():
+                raise SandboxError("worker process exited unexpectedly.")
+            if time.monotonic() > deadline:
+                raise SandboxError(f"execution timed out after {self.timeout:.0f}s.")
+            if process_rss_bytes(worker.process.pid) > rss_limit:
+                raise SandboxError(f"execution exceeded the memory limit of {rss_limit // 1024 ** 2} MB.")
+        try:
+            return worker.conn.recv()
+        except EOFError:
+            raise SandboxError("worker process exited unexpectedly.")
+
+    def close(self) -> None:
+        """Stop every idle worker; busy workers are stopped when they are returned."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+def _sync_helper_state(
+    sent: Optional[dict[str, object]], returned: Optional[dict[str, object]]
+) -> None:
+    """Copy state of helper objects mutated in the worker back onto the originals."""
+    if not sent or not returned:
+        return
+    for name, original in sent.items():
+        owner = getattr(original, "__self__", None)
+        updated = getattr(returned.get(name), "__self__", None)
+        if owner is not None and updated is not None and hasattr(owner, "__dict__"):
+            owner.__dict__.update(updated.__dict__)
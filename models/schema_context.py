@@ -0,0 +1,152 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from models.profiling import ColumnProfile, DatasetProfile
+
+TokenCounter = Callable[[str], int]
+
+# Column groups at least this large are described as one line in compact mode.
+MIN_CLUSTER_SIZE = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English and code)."""
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class SchemaContext:
+    """Compact dataset description for the system prompt."""
+    text: str  # replaces the df.info() dump
+    head: str  # replaces df.head(10).to_string()
+    token_count: int
+    detail: str  # which level of detail fit the budget
+
+
+def _short(value: Any, max_chars: int) -> str:
+    if isinstance(value, float):
+        text = f"{value:.4g}"
+    else:
+        text = str(value)
+    if text.endswith(" 00:00:00"):
+        text = text[: -len(" 00:00:00")]  # dates without a time of day
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[: max_chars - 1] + "…"
+
+
+def _short_dtype(dtype: str) -> str:
+    return {"object": "str", "string": "str", "datetime64[ns]": "datetime", "datetime64[us]": "datetime"}.get(dtype, dtype)
+
+
+def _describe_column(col: ColumnProfile, n_rows: int, examples: int, max_chars: int) -> str:
+    parts = [f"{col.distinct:,} distinct"]
+    if col.missing:
+        parts.append(f"{col.missing / max(n_rows, 1):.0%} missing")
+    if col.min is not None and col.max is not None and col.kind in ("numeric", "datetime"):
+        parts.append(f"range {_short(col.min, max_chars)} to {_short(col.max, max_chars)}")
+    if examples and col.top and col.kind != "numeric":
+        shown = ", ".join(repr(_short(value, max_chars)) for value, _ in col.top[:examples])
+        parts.append(f"e.g. {shown}")
+    return f"- {col.name} ({_short_dtype(col.dtype)}): " + "; ".join(parts)
+
+
+def _cluster_key(col: ColumnProfile) -> tuple[str, str]:
+    stem = re.sub(r"[\W_]*\d+$", "", col.name) or col.name
+    return stem, col.kind
+
+
+def _clustered_lines(profile: DatasetProfile, max_chars: int) -> list[str]:
+    """One line per group of similarly named columns of the same kind, one per remaining column."""
+    groups: dict[tuple[str, str], list[ColumnProfile]] = {}
+    for col in profile.columns.values():
+        groups.setdefault(_cluster_key(col), []).append(col)
+
+    lines = []
+    for (stem, kind), cols in groups.items():
+        if len(cols) < MIN_CLUSTER_SIZE:
+            lines.extend(_describe_column(c, profile.n_rows, 0, max_chars) for c in cols)
+            continue
+        line = f"- {cols[0].name} … {cols[-1].name} ({len(cols)} {kind} columns named {stem}*)"
+        if kind == "numeric":
+            lows = [c.min for c in cols if c.min is not None and c.min == c.min]
+            highs = [c.max for c in cols if c.max is not None and c.max == c.max]
+            if lows and highs:
+                line += f": range {_short(min(lows), max_chars)} to {_short(max(highs), max_chars)}"
+        lines.append(line)
+    return lines
+
+
+def _names_only(profile: DatasetProfile, budget_chars: int) -> list[str]:
+    by_dtype: dict[str, list[str]] = {}
+    for col in profile.columns.values():
+        by_dtype.setdefault(_short_dtype(col.dtype), []).append(col.name)
+    lines = []
+    budget_chars //= max(len(by_dtype), 1)
+    for dtype, names in by_dtype.items():
+        line = f"- {dtype}: " + ", ".join(names)
+        if len(line) > budget_chars:
+            kept = line[:budget_chars].rsplit(",", 1)[0]
+            line = f"{kept} … and {len(names) - kept.count(',') - 1} more"
+        lines.append(line)
+    return lines
+
+
+def _preview(df: pd.DataFrame, rows: int, max_columns: int, max_chars: int) -> str:
+    if rows <= 0 or df.empty:
+        return "(preview omitted to save context)"
+    preview = df.iloc[:rows, :max_columns].copy()
+    for name in preview.columns:
+        if not pd.api.types.is_numeric_dtype(preview[name]):
+            preview[name] = preview[name].map(lambda v: _short(v, max_chars))
+    text = preview.to_string()
+    if df.shape[1] > max_columns:
+        text += f"\n(+{df.shape[1] - max_columns} more columns not shown)"
+    return text
+
+
+def build_schema_context(
+    df: pd.DataFrame,
+    profile: DatasetProfile,
+    token_budget: int = 1500,
+    count_tokens: TokenCounter = estimate_tokens,
+) -> SchemaContext:
+    """
+    Describe a dataset for the system prompt within a token budget.
+
+    Tries progressively terser descriptions until one fits: full per-column
+    lines with examples and a preview, then single examples and fewer
+    preview rows, then similarly named columns clustered into one line,
+    and finally column names grouped by dtype.
+
+    Parameters:
+        df (pd.DataFrame): The dataset (only used for the row preview).
+        profile (DatasetProfile): A cached profile of `df`.
+        token_budget (int): Maximum tokens for schema plus preview.
+        count_tokens: Token counter; defaults to a character-based estimate.
+
+    Returns:
+        SchemaContext: The schema text, the preview and their token count.
+    """
+    header = f"{profile.n_rows:,} rows x {len(profile.columns):,} columns."
+    levels: list[tuple[str, Callable[[], list[str]], int, int, int]] = [
+        ("full", lambda: [_describe_column(c, profile.n_rows, 3, 40) for c in profile.columns.values()], 5, 20, 40),
+        ("brief", lambda: [_describe_column(c, profile.n_rows, 1, 24) for c in profile.columns.values()], 3, 12, 24),
+        ("clustered", lambda: _clustered_lines(profile, 24), 2, 8, 16),
+        ("names", lambda: _names_only(profile, token_budget * 3), 0, 0, 0),
+    ]
+
+    context: Optional[SchemaContext] = None
+    for detail, lines, rows, max_columns, max_chars in levels:
+        text = "\n".join([header, *lines()])
+        head = _preview(df, rows, max_columns, max_chars)
+        context = SchemaContext(text, head, count_tokens(text) + count_tokens(head), detail)
+        if context.token_count <= token_budget:
+            return context
+    # Even names alone do not fit: cut the list off at the budget.
+    assert context is not None
+    text = context.text[: token_budget * 4].rsplit("\n", 1)[0] + "\n(… column list truncated)"
+    return SchemaContext(text, context.head, count_tokens(text) + count_tokens(context.head), "truncated")
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from typing import Any, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(model: str, system_prompt: str, message: str) -> Tuple[str, str, str]:
+    """Key identifying an LLM request: model, system prompt hash and message."""
+    return model, hashlib.sha256(system_prompt.encode()).hexdigest(), message
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Collapse identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is in flight block and receive the same result (or
+    exception). Nothing is kept once the call finishes, so later callers
+    start a fresh call: this removes bursts, it is not a cache.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shared = 0
+        self._in_flight: dict[Hashable, _Call[T]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run `fn` once per key among concurrent callers.
+
+        Parameters:
+            key: Identifies equivalent requests.
+            fn: Performs the upstream call.
+
+        Returns:
+            tuple: (result, shared) where `shared` is True if this caller
+            received the result of a call started by another caller.
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True  # type: ignore[return-value]
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict[str, Any]:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._in_flight)}
@@ -0,0 +1,234 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+import pandas as pd
+
+from models.columnar import DEFAULT_CACHE_DIR, columnar_cache_path, read_columnar_cache, write_columnar_cache
+from models.response_cache import schema_fingerprint
+
+try:
+    import duckdb  # type: ignore
+except ImportError:  # pragma: no cover - duckdb is optional
+    duckdb = None
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.dataset as pads  # type: ignore
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = pads = None
+
+# Name the generated SQL uses for the dataset, matching `df` in the Python namespace.
+SQL_TABLE = "df"
+
+
+class SqlError(Exception):
+    """Raised for SQL that is rejected or fails to run."""
+
+
+def sql_available() -> bool:
+    """Whether the optional DuckDB engine is installed."""
+    return duckdb is not None
+
+
+class SqlEngine:
+    """
+    In-process DuckDB for aggregation queries over a session's dataset.
+
+    Each query runs on its own cursor with the dataset registered as `df`.
+    A loaded dataset is scanned from a memory-mapped Feather file, so SQL
+    sees the same column types as pandas (parsed dates, categories)
+    without converting object columns on every query. The columnar cache
+    file of the upload is used when its schema matches the frame;
+    otherwise a copy is written once per dataset and schema. Copies beyond
+    `max_source_bytes` are deleted oldest first, and the rest when the
+    process exits. A CSV too large to load is
+    scanned from disk as an Arrow dataset, so
+    aggregations use every core and do not need the data in memory. Only
+    a single SELECT statement is accepted, the engine cannot read or write
+    files itself, and results are capped at `max_result_rows`.
+    """
+
+    def __init__(
+        self,
+        threads: Optional[int] = None,
+        memory_limit: Optional[str] = None,
+        temp_directory: str = os.path.join(DEFAULT_CACHE_DIR, "duckdb"),
+        max_result_rows: int = 100_000,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_source_bytes: int = 4 * 1024 ** 3,
+    ):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed")
+        config: dict[str, Any] = {"temp_directory": temp_directory}
+        if threads is not None:
+            config["threads"] = threads
+        if memory_limit is not None:
+            config["memory_limit"] = memory_limit
+        os.makedirs(temp_directory, exist_ok=True)
+        self._conn = duckdb.connect(":memory:", config=config)
+        self._conn.execute("SET enable_external_access = false")
+        self.max_result_rows = max_result_rows
+        self.queries = 0
+        self.failures = 0
+        self.cache_dir = cache_dir
+        self.source_dir = os.path.join(temp_directory, "sources")
+        self.max_source_bytes = max_source_bytes
+        self._file_sources: "OrderedDict[str, Any]" = OrderedDict()
+        # (fingerprint, schema fingerprint) -> Feather path, and bytes if this engine wrote it; oldest first
+        self._dataset_paths: "OrderedDict[Tuple[str, str], Tuple[str, int]]" = OrderedDict()
+        self._written_bytes = 0
+        self._lock = threading.Lock()
+        atexit.register(self.remove_sources)
+
+    def file_source(self, path: str) -> Any:
+        """
+        A scan of a file on disk: a Feather file from the columnar cache is
+        memory-mapped, a CSV is read as an Arrow dataset. The most recent
+        few sources are kept open.
+        """
+        if pads is None:
+            raise SqlError("pyarrow is required to query files on disk")
+        with self._lock:
+            source = self._file_sources.get(path)
+            if source is None:
+                if path.endswith(".feather"):
+                    source = read_columnar_cache(path)
+                else:
+                    source = pads.dataset(path, format="csv")
+                self._file_sources[path] = source
+                while len(self._file_sources) > 4:
+                    self._file_sources.popitem(last=False)
+            self._file_sources.move_to_end(path)
+            return source
+
+    def dataset_source(self, fingerprint: str, df: pd.DataFrame) -> Any:
+        """
+        A Feather file holding the loaded frame `df`: the upload's columnar
+        cache file if its schema matches, else a copy written on first use;
+        the DataFrame itself if pyarrow is missing or cannot convert it.
+        """
+        if pads is None:
+            return df
+        key = (fingerprint, schema_fingerprint(df))
+        with self._lock:
+            known = self._dataset_paths.get(key)
+            if known is not None:
+                self._dataset_paths.move_to_end(key)
+        if known is not None and os.path.exists(known[0]):
+            return self.file_source(known[0])
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            path = columnar_cache_path(fingerprint, self.cache_dir)
+            if _same_columns(path, table.schema):
+                nbytes = 0
+            else:
+                path = os.path.join(self.source_dir, f"{key[0]}-{key[1]}.feather")
+                write_columnar_cache(table, path)
+                nbytes = os.path.getsize(path)
+        except (OSError, pa.ArrowException):
+            return df
+        self._remember(key, path, nbytes)
+        return self.file_source(path)
+
+    def _remember(self, key: Tuple[str, str], path: str, nbytes: int) -> None:
+        """Index a dataset file; copies this engine wrote are deleted oldest first past `max_source_bytes`."""
+        stale = []
+        with self._lock:
+            self._forget(key)
+            self._dataset_paths[key] = (path, nbytes)
+            self._written_bytes += nbytes
+            for old in list(self._dataset_paths):
+                if self._written_bytes <= self.max_source_bytes or old == key:
+                    break
+                stale.append(self._forget(old))
+        for stale_path in stale:
+            _remove(stale_path)
+
+    def _forget(self, key: Tuple[str, str]) -> Optional[str]:
+        """Drop a dataset file from the index (under the lock); returns its path if this engine owns it."""
+        known = self._dataset_paths.pop(key, None)
+        if known is None:
+            return None
+        path, nbytes = known
+        self._file_sources.pop(path, None)
+        self._written_bytes -= nbytes
+        return path if nbytes else None  # columnar cache files belong to the cache
+
+    def remove_sources(self) -> None:
+        """Delete every dataset copy this engine wrote."""
+        with self._lock:
+            paths = [self._forget(key) for key in list(self._dataset_paths)]
+        for path in paths:
+            _remove(path)
+
+    def query(self, sql: str, source: Any) -> pd.DataFrame:
+        """
+        Run one SELECT statement against `source` registered as `df`.
+
+        Parameters:
+            sql (str): The query; a trailing semicolon is allowed.
+            source: A pandas DataFrame, Arrow table or Arrow dataset.
+
+        Returns:
+            DataFrame: The result, at most `max_result_rows` rows.
+
+        Raises:
+            SqlError: If the query is not a single SELECT or fails.
+        """
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            self.failures += 1
+            raise SqlError(str(e)) from e
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            self.failures += 1
+            raise SqlError("only a single SELECT statement is allowed")
+
+        cursor = self._conn.cursor()
+        try:
+            cursor.register(SQL_TABLE, source)
+            result = cursor.sql(statements[0].query).limit(self.max_result_rows).df()
+        except duckdb.Error as e:
+            self.failures += 1
+            raise SqlError(str(e)) from e
+        finally:
+            cursor.close()
+        self.queries += 1
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {"queries": self.queries, "failures": self.failures, "source_bytes": self._written_bytes}
+
+
+def _same_columns(path: str, schema: "pa.Schema") -> bool:
+    """
+    Whether the Feather file at `path` exists and holds `schema`'s columns
+    with the same types, counting string and large_string (what pandas
+    strings convert to) as one type since SQL reads both as VARCHAR.
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        with pa.memory_map(path) as source:
+            found = pa.ipc.open_file(source).schema
+    except (OSError, pa.ArrowException):
+        return False
+    return found.names == schema.names and all(
+        _sql_type(a.type) == _sql_type(b.type) for a, b in zip(found, schema)
+    )
+
+
+def _sql_type(arrow_type: "pa.DataType") -> "pa.DataType":
+    return pa.string() if pa.types.is_large_string(arrow_type) else arrow_type
+
+
+def _remove(path: Optional[str]) -> None:
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Already gone, or still mapped on a platform that forbids deleting it
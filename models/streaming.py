@@ -0,0 +1,94 @@
+import re
+from typing import Iterable, Iterator, Tuple
+
+# (kind, text): kind is "text" for prose to render, "code" for a closed python
+# block or "sql" for a closed sql block.
+StreamEvent = Tuple[str, str]
+
+FENCE_OPEN = re.compile(r"^\s*```(python|sql)\s*$", re.IGNORECASE)
+FENCE_CLOSE = re.compile(r"^\s*```\s*$")
+
+
+class CodeFenceParser:
+    """
+    Incrementally split a streamed reply into prose and python/sql code blocks.
+
+    Prose is released as soon as it cannot be part of a fence line, so it can
+    be rendered token by token. A code block is released the moment its
+    closing fence arrives, in the spirit of
+    `make_stop_on_token_callback_exit_code_block`, so execution can start
+    before the rest of the reply has been generated. A block the stream
+    never closes is released as text, fence included, and is not run,
+    matching `extract_python_code_blocks`.
+    """
+
+    def __init__(self) -> None:
+        self.in_code_block = False
+        self._kind = "code"
+        self._fence = ""
+        self._line = ""
+        self._code: list[str] = []
+
+    def feed(self, text: str) -> list[StreamEvent]:
+        """Consume the next chunk of streamed text and return the events it completes."""
+        events: list[StreamEvent] = []
+        prose = ""
+        for piece in text.splitlines(keepends=True):
+            self._line += piece
+            if not self._line.endswith("\n"):
+                continue
+            line, self._line = self._line, ""
+            prose = self._consume_line(line, prose, events)
+
+        # A partial prose line can be shown now unless it may still become a fence.
+        if self._line and not self.in_code_block and not self._line.lstrip().startswith("`"):
+            prose += self._line
+            self._line = ""
+        if prose:
+            events.append(("text", prose))
+        return events
+
+    def _consume_line(self, line: str, prose: str, events: list[StreamEvent]) -> str:
+        if self.in_code_block:
+            if FENCE_CLOSE.match(line):
+                self.in_code_block = False
+                if prose:
+                    events.append(("text", prose))
+                    prose = ""
+                events.append((self._kind, "".join(self._code).strip()))
+                self._code = []
+            else:
+                self._code.append(line)
+        elif match := FENCE_OPEN.match(line):
+            self.in_code_block = True
+            self._fence = line
+            self._kind = "sql" if match.group(1).lower() == "sql" else "code"
+        else:
+            prose += line
+        return prose
+
+    def close(self) -> list[StreamEvent]:
+        """Flush whatever is left when the stream ends; an unterminated block is returned as text."""
+        events: list[StreamEvent] = []
+        if self._line:
+            line, self._line = self._line, ""
+            if self.in_code_block and FENCE_CLOSE.match(line):
+                self._consume_line(line + "\n", "", events)
+                return events
+            if self.in_code_block:
+                self._code.append(line)
+            elif not FENCE_OPEN.match(line):
+                events.append(("text", line))
+        if self.in_code_block:
+            self.in_code_block = False
+            events.append(("text", self._fence + "".join(self._code)))
+            self._code = []
+        return events
+
+
+def iter_stream_events(chunks: Iterable[str]) -> Iterator[StreamEvent]:
+    """Run a `CodeFenceParser` over an iterable of text chunks."""
+    parser = CodeFenceParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
@@ -0,0 +1,259 @@
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, ContextManager, Iterator, Optional
+
+# Upper bounds (seconds) of the stage latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, list[float]]] = {}
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts followed by sum and count.
+            state = series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(key)} {value:g}" for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in series.items():
+                    cumulative = 0.0
+                    for bound, count in zip(self.buckets, state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative:g}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]:g}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve `registry` at http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def usage_fields(usage_metadata: Any) -> dict[str, int]:
+    """Token counts from a Gemini `usage_metadata` object (missing fields are skipped)."""
+    fields = {
+        "prompt_tokens": "prompt_token_count",
+        "response_tokens": "candidates_token_count",
+        "cached_tokens": "cached_content_token_count",
+        "total_tokens": "total_token_count",
+    }
+    counts = {}
+    for field, attr in fields.items():
+        value = getattr(usage_metadata, attr, None)
+        if value is not None:
+            counts[field] = int(value)
+    return counts
+
+
+class Turn:
+    """Timing spans and counters of one chat turn."""
+
+    def __init__(self, session_id: str, attrs: dict[str, Any]):
+        self.session_id = session_id
+        self.attrs = attrs
+        self.spans: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a stage; repeated stages in one turn accumulate."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - started)
+
+    def add_span(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class _NullTurn(Turn):
+    """Turn that records nothing, returned when telemetry is disabled."""
+
+    def __init__(self) -> None:
+        super().__init__("", {})
+
+    def span(self, name: str) -> ContextManager[None]:  # type: ignore[override]
+        return nullcontext()
+
+    def add_span(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NULL_TURN = _NullTurn()
+
+
+class Telemetry:
+    """
+    Per-turn stage timings and token counts, written to a JSONL log and a metrics registry.
+
+    Each finished turn appends one JSON line (session, stage spans, counters
+    and attributes) to `log_path` and updates the registry:
+    `dataverse_stage_seconds{stage}` histograms, `dataverse_turns_total`,
+    `dataverse_tokens_total{kind}`, `dataverse_llm_retries_total` and
+    `dataverse_cache_hits_total{cache}`. When disabled, every turn is one
+    shared no-op object, so instrumented code pays a method call per span.
+    """
+
+    def __init__(
+        self,
+        log_path: Optional[str] = None,
+        enabled: bool = True,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.registry = registry or MetricsRegistry()
+        self.registry.describe("dataverse_stage_seconds", "Time spent per stage of a chat turn.")
+        self.registry.describe("dataverse_turns_total", "Completed chat turns.")
+        self.registry.describe("dataverse_tokens_total", "LLM tokens by kind.")
+        self.registry.describe("dataverse_llm_retries_total", "Retried LLM requests.")
+        self.registry.describe("dataverse_cache_hits_total", "Cache hits by cache.")
+        self._log_lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def start_turn(self, session_id: str, **attrs: Any) -> Turn:
+        """Begin recording a chat turn; pass it to `end_turn` when the turn is done."""
+        if not self.enabled:
+            return _NULL_TURN
+        return Turn(session_id, dict(attrs))
+
+    def end_turn(self, turn: Turn) -> None:
+        if turn is _NULL_TURN:
+            return
+        self._emit(turn, time.perf_counter() - turn.started)
+
+    @contextmanager
+    def turn(self, session_id: str, **attrs: Any) -> Iterator[Turn]:
+        """
+        Record one chat turn; the record is emitted when the block exits.
+
+        An exception leaving the block is recorded as `error`, and as
+        `failed=True` unless it is a control-flow exception such as
+        Streamlit stopping or rerunning the script.
+        """
+        turn = self.start_turn(session_id, **attrs)
+        try:
+            yield turn
+        except BaseException as e:
+            turn.set(error=type(e).__name__, failed=isinstance(e, Exception))
+            raise
+        finally:
+            self.end_turn(turn)
+
+    def _emit(self, turn: Turn, total_seconds: float) -> None:
+        registry = self.registry
+        registry.inc("dataverse_turns_total")
+        registry.observe("dataverse_stage_seconds", total_seconds, stage="turn")
+        for stage, seconds in turn.spans.items():
+            registry.observe("dataverse_stage_seconds", seconds, stage=stage)
+        for name, value in turn.counts.items():
+            if name.endswith("_tokens"):
+                registry.inc("dataverse_tokens_total", value, kind=name[: -len("_tokens")])
+            elif name == "llm_retries":
+                registry.inc("dataverse_llm_retries_total", value)
+            elif name.endswith("_cache_hit"):
+                registry.inc("dataverse_cache_hits_total", value, cache=name[: -len("_cache_hit")])
+
+        if self.log_path is None:
+            return
+        record = {
+            "ts": time.time(),
+            "session": turn.session_id,
+            "total_s": round(total_seconds, 6),
+            "spans": {name: round(seconds, 6) for name, seconds in turn.spans.items()},
+            "counts": turn.counts,
+            **turn.attrs,
+        }
+        line = json.dumps(record, default=str)
+        with self._log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
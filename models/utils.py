@@ -3,6 +3,10 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from typing import Any, Optional, Tuple
 from matplotlib.figure import Figure
+from models.isolation import capture_output
+from models.plot_reduction import PlotReducer, PlotReduction
+from models.profiling import profile_dataframe
+import hashlib
 import io
 import sys
 import re
@@ -32,11 +36,38 @@ def load_csv(file: Any) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
     except Exception as e:
         return None, str(e)  # Handle unexpected errors
 
+def fingerprint_file(file: Any, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute a content fingerprint of an uploaded file or file path.
+
+    The file is hashed in chunks so large uploads are never copied into a
+    single bytes object. File-like objects are rewound afterwards so they
+    can still be handed to a CSV reader.
+
+    Parameters:
+        file: Uploaded file object or file path.
+        chunk_size (int): Number of bytes read per hashing step.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    start = file.tell() if hasattr(file, "tell") else 0
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    file.seek(start)
+    return digest.hexdigest()
+
 def summarize_numerical(df: pd.DataFrame) -> pd.DataFrame:
     """Return a DataFrame that summarizes each numeric column."""
-    numeric_summary = df.select_dtypes(include=["int", "float"]).describe().transpose()
-    numeric_summary['missing_values'] = df.isna().sum() # type: ignore
-    return numeric_summary
+    return profile_dataframe(df.select_dtypes(include="number")).numerical_summary()
 
 def summarize_categorical(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -48,29 +79,42 @@ def summarize_categorical(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Summary of categorical columns with unique counts and top values.
     """
-    categorical_summary = {}
-    for col in df.select_dtypes(include='object').columns:
-        unique_count = df[col].nunique()
-        top_value = str(df[col].mode()[0]) if not df[col].mode().empty else None # type: ignore
-        top_freq = df[col].value_counts().iloc[0] if unique_count > 0 else None
-        categorical_summary[col] = {
-            'unique_values': unique_count,
-            'most_frequent': top_value,
-            'frequency': top_freq,
-            'missing_values': df[col].isna().sum()
-        }
-    return pd.DataFrame(categorical_summary).T
+    categorical = df.select_dtypes(include=["object", "string", "category"])
+    return profile_dataframe(categorical).categorical_summary()
+
+def describe_error(e: BaseException) -> str:
+    """
+    Describe an exception from executed code as `Type: message`.
+
+    A MemoryError usually carries no message, so it gets one saying the
+    code ran out of memory.
+    """
+    if isinstance(e, MemoryError) and not str(e):
+        return "MemoryError: the code ran out of memory; try a sample of the data or fewer columns."
+    return f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
 
 def execute_python_code(
     code: str, 
-    df: pd.DataFrame
+    df: pd.DataFrame,
+    extra_globals: Optional[dict[str, object]] = None,
+    thread_safe: bool = True,
+    plot_reduction: Optional[PlotReduction] = None
 ) -> Tuple[Optional[str], Optional[pd.DataFrame], Optional[Figure]]:
     """
     Executes the extracted Python code within a controlled environment.
 
+    In thread-safe mode stdout/stderr are captured per thread and pyplot's
+    figure registry is per thread, so concurrent Streamlit sessions in one
+    process neither swap output nor pick up each other's figures. Global
+    matplotlib style (rcParams, `sns.set_theme`) is still shared.
+
     Parameters:
         code (str): The Python code to execute.
         df (DataFrame): The dataset to use in execution.
+        extra_globals (dict, optional): Additional names exposed to the code.
+        thread_safe (bool): Use per-thread capture instead of swapping `sys.stdout`.
+        plot_reduction (PlotReduction, optional): Draw large plots from reduced
+            data (see `PlotReducer`); None draws every row.
 
     Returns:
         tuple: (output_str, final_df, figure)
@@ -78,6 +122,9 @@ def execute_python_code(
             - final_df (DataFrame or None): The modified DataFrame if created.
             - figure (plt.Figure or None): The generated plot, if applicable.
     """
+    if thread_safe:
+        return _execute_thread_safe(code, df, extra_globals, plot_reduction)
+
     try:
         # Capture printed output
         output_buffer = io.StringIO()
@@ -87,12 +134,7 @@ def execute_python_code(
         plt.close("all")
 
         # Execution namespace
-        exec_globals: dict[str, object] = {
-            "df": df,  # Pass the original DataFrame
-            "pd": pd,  # Pandas
-            "plt": plt,  # Matplotlib
-            "sns": sns   # Seaborn
-        }
+        exec_globals = _exec_namespace(df, extra_globals, plot_reduction)
 
         # Execute the code
         exec(code, exec_globals)
@@ -101,19 +143,67 @@ def execute_python_code(
         sys.stdout = sys.__stdout__
         output_str = output_buffer.getvalue().strip() or None
 
-        # Retrieve 'final_df' if created
-        final_df = exec_globals.get("final_df", None)
-        if final_df is not None and not isinstance(final_df, pd.DataFrame):
-            return "❌ Error: 'final_df' must be a DataFrame.", None, None
+        return _collect_results(output_str, exec_globals)
 
-        # Capture figure if any plots were created
-        fig = plt.gcf() if plt.get_fignums() else None
+    except Exception as e:
+        sys.stdout = sys.__stdout__  # Restore stdout in case of an error
+        return f"❌ Error executing code: {describe_error(e)}", None, None
+
+def _exec_namespace(
+    df: pd.DataFrame,
+    extra_globals: Optional[dict[str, object]],
+    plot_reduction: Optional[PlotReduction] = None
+) -> dict[str, object]:
+    exec_globals: dict[str, object] = {
+        "df": df,  # Pass the original DataFrame
+        "pd": pd,  # Pandas
+        "plt": plt,  # Matplotlib
+        "sns": sns   # Seaborn
+    }
+    if plot_reduction is not None:
+        # Reducing sns/plt proxies, also handed out by `import seaborn` and friends
+        exec_globals.update(PlotReducer(plot_reduction).exec_globals())
+    if extra_globals:
+        exec_globals.update(extra_globals)
+    return exec_globals
+
+def _collect_results(
+    output_str: Optional[str], exec_globals: dict[str, object]
+) -> Tuple[Optional[str], Optional[pd.DataFrame], Optional[Figure]]:
+    # Retrieve 'final_df' if created
+    final_df = exec_globals.get("final_df", None)
+    if final_df is not None and not isinstance(final_df, pd.DataFrame):
+        return "❌ Error: 'final_df' must be a DataFrame.", None, None
+
+    # Capture figure if any plots were created
+    fig = plt.gcf() if plt.get_fignums() else None
 
-        return output_str, final_df, fig
+    return output_str, final_df, fig
+
+def _execute_thread_safe(
+    code: str,
+    df: pd.DataFrame,
+    extra_globals: Optional[dict[str, object]],
+    plot_reduction: Optional[PlotReduction] = None
+) -> Tuple[Optional[str], Optional[pd.DataFrame], Optional[Figure]]:
+    output_buffer = io.StringIO()
+    error_buffer = io.StringIO()
+    try:
+        with capture_output(output_buffer, error_buffer):
+            # Only this thread's figures are closed and picked up afterwards
+            plt.close("all")
+            exec_globals = _exec_namespace(df, extra_globals, plot_reduction)
+            exec(code, exec_globals)
+
+        output_str = output_buffer.getvalue().strip() or None
+        return _collect_results(output_str, exec_globals)
 
     except Exception as e:
-        sys.stdout = sys.__stdout__  # Restore stdout in case of an error
-        return f"❌ Error executing code: {str(e)}", None, None
+        return f"❌ Error executing code: {describe_error(e)}", None, None
+    finally:
+        # Keep warnings visible in the server log rather than in another session's output
+        if error_buffer.getvalue():
+            sys.__stderr__.write(error_buffer.getvalue()) # type: ignore
 
 def make_stop_on_token_callback_exit_code_block():
     in_code_block = False
@@ -148,7 +238,7 @@ def extract_non_code_text(reply: str) -> str:
     Extract all code blocks and remove them from the reply, preserving non-code text.
     Also removes 'responding://' and similar patterns from the response.
     """
-    code_pattern = r'```(?:python)?\n(.*?)\n```'
+    code_pattern = r'```(?:python|sql)?\n(.*?)\n```'
     response_without_code = re.sub(code_pattern, '', reply, flags=re.DOTALL | re.IGNORECASE).strip()
     response_without_code = re.sub(
         r'(```)?responding://(```)?|<\|end_of_text\|><\|begin_of_text\|>://|```python',
@@ -165,4 +255,13 @@ def extract_python_code_blocks(reply: str) -> list[str]:
     """
     pattern = r'```python\n(.*?)\n```'
     matches = re.findall(pattern, reply, re.DOTALL)
-    return [m.strip() for m in matches]
\ No newline at end of file
+    return [m.strip() for m in matches]
+
+def extract_sql_code_blocks(reply: str) -> list[str]:
+    """
+    Extract all SQL code blocks from a string reply.
+    Returns a list of query strings (without the triple backticks and 'sql').
+    """
+    pattern = r'```sql\n(.*?)\n```'
+    matches = re.findall(pattern, reply, re.DOTALL | re.IGNORECASE)
+    return [m.strip() for m in matches]
@@ -0,0 +1,210 @@
+import itertools
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+# Shallow copies below rely on copy-on-write: a write to one frame never reaches
+# another frame sharing its columns. It is the only mode from pandas 3 on.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+_column_ids = itertools.count()
+
+
+@dataclass
+class DatasetVersion:
+    """One immutable state of a session's dataset."""
+    frame: pd.DataFrame
+    key: str  # stable identity, e.g. for keeping the frame resident in sandbox workers
+    description: str
+    column_ids: dict[str, int]  # columns with the same id share their data
+    column_bytes: dict[int, int] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True)
+class SchemaSummary:
+    """What a version looks like to the model: its row count and column types."""
+    key: str
+    rows: int
+    dtypes: dict[str, str]
+
+
+class VersionedFrame:
+    """
+    A session's view of a dataset: a shared, never-modified base plus its transformations.
+
+    The base frame is held by reference, not copied. `commit` stores a
+    transformed frame as a new version, reusing the previous version's
+    data for every column whose values did not change, so a version costs
+    only its new or modified columns. Versions form an undo/redo history of
+    at most `max_versions` (the base is always kept). Code gets a
+    `checkout()`, a shallow copy that copy-on-write keeps from modifying
+    any version.
+    """
+
+    def __init__(self, base: pd.DataFrame, key: str, max_versions: int = 10):
+        self.max_versions = max_versions
+        ids = {str(column): next(_column_ids) for column in base.columns}
+        self._versions = [DatasetVersion(base, key, "Original data", ids)]
+        self._position = 0
+        self._shared_bytes: Optional[int] = None
+
+    # ── Access ──────────────────────────────────────────────────────────────
+
+    @property
+    def version(self) -> DatasetVersion:
+        return self._versions[self._position]
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """The current version's frame; read it, do not modify it (use `checkout`)."""
+        return self.version.frame
+
+    @property
+    def is_base(self) -> bool:
+        return self._position == 0
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    def checkout(self) -> pd.DataFrame:
+        """A shallow copy of the current version for code that may modify it."""
+        return self.version.frame.copy(deep=False)
+
+    # ── History ─────────────────────────────────────────────────────────────
+
+    def commit(self, frame: pd.DataFrame, description: str = "Transformation") -> DatasetVersion:
+        """
+        Make `frame` the current version, discarding any redo history.
+
+        Columns equal to the current version's (same name, index and values)
+        are replaced by the current version's data, so copies made by the
+        transformation (e.g. `df.copy()`) are not retained.
+        """
+        parent = self.version
+        shareable = (
+            frame.columns.is_unique and parent.frame.columns.is_unique
+            and frame.index.equals(parent.frame.index)
+        )
+        ids: dict[str, int] = {}
+        column_bytes: dict[int, int] = {}
+        if shareable:
+            columns: dict[object, pd.Series] = {}
+            for column in frame.columns:
+                name, new = str(column), frame[column]
+                old = parent.frame[column] if column in parent.frame.columns else None
+                if old is not None and new.dtype == old.dtype and new.equals(old):
+                    columns[column] = old
+                    ids[name] = parent.column_ids[name]
+                else:
+                    columns[column] = new
+                    ids[name] = next(_column_ids)
+                    column_bytes[ids[name]] = int(new.memory_usage(deep=True, index=False))
+            frame = pd.DataFrame(columns, index=frame.index, copy=False)
+        else:
+            # Rows or labels changed, so nothing lines up with the parent: it is all new data.
+            # Duplicate labels share one id; the new index is counted with the first column.
+            ids = {str(column): next(_column_ids) for column in frame.columns}
+            usage = frame.memory_usage(deep=True)
+            for position, column in enumerate(frame.columns):
+                column_id = ids[str(column)]
+                column_bytes[column_id] = column_bytes.get(column_id, 0) + int(usage.iloc[position + 1])
+            if ids:
+                column_bytes[next(iter(ids.values()))] += int(usage.iloc[0])
+
+        version = DatasetVersion(
+            frame, f"{self._versions[0].key}:{uuid.uuid4().hex[:12]}", description, ids, column_bytes
+        )
+        del self._versions[self._position + 1:]
+        self._versions.append(version)
+        while len(self._versions) > self.max_versions:
+            # Columns the dropped version created may live on in its successor.
+            dropped, successor = self._versions.pop(1), self._versions[1]
+            kept = set(successor.column_ids.values())
+            for column_id, nbytes in dropped.column_bytes.items():
+                if column_id in kept:
+                    successor.column_bytes.setdefault(column_id, nbytes)
+        self._position = len(self._versions) - 1
+        return version
+
+    @property
+    def can_undo(self) -> bool:
+        return self._position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self._position < len(self._versions) - 1
+
+    def undo(self) -> DatasetVersion:
+        if self.can_undo:
+            self._position -= 1
+        return self.version
+
+    def redo(self) -> DatasetVersion:
+        if self.can_redo:
+            self._position += 1
+        return self.version
+
+    def history(self) -> list[str]:
+        return [version.description for version in self._versions]
+
+    # ── Schema ──────────────────────────────────────────────────────────────
+
+    def schema_summary(self) -> SchemaSummary:
+        frame = self.version.frame
+        return SchemaSummary(
+            self.version.key, len(frame), {str(column): str(dtype) for column, dtype in frame.dtypes.items()}
+        )
+
+    def schema_delta(self, since: SchemaSummary) -> Optional[str]:
+        """
+        A short note on how the current version differs from `since`, or None if it is that version.
+
+        The system prompt describes the base data; sending this with the next
+        message tells the model what `df` looks like after a commit, undo or redo.
+        """
+        current = self.schema_summary()
+        if current.key == since.key:
+            return None
+        lines = [f'The data in `df` has changed to version {self._position + 1} ("{self.version.description}").']
+        if current.rows != since.rows:
+            lines.append(f"Rows: {current.rows:,} (was {since.rows:,}).")
+        added = [f"{name} ({dtype})" for name, dtype in current.dtypes.items() if name not in since.dtypes]
+        removed = [name for name in since.dtypes if name not in current.dtypes]
+        retyped = [
+            f"{name} ({since.dtypes[name]} -> {dtype})"
+            for name, dtype in current.dtypes.items() if name in since.dtypes and since.dtypes[name] != dtype
+        ]
+        if added:
+            lines.append(f"Added columns: {', '.join(added)}.")
+        if removed:
+            lines.append(f"Removed columns: {', '.join(removed)}.")
+        if retyped:
+            lines.append(f"Changed types: {', '.join(retyped)}.")
+        if len(lines) == 1:
+            lines.append("Columns and types are unchanged.")
+        return " ".join(lines)
+
+    # ── Memory ──────────────────────────────────────────────────────────────
+
+    def memory(self) -> dict[str, int]:
+        """
+        Bytes this session holds on its own, across every retained version,
+        versus the base data it shares with other sessions.
+        """
+        owned: dict[int, int] = {}
+        for version in self._versions[1:]:
+            owned.update(version.column_bytes)
+        if self._shared_bytes is None:
+            self._shared_bytes = int(self._versions[0].frame.memory_usage(deep=True).sum())
+        return {
+            "versions": len(self._versions),
+            "position": self._position,
+            "owned_bytes": sum(owned.values()),
+            "shared_bytes": self._shared_bytes,
+        }
@@ -1,10 +1,22 @@
 # app.py
+import os
+import uuid
 import streamlit as st
 import pandas as pd
 from gpt4all import GPT4All #type: ignore
-from models.prompt_template import prompt_analyst_template
-from models.utils import execute_python_code, load_csv, make_stop_on_token_callback_exit_code_block, extract_non_code_text, extract_python_code_blocks
-import io
+from models.prompt_template import prompt_seaborn_analyst
+from models.artifact_store import ArtifactStore
+from models.code_validator import validate_code
+from models.columnar import read_csv_columnar
+from models.dataset_registry import DatasetRegistry
+from models.dtype_optimizer import with_dtype_optimization
+from models.local_model_server import LocalModelServer, QueueFullError, default_instance_count
+from models.plot_reduction import PlotReduction
+from models.profiling import DatasetProfile, profile_dataframe
+from models.schema_context import SchemaContext, build_schema_context
+from models.single_flight import SingleFlight, request_key
+from models.utils import execute_python_code, make_stop_on_token_callback_exit_code_block, extract_non_code_text, extract_python_code_blocks
+from models.versioned_frame import VersionedFrame
 
 # ── 1. PAGE CONFIG & TITLE ─────────────────────────────────────────────────────
 st.set_page_config(page_title="Nano-Dataverse", layout="centered")
@@ -14,38 +26,125 @@ st.title("Dataverse - Data Explorer")
 # File uploader
 uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
 
-@st.cache_data
-def get_df_info(df: pd.DataFrame) -> str:
-    buf = io.StringIO()
-    df.info(buf=buf)
-    return buf.getvalue()
+# Shrink uploaded frames (categories, downcast numerics, parsed dates) once per file.
+# Off by default: the model is shown the changed dtypes, and categories or nullable
+# integers behave differently from plain columns in the code it writes.
+OPTIMIZE_DTYPES = False
+
+# Draw plots of large inputs from reduced data (LTTB lines, hexbin scatters, pre-aggregated bars).
+REDUCE_PLOTS = True
+PLOT_REDUCTION = PlotReduction(
+    line_max_points=5_000, scatter_max_points=20_000, bar_max_rows=100_000, sample_rows=20_000
+)
+
+# Keep figures and long outputs out of session state: figures are stored as PNG bytes and
+# closed, and a session's artifacts beyond this many bytes are spilled to disk.
+ARTIFACT_MEMORY_PER_SESSION = 16 * 1024 ** 2
+INLINE_OUTPUT_CHARS = 2000
+
+@st.cache_resource
+def get_artifact_store() -> ArtifactStore:
+    return ArtifactStore(max_session_bytes=ARTIFACT_MEMORY_PER_SESSION)
+
+@st.cache_resource
+def get_dtype_reports() -> dict[str, pd.DataFrame]:
+    return {}
+
+# Parsed datasets are shared by every session that uploads the same file. Above this
+# many bytes, datasets no session uses are spilled to disk and dropped from memory.
+DATASET_MEMORY_CEILING = 2 * 1024 ** 3
+
+@st.cache_resource
+def get_dataset_cache() -> DatasetRegistry:
+    if OPTIMIZE_DTYPES:
+        return DatasetRegistry(
+            max_bytes=DATASET_MEMORY_CEILING,
+            loader=with_dtype_optimization(read_csv_columnar, get_dtype_reports()),
+        )
+    return DatasetRegistry(max_bytes=DATASET_MEMORY_CEILING)
+
+# Token budget for the dataset description embedded in the system prompt.
+SCHEMA_TOKEN_BUDGET = 1500
+
+# The leading underscore keeps Streamlit from hashing the whole DataFrame;
+# the content fingerprint is the cache key instead.
+@st.cache_resource
+def get_profile(_df: pd.DataFrame, fingerprint: str) -> DatasetProfile:
+    return profile_dataframe(_df, max_workers=4)
 
 @st.cache_data
-def get_df_head(df: pd.DataFrame, n: int = 10) -> str:
-    return df.head(n).to_string() #type: ignore
+def get_schema_context(_df: pd.DataFrame, fingerprint: str, token_budget: int = SCHEMA_TOKEN_BUDGET) -> SchemaContext:
+    return build_schema_context(_df, get_profile(_df, fingerprint), token_budget)
+
+# Identical in-flight requests (e.g. the opening message) share one generation.
+@st.cache_resource
+def get_single_flight() -> SingleFlight[str]:
+    return SingleFlight()
+
+OPENING_MESSAGE = "initiate conversation"
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 df = None
 if uploaded_file:
-    st.cache_data.clear()
-    st.cache_resource.clear()
-    df, error = load_csv(uploaded_file)
+    # Storing the lease in the session holds the shared frame; replacing it releases the old one.
+    st.session_state.dataset_lease, error, fingerprint = get_dataset_cache().acquire(
+        uploaded_file, holder=st.session_state.session_id
+    )
+    df = st.session_state.dataset_lease.frame if st.session_state.dataset_lease is not None else None
     if df is not None:
-        df_info   = get_df_info(df)
-        df_head   = get_df_head(df)
+        schema_context = get_schema_context(df, fingerprint)
+        df_info   = schema_context.text
+        df_head   = schema_context.head
+        dtype_report = get_dtype_reports().get(fingerprint)
+        if dtype_report is not None:
+            with st.sidebar.expander(
+                f"Memory optimization: {dtype_report['saved_bytes'].sum():,} bytes saved"
+            ):
+                st.dataframe(dtype_report)
     else:
         df_info = ""
         df_head = ""
 
-    # Keep track of the original/modified DataFrame
-    if "modified_df" not in st.session_state:
-        if df is not None:
-            st.session_state.modified_df = df.copy()
-        else:
-            st.session_state.modified_df = None
+    # The session's versions of the data: the shared loaded frame plus transformations saved as `final_df`
+    if "dataset" not in st.session_state:
+        st.session_state.dataset = VersionedFrame(df, fingerprint) if df is not None else None
+        # The version the model last had described to it; the system prompt covers the base.
+        st.session_state.model_schema = st.session_state.dataset.schema_summary() if df is not None else None
+        # A `final_df` waits here, as (id, frame, description), until the user keeps it.
+        st.session_state.pending_version = None
+    dataset = st.session_state.dataset
+
+    def keep_pending_version(pending_id: str) -> None:
+        pending = st.session_state.pending_version
+        if pending is not None and pending[0] == pending_id:
+            st.session_state.dataset.commit(pending[1], pending[2])
+            st.session_state.pending_version = None
+
+    def show_keep_button(pending_id: str) -> None:
+        pending = st.session_state.pending_version
+        if pending is not None and pending[0] == pending_id:
+            st.button(
+                f"Keep as the data for later questions ({len(pending[1]):,} rows × {len(pending[1].columns)} columns)",
+                key=f"keep-{pending_id}", on_click=keep_pending_version, args=(pending_id,),
+            )
+
+    if dataset is not None:
+        undo_col, redo_col = st.sidebar.columns(2)
+        if undo_col.button("Undo transformation", disabled=not dataset.can_undo):
+            dataset.undo()
+        if redo_col.button("Redo transformation", disabled=not dataset.can_redo):
+            dataset.redo()
+        memory = dataset.memory()
+        st.sidebar.caption(
+            f"Data version {memory['position'] + 1}/{memory['versions']}: "
+            f"{memory['owned_bytes'] / 1024 ** 2:,.1f} MB own, {memory['shared_bytes'] / 1024 ** 2:,.1f} MB shared"
+        )
 
     # ── 3. BUILD SYSTEM PROMPT (ONCE) ───────────────────────────────────────────────
     if "system_prompt" not in st.session_state:
-        st.session_state.system_prompt = prompt_analyst_template.format(
+        st.session_state.system_prompt = prompt_seaborn_analyst.format(
             df_info=df_info,
             df_head=df_head
         )
@@ -53,61 +152,146 @@ if uploaded_file:
     # ── 4. CACHE & LOAD GPT4All MODEL ─────────────────────────────────────────────
     GPT4All_MODEL_NAME = "oh-dcft-v3.1-claude-3-5-sonnet-20241022.Q8_0.gguf"
     GPT4All_MODEL_PATH = "models/"
-    @st.cache_resource
+    # Model instances share the machine: each gets this many threads and its own copy in RAM.
+    GPT4All_THREADS_PER_INSTANCE = 4
+    GPT4All_MAX_QUEUE_DEPTH = 32
+
     def load_model():
         return GPT4All(
             GPT4All_MODEL_NAME,
             model_path=GPT4All_MODEL_PATH,
-            allow_download=False
+            allow_download=False,
+            n_threads=GPT4All_THREADS_PER_INSTANCE
         )
 
-    if "model" not in st.session_state:
-        st.session_state.model = load_model()
+    # One server for every session: it owns the model instances and each session's conversation.
+    @st.cache_resource
+    def get_model_server() -> LocalModelServer:
+        model_bytes = os.path.getsize(os.path.join(GPT4All_MODEL_PATH, GPT4All_MODEL_NAME))
+        return LocalModelServer(
+            load_model,
+            instances=default_instance_count(model_bytes, GPT4All_THREADS_PER_INSTANCE),
+            max_queue_depth=GPT4All_MAX_QUEUE_DEPTH
+        )
 
-    if "session" not in st.session_state:
-        cm = st.session_state.model.chat_session(system_prompt=st.session_state.system_prompt)
-        st.session_state.session = cm.__enter__()
-        st.session_state.session_cm = cm
+    model_server = get_model_server()
+
+    def ensure_model_session() -> None:
+        """Open this session on the server, or re-open it with its history if it was dropped while idle."""
+        if model_server.has_session(st.session_state.session_id):
+            return
+        history = []
+        if "messages" in st.session_state:
+            turns = [{"role": "user", "content": OPENING_MESSAGE}] + [
+                {"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages
+            ]
+            history = turns[:len(turns) // 2 * 2]  # drop a question still waiting for its answer
+        model_server.open_session(
+            st.session_state.session_id, st.session_state.system_prompt, history=history
+        )
+
+    def generate_streamed(message: str, callback=None) -> str:
+        """Generate through the model server, showing tokens as they arrive; raises QueueFullError when busy."""
+        ensure_model_session()
+        stream = model_server.submit(st.session_state.session_id, message, callback=callback)
+        placeholder = st.empty()
+        reply = ""
+        for token in stream:
+            reply += token
+            placeholder.markdown(reply)
+        placeholder.empty()
+        print(f"Queue wait: {stream.queue_wait_s}s, {stream.tokens_per_s} tokens/s")
+        return reply
 
     # ── 6. RENDER & HANDLE CHAT ────────────────────────────────────────────────────
     with st.spinner("Loading data and model..."):
         if "messages" not in st.session_state:
+            try:
+                opening, shared = get_single_flight().do(
+                    request_key(GPT4All_MODEL_NAME, st.session_state.system_prompt, OPENING_MESSAGE),
+                    lambda: generate_streamed(OPENING_MESSAGE),
+                )
+            except QueueFullError:
+                st.warning("The model is busy with other users. Please try again in a moment.")
+                st.stop()
+            if shared:
+                # Another session generated it; record the exchange in this chat's history.
+                ensure_model_session()
+                model_server.record_exchange(st.session_state.session_id, OPENING_MESSAGE, opening)
             st.session_state.messages = [
                 {
                     "role": "assistant",
-                    "content": st.session_state.session.generate("initiate conversation")
+                    "content": opening
                 }
             ]
 
+    server_stats = model_server.stats()
+    if server_stats["queue_wait_p95_s"] is not None:
+        st.sidebar.caption(
+            f"Model queue: {server_stats['queue_depth']} waiting, "
+            f"p95 wait {server_stats['queue_wait_p95_s']:.1f}s, "
+            f"{server_stats['tokens_per_s'] or 0:.1f} tokens/s"
+        )
+
+    def show_figure(figure_id: str) -> None:
+        found = get_artifact_store().get(st.session_state.session_id, figure_id)
+        if found is None:
+            st.caption("This figure is no longer available.")
+            return
+        data, mime = found
+        st.image(data.decode() if mime == "image/svg+xml" else data)
+
+    artifacts = get_artifact_store().footprint(st.session_state.session_id)
+    st.sidebar.caption(
+        f"Session results: {artifacts['artifacts']} stored, "
+        f"{artifacts['resident_bytes'] / 1024 ** 2:,.1f} MB in memory, "
+        f"{artifacts['spilled_bytes'] / 1024 ** 2:,.1f} MB on disk"
+    )
+
     for msg in st.session_state.messages: # type: ignore
         with st.chat_message(msg["role"]): # type: ignore
             st.markdown(msg["content"]) # type: ignore
-            if "figure" in msg:
-                st.pyplot(msg["figure"]) # type: ignore
+            if "figure_id" in msg:
+                show_figure(msg["figure_id"]) # type: ignore
+            elif "output_id" in msg:
+                st.markdown(f"```\n{get_artifact_store().get_text(st.session_state.session_id, msg['output_id'])}\n```") # type: ignore
             elif "output" in msg:
-                st.markdown(f"```\n{output_str}\n```") # type: ignore
+                st.markdown(f"```\n{msg['output']}\n```") # type: ignore
+            if "pending_id" in msg:
+                show_keep_button(msg["pending_id"]) # type: ignore
 
     if prompt := st.chat_input("Type your question..."):
         st.session_state.messages.append({"role": "user", "content": prompt}) # type: ignore
         with st.chat_message("user"):
             st.markdown(prompt)
 
+        # A transformation not kept before the next question is dropped.
+        st.session_state.pending_version = None
+        # Tell the model about a version it has not seen yet (after a keep, undo or redo).
+        schema_delta = dataset.schema_delta(st.session_state.model_schema) if dataset is not None else None
+        message = f"{schema_delta}\n\n{prompt}" if schema_delta else prompt
+
         MAX_RETRIES = 2
         retry_count = 0
         output_str = None  # Initialize output_str to ensure it's defined
         response_without_code = ""
         figure = None  # Initialize figure to ensure it's defined
+        final_df = None
 
         while retry_count < MAX_RETRIES:
-            generation_input = prompt if output_str is None else (
+            generation_input = message if output_str is None else (
                 f"The previous code resulted in an error: {output_str}\n"
                 f"Please try again and fix the issue."
             )
 
-            reply = st.session_state.session.generate(
-                generation_input,
-                callback=make_stop_on_token_callback_exit_code_block()
-            )  # type: ignore
+            try:
+                reply = generate_streamed(
+                    generation_input,
+                    callback=make_stop_on_token_callback_exit_code_block()
+                )
+            except QueueFullError:
+                st.warning("The model is busy with other users. Please try again in a moment.")
+                st.stop()
 
             # Use utility function to extract non-code text
             response_without_code = extract_non_code_text(reply)
@@ -120,33 +304,62 @@ if uploaded_file:
 
             if code_block:
                 print(f"\n\nGenerated codeblock: {code_block}")  # Debugging output
-                if st.session_state.modified_df is not None:
-                    output_str, final_df, figure = execute_python_code(
-                        code_block, st.session_state.modified_df
+                if dataset is not None:
+                    # Repair what can be repaired locally; only unfixable code costs a regeneration.
+                    validation = validate_code(
+                        code_block, dataset.frame.columns, n_rows=len(dataset.frame)
                     )
+                    for issue in validation.issues:
+                        print(f"Validation {issue.severity}: {issue.message}")
+                    if validation.ok:
+                        output_str, final_df, figure = execute_python_code(
+                            validation.code, dataset.checkout(),
+                            plot_reduction=PLOT_REDUCTION if REDUCE_PLOTS else None
+                        )
+                    else:
+                        output_str, final_df, figure = f"❌ {validation.feedback()}", None, None
                     print(f"Output: {output_str}")
                 else:
                     output_str, final_df, figure = "No DataFrame loaded.", None, None
 
-            if output_str and "error executing code" in output_str.lower():
+            if output_str and output_str.startswith("❌"):
                 retry_count += 1
                 print(f"Retry {retry_count} due to error...")
             else:
                 break  # Exit loop if there's no error
 
+        if dataset is not None:
+            st.session_state.model_schema = dataset.schema_summary()
+        pending_id = None
+        if final_df is not None:
+            pending_id = uuid.uuid4().hex
+            st.session_state.pending_version = (pending_id, final_df, prompt)
+
+        # Keep the rendered image, not the live Figure and its artists
+        figure_id = None
+        if figure is not None:
+            figure_id = get_artifact_store().put_figure(st.session_state.session_id, figure)
 
         with st.chat_message("assistant"):
             st.markdown(response_without_code)
+            if pending_id is not None:
+                show_keep_button(pending_id)
 
-            if figure:
-                st.pyplot(figure)
+            if figure_id:
+                show_figure(figure_id)
             elif output_str:
                 st.markdown(f"```\n{output_str}\n```")
 
         # Append assistant message, including figure if present
         assistant_msg = {"role": "assistant", "content": response_without_code}
-        if figure is not None:
-            assistant_msg["figure"] = figure  # type: ignore
+        if pending_id is not None:
+            assistant_msg["pending_id"] = pending_id  # type: ignore
+        if figure_id is not None:
+            assistant_msg["figure_id"] = figure_id  # type: ignore
         elif output_str and output_str.lower() != "no dataframe loaded." and "error" not in output_str.lower():
-            assistant_msg["output"] = output_str  # Save output if not error
+            # Save output if not error; long ones go to the artifact store
+            if len(output_str) > INLINE_OUTPUT_CHARS:
+                assistant_msg["output_id"] = get_artifact_store().put_text(st.session_state.session_id, output_str)  # type: ignore
+            else:
+                assistant_msg["output"] = output_str
         st.session_state.messages.append(assistant_msg)  # type: ignore
\ No newline at end of file
@@ -1,44 +1,270 @@
-import io
+import os
+import time
+import uuid
+from typing import Optional, Tuple
 import streamlit as st
 import pandas as pd
 from google import genai
 from google.genai import types
-from models.prompt_template import prompt_seaborn_analyst
-from models.utils import load_csv, extract_non_code_text, extract_python_code_blocks, execute_python_code
+from models.prompt_template import prompt_seaborn_analyst, prompt_sample_mode, prompt_sql_mode
+from models.artifact_store import ArtifactStore
+from models.code_validator import ValidationResult, validate_code
+from models.columnar import DEFAULT_CACHE_DIR, read_csv_columnar
+from models.context_cache import ContextCacheManager
+from models.dataset_registry import DatasetRegistry
+from models.dtype_optimizer import optimize_dtypes, with_dtype_optimization
+from models.llm_gateway import LLMGateway
+from models.plot_reduction import PlotReduction
+from models.profiling import DatasetProfile, profile_dataframe
+from models.schema_context import SchemaContext, build_schema_context
+from models.response_cache import CachedResponse, ResponseCache, schema_fingerprint
+from models.sandbox import SandboxPool
+from models.sampling import SampledDataset, load_csv_sampled
+from models.single_flight import SingleFlight, request_key
+from models.sql_engine import SqlEngine, SqlError, sql_available
+from models.sketches import SketchProfile, sketch_profile_csv
+from models.streaming import iter_stream_events
+from models.telemetry import Telemetry, start_metrics_server, usage_fields
+from models.utils import fingerprint_file, extract_non_code_text, extract_python_code_blocks, extract_sql_code_blocks, execute_python_code
+from models.versioned_frame import VersionedFrame
 
 st.set_page_config(page_title="Nano-Dataverse", layout="centered")
 st.title("Dataverse - Data Explorer")
 
 uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
 
+# Shrink uploaded frames (categories, downcast numerics, parsed dates) once per file.
+# Off by default: the model is shown the changed dtypes, and categories or nullable
+# integers behave differently from plain columns in the code it writes.
+OPTIMIZE_DTYPES = False
+
+@st.cache_resource
+def get_dtype_reports() -> dict[str, pd.DataFrame]:
+    return {}
+
+# Parsed datasets are shared by every session that uploads the same file. Above this
+# many bytes, datasets no session uses are spilled to disk and dropped from memory.
+DATASET_MEMORY_CEILING = 2 * 1024 ** 3
+
+@st.cache_resource
+def get_dataset_cache() -> DatasetRegistry:
+    if OPTIMIZE_DTYPES:
+        return DatasetRegistry(
+            max_bytes=DATASET_MEMORY_CEILING,
+            loader=with_dtype_optimization(read_csv_columnar, get_dtype_reports()),
+        )
+    return DatasetRegistry(max_bytes=DATASET_MEMORY_CEILING)
+
+# Files above this size are explored through a reservoir sample instead of loaded whole.
+# Uploads are capped by Streamlit's `server.maxUploadSize` (200 MB by default), so a
+# threshold above that cap needs the cap raised in .streamlit/config.toml as well.
+SAMPLE_THRESHOLD_BYTES = 150 * 1024 ** 2
+SAMPLE_ROWS = 100_000
+# Token budget for the full-file sketch summary added to the system prompt of sampled files.
+SKETCH_TOKEN_BUDGET = 600
+
+@st.cache_resource
+def get_sampled_dataset(_file, fingerprint: str) -> Tuple[Optional[SampledDataset], Optional[str]]:
+    sampled, error = load_csv_sampled(_file, fingerprint, sample_rows=SAMPLE_ROWS)
+    if sampled is not None and OPTIMIZE_DTYPES:
+        sampled.sample, _ = optimize_dtypes(sampled.sample)
+    return sampled, error
+
+# Render replies token by token and execute code as soon as its fence closes.
+STREAM_RESPONSES = True
+
+# Replay answers to repeated questions about the same dataset without calling the model.
+USE_RESPONSE_CACHE = True
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    return ResponseCache()
+
+# One async client for every session: bounded concurrency, rate limiting and retries.
+LLM_MAX_CONCURRENCY = 16
+LLM_REQUESTS_PER_MINUTE = 60
+
+@st.cache_resource
+def get_llm_gateway(api_key: str) -> LLMGateway:
+    return LLMGateway(
+        genai.Client(api_key=api_key),
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    )
+
+# Identical in-flight requests (e.g. the opening suggestion) share one upstream call.
+@st.cache_resource
+def get_single_flight() -> SingleFlight[str]:
+    return SingleFlight()
+
+OPENING_MESSAGE = "with the data provided, what is your suggestion?"
+
+# Cache the system prompt and dataset context on the provider side, shared by every chat on the same dataset.
+USE_CONTEXT_CACHE = True
+
+@st.cache_resource
+def get_context_cache(api_key: str) -> ContextCacheManager:
+    return ContextCacheManager(get_llm_gateway(api_key).client, ttl_seconds=3600)
+
+# Run generated code in pre-warmed worker processes with time and memory limits.
+USE_SANDBOX = True
+
+@st.cache_resource
+def get_sandbox_pool() -> SandboxPool:
+    return SandboxPool(size=2, timeout=60.0, max_rss_bytes=2 * 1024 ** 3)
+
+# Answer aggregation steps with SQL on an embedded DuckDB over the columnar cache, when installed.
+USE_SQL_ENGINE = True
+
+@st.cache_resource
+def get_sql_engine() -> Optional[SqlEngine]:
+    return SqlEngine() if USE_SQL_ENGINE and sql_available() else None
+
+# Draw plots of large inputs from reduced data (LTTB lines, hexbin scatters, pre-aggregated bars).
+REDUCE_PLOTS = True
+PLOT_REDUCTION = PlotReduction(
+    line_max_points=5_000, scatter_max_points=20_000, bar_max_rows=100_000, sample_rows=20_000
+)
+
+# Keep figures and long outputs out of session state: figures are stored as PNG bytes and
+# closed, and a session's artifacts beyond this many bytes are spilled to disk.
+ARTIFACT_MEMORY_PER_SESSION = 16 * 1024 ** 2
+INLINE_OUTPUT_CHARS = 2000
+
+@st.cache_resource
+def get_artifact_store() -> ArtifactStore:
+    return ArtifactStore(max_session_bytes=ARTIFACT_MEMORY_PER_SESSION)
+
+@st.cache_resource
+def get_sketch_profile(path: str) -> SketchProfile:
+    return sketch_profile_csv(path)
+
+# Token budget for the dataset description embedded in the system prompt.
+SCHEMA_TOKEN_BUDGET = 1500
+
+# The leading underscore keeps Streamlit from hashing the whole DataFrame;
+# the content fingerprint is the cache key instead.
+@st.cache_resource
+def get_profile(_df: pd.DataFrame, fingerprint: str) -> DatasetProfile:
+    return profile_dataframe(_df, max_workers=4)
+
 @st.cache_data
-def get_df_info(df: pd.DataFrame) -> str:
-    buf = io.StringIO()
-    df.info(buf=buf)
-    return buf.getvalue()
+def get_schema_context(_df: pd.DataFrame, fingerprint: str, token_budget: int = SCHEMA_TOKEN_BUDGET) -> SchemaContext:
+    return build_schema_context(_df, get_profile(_df, fingerprint), token_budget)
 
 @st.cache_data
-def get_df_head(df: pd.DataFrame, n: int = 10) -> str:
-    return df.head(n).to_string() #type: ignore
+def get_schema_fingerprint(_df: pd.DataFrame, fingerprint: str) -> str:
+    return schema_fingerprint(_df)
+
+# Per-turn stage timings and token counts: JSONL log plus a Prometheus scrape endpoint.
+TELEMETRY_ENABLED = True
+TELEMETRY_LOG = os.path.join(DEFAULT_CACHE_DIR, "telemetry.jsonl")
+METRICS_PORT = 9464
+
+@st.cache_resource
+def get_telemetry() -> Telemetry:
+    if not TELEMETRY_ENABLED:
+        return Telemetry(enabled=False)
+    os.makedirs(os.path.dirname(TELEMETRY_LOG), exist_ok=True)
+    telemetry = Telemetry(log_path=TELEMETRY_LOG)
+    try:
+        start_metrics_server(telemetry.registry, METRICS_PORT)
+    except OSError as e:
+        print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+    return telemetry
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = Telemetry.new_session_id()
 
 df = None
+sampled = None
 if uploaded_file:
-    st.cache_data.clear()
-    st.cache_resource.clear()
-    df, error = load_csv(uploaded_file)
+    load_started = time.perf_counter()
+    if uploaded_file.size > SAMPLE_THRESHOLD_BYTES:
+        fingerprint = fingerprint_file(uploaded_file)
+        sampled, error = get_sampled_dataset(uploaded_file, fingerprint)
+        df = sampled.sample if sampled is not None else None
+    else:
+        # Storing the lease in the session holds the shared frame; replacing it releases the old one.
+        st.session_state.dataset_lease, error, fingerprint = get_dataset_cache().acquire(
+            uploaded_file, holder=st.session_state.session_id
+        )
+        df = st.session_state.dataset_lease.frame if st.session_state.dataset_lease is not None else None
+    load_s = time.perf_counter() - load_started
+    if sampled is not None and sampled.is_sampled:
+        st.info(
+            f"Large file: exploring a random sample of {len(sampled.sample):,} "
+            f"of {sampled.total_rows:,} rows. Exact figures are computed on the full file when needed."
+        )
+        with st.spinner("Profiling the full file..."):
+            sketch_profile = get_sketch_profile(sampled.path)
+        with st.sidebar.expander("Full-data profile (approximate)"):
+            st.dataframe(sketch_profile.numerical_summary())
+            st.dataframe(sketch_profile.categorical_summary())
     if df is not None:
-        df_info   = get_df_info(df)
-        df_head   = get_df_head(df)
+        schema_started = time.perf_counter()
+        schema_context = get_schema_context(df, fingerprint)
+        schema_s = time.perf_counter() - schema_started
+        df_info   = schema_context.text
+        df_head   = schema_context.head
+        cache_stats = get_dataset_cache().stats()
+        st.sidebar.caption(
+            f"Dataset registry: {cache_stats['entries']} in memory ({cache_stats['bytes'] / 1024 ** 2:,.1f} MB), "
+            f"{cache_stats['spilled']} on disk, {cache_stats['hit_rate']:.0%} hit rate, "
+            f"{cache_stats['evictions']} evictions"
+        )
+        if cache_stats["spill_failures"]:
+            st.sidebar.caption(
+                f"{cache_stats['spill_failures']} dataset spills failed; last: {cache_stats['last_spill_error']}"
+            )
+        st.sidebar.caption(
+            f"Schema context: ~{schema_context.token_count:,} tokens ({schema_context.detail})"
+        )
+        dtype_report = get_dtype_reports().get(fingerprint)
+        if dtype_report is not None:
+            with st.sidebar.expander(
+                f"Memory optimization: {dtype_report['saved_bytes'].sum():,} bytes saved"
+            ):
+                st.dataframe(dtype_report)
     else:
         df_info = ""
         df_head = ""
+        schema_s = 0.0
 
-    # Keep track of the original/modified DataFrame
-    if "modified_df" not in st.session_state:
-        if df is not None:
-            st.session_state.modified_df = df.copy()
-        else:
-            st.session_state.modified_df = None
+    # The session's versions of the data: the shared loaded frame plus transformations saved as `final_df`
+    if "dataset" not in st.session_state:
+        st.session_state.dataset = VersionedFrame(df, fingerprint) if df is not None else None
+        # The version the model last had described to it; the system prompt covers the base.
+        st.session_state.model_schema = st.session_state.dataset.schema_summary() if df is not None else None
+        # A `final_df` waits here, as (id, frame, description), until the user keeps it.
+        st.session_state.pending_version = None
+    dataset = st.session_state.dataset
+
+    def keep_pending_version(pending_id: str) -> None:
+        pending = st.session_state.pending_version
+        if pending is not None and pending[0] == pending_id:
+            st.session_state.dataset.commit(pending[1], pending[2])
+            st.session_state.pending_version = None
+
+    def show_keep_button(pending_id: str) -> None:
+        pending = st.session_state.pending_version
+        if pending is not None and pending[0] == pending_id:
+            st.button(
+                f"Keep as the data for later questions ({len(pending[1]):,} rows × {len(pending[1].columns)} columns)",
+                key=f"keep-{pending_id}", on_click=keep_pending_version, args=(pending_id,),
+            )
+
+    if dataset is not None:
+        undo_col, redo_col = st.sidebar.columns(2)
+        if undo_col.button("Undo transformation", disabled=not dataset.can_undo):
+            dataset.undo()
+        if redo_col.button("Redo transformation", disabled=not dataset.can_redo):
+            dataset.redo()
+        memory = dataset.memory()
+        st.sidebar.caption(
+            f"Data version {memory['position'] + 1}/{memory['versions']}: "
+            f"{memory['owned_bytes'] / 1024 ** 2:,.1f} MB own, {memory['shared_bytes'] / 1024 ** 2:,.1f} MB shared"
+        )
     
     api_key = st.secrets["GEMINI_API_KEY"]
     model = st.secrets["GEMINI_MODEL"]
@@ -47,68 +273,403 @@ if uploaded_file:
     if not model:
         raise ValueError("Missing GEMINI_MODEL environment variable.")
 
-    if "client" not in st.session_state:
-        st.session_state.client = genai.Client(api_key=api_key)
+    gateway = get_llm_gateway(api_key)
+
+    def chat_config(cached_content: Optional[str]) -> types.GenerateContentConfig:
+        """Reference the cached context, or carry the system prompt itself."""
+        if cached_content:
+            return types.GenerateContentConfig(cached_content=cached_content)
+        return types.GenerateContentConfig(system_instruction=st.session_state.system_instruction)
+
+    def create_chat(cached_content: Optional[str], history: Optional[list] = None):
+        return gateway.create_chat(model, config=chat_config(cached_content), history=history)
+
+    def refresh_chat_context() -> None:
+        """Keep the cached context alive; rebuild the chat on the new cache if it had to be recreated."""
+        if not USE_CONTEXT_CACHE:
+            return
+        name = get_context_cache(api_key).get_cache_name(
+            model, fingerprint, st.session_state.system_instruction
+        )
+        if name != st.session_state.cached_content:
+            st.session_state.chat = create_chat(name, history=st.session_state.chat.get_history())
+            st.session_state.cached_content = name
+
     if "chat" not in st.session_state:
-        st.session_state.chat = st.session_state.client.chats.create(
-            model=model,
-            config=types.GenerateContentConfig(system_instruction=prompt_seaborn_analyst.format(
-                df_info=df_info,
-                df_head=df_head
+        system_instruction = prompt_seaborn_analyst.format(df_info=df_info, df_head=df_head)
+        if sampled is not None and sampled.is_sampled:
+            system_instruction += prompt_sample_mode.format(
+                sample_rows=len(sampled.sample), total_rows=sampled.total_rows,
+                full_profile=sketch_profile.prompt_text(max_chars=SKETCH_TOKEN_BUDGET * 4),
+            )
+        if df is not None and get_sql_engine() is not None:
+            system_instruction += prompt_sql_mode.format(sql_scope=(
+                f" holding all {sampled.total_rows:,} rows of the file, so SQL results are exact"
+                if sampled is not None and sampled.is_sampled else ""
             ))
-        )
+        st.session_state.system_instruction = system_instruction
+        st.session_state.cached_content = None
+        if USE_CONTEXT_CACHE:
+            st.session_state.cached_content = get_context_cache(api_key).get_cache_name(
+                model, fingerprint, system_instruction
+            )
+            if st.session_state.cached_content is None:
+                print(f"Context cache not used: {get_context_cache(api_key).stats()['last_error']}")
+        st.session_state.chat = create_chat(st.session_state.cached_content)
+
     if "messages" not in st.session_state: # type: ignore
+        # Sessions opening the same dataset at once share one stateless call;
+        # each chat is then seeded with the exchange as its history.
+        config = chat_config(st.session_state.cached_content)
+        opening, shared = get_single_flight().do(
+            request_key(model, st.session_state.system_instruction, OPENING_MESSAGE),
+            lambda: gateway.generate(model, OPENING_MESSAGE, config=config).text or "",
+        )
+        if shared:
+            print("Opening suggestion shared with a concurrent session")
+        st.session_state.chat = create_chat(st.session_state.cached_content, history=[
+            types.Content(role="user", parts=[types.Part(text=OPENING_MESSAGE)]),
+            types.Content(role="model", parts=[types.Part(text=opening)]),
+        ])
         st.session_state.messages = [
             {
                 "role": "assistant",
-                "content": st.session_state.chat.send_message("with the data provided, what is your suggestion?").text
+                "content": opening
             }
         ]
 
+    def show_figure(figure_id: str) -> None:
+        found = get_artifact_store().get(st.session_state.session_id, figure_id)
+        if found is None:
+            st.caption("This figure is no longer available.")
+            return
+        data, mime = found
+        st.image(data.decode() if mime == "image/svg+xml" else data)
+
+    artifacts = get_artifact_store().footprint(st.session_state.session_id)
+    st.sidebar.caption(
+        f"Session results: {artifacts['artifacts']} stored, "
+        f"{artifacts['resident_bytes'] / 1024 ** 2:,.1f} MB in memory, "
+        f"{artifacts['spilled_bytes'] / 1024 ** 2:,.1f} MB on disk"
+    )
+
     for msg in st.session_state.messages: # type: ignore
         with st.chat_message(msg["role"]): # type: ignore
             st.markdown(msg["content"]) # type: ignore
-            if "figure" in msg:
-                st.pyplot(msg["figure"]) # type: ignore
-            if "output" in msg:
+            if "figure_id" in msg:
+                show_figure(msg["figure_id"]) # type: ignore
+            if "output_id" in msg:
+                st.markdown(f"```\n{get_artifact_store().get_text(st.session_state.session_id, msg['output_id'])}\n```") # type: ignore
+            elif "output" in msg:
                 st.markdown(f"```\n{msg['output']}\n```") # type: ignore
+            if "scope" in msg:
+                st.caption(msg["scope"]) # type: ignore
+            if "pending_id" in msg:
+                show_keep_button(msg["pending_id"]) # type: ignore
 
-    if prompt := st.chat_input("Type your question..."):
-        st.session_state.messages.append({"role": "user", "content": prompt}) # type: ignore
-
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        response = st.session_state.chat.send_message(prompt)
-        print(response.usage_metadata)
-
-        response_without_code = extract_non_code_text(response.text or "")
-        code_blocks = extract_python_code_blocks(response.text or "")
-        code_block = code_blocks[0] if code_blocks else None
-
-        output_str = None
-        figure = None
-
-        if code_block:
-            if st.session_state.modified_df is not None:
-                output_str, final_df, figure = execute_python_code(
-                    code_block, st.session_state.modified_df
-                )
-                print(f"Output: {output_str}")
-            else:
-                output_str, final_df, figure = "No DataFrame loaded.", None, None
-
-        with st.chat_message("assistant"):
-            st.markdown(response_without_code)
-            if figure:
-                st.pyplot(figure)
-            if output_str:
-                st.markdown(f"```\n{output_str}\n```")
-            
-        assistant_msg = {"role": "assistant", "content": response_without_code}
+    def check_code_block(
+        code_block: str, extra_globals: Optional[dict[str, object]], context: str = ""
+    ) -> ValidationResult:
+        """
+        Validate a code block against the loaded columns; asks the model once for a fix it cannot repair locally.
+
+        The fix is requested with a stateless call carrying the chat so far, this
+        turn's message and the rejected code: the streamed reply may still be in
+        flight and is only added to the chat's history once it finishes.
+        """
+        validate = lambda code: validate_code(
+            code, dataset.frame.columns, namespace=extra_globals or (), n_rows=len(dataset.frame)
+        )
+        with turn.span("validate"):
+            validation = validate(code_block)
+        for issue in validation.issues:
+            print(f"Validation {issue.severity}: {issue.message}")
+        if validation.fixes:
+            turn.count("code_autofixes", len(validation.fixes))
+        if validation.ok:
+            return validation
+
+        turn.count("code_regenerations")
+        with turn.span("regenerate"):
+            contents = st.session_state.chat.get_history() + [
+                types.Content(role="user", parts=[types.Part(text=message)]),
+                types.Content(role="model", parts=[types.Part(text=f"```python\n{code_block}\n```")]),
+                types.Content(role="user", parts=[types.Part(
+                    text=f"{context}{validation.feedback()}\nReply with the corrected Python code block only."
+                )]),
+            ]
+            response = gateway.generate(
+                model, contents, config=chat_config(st.session_state.cached_content), on_retry=count_retry
+            )
+        for name, value in usage_fields(response.usage_metadata).items():
+            turn.count(name, value)
+        retry_blocks = extract_python_code_blocks(response.text or "")
+        return validate(retry_blocks[0]) if retry_blocks else validation
+
+    def run_sql_block(sql: str) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        """Run a generated query on the SQL engine; returns (result, error message)."""
+        engine = get_sql_engine()
+        if engine is None or df is None:
+            return None, "SQL is not available"
+        if not dataset.is_base:
+            source = dataset.frame
+        elif sampled is not None and sampled.is_sampled:
+            source = engine.file_source(sampled.path)
+        else:
+            source = engine.dataset_source(fingerprint, df)
+        try:
+            with turn.span("sql"):
+                result = engine.query(sql, source)
+        except SqlError as e:
+            print(f"SQL failed: {e}")
+            return None, str(e)
+        print(f"SQL result: {len(result):,} rows")
+        return result, None
+
+    def sql_scope() -> Optional[str]:
+        if dataset.is_base and sampled is not None and sampled.is_sampled:
+            return f"Aggregated with SQL over the full data ({sampled.total_rows:,} rows)."
+        return None
+
+    def sql_output(sql_df: Optional[pd.DataFrame], sql_error: Optional[str]) -> Tuple[str, Optional[str]]:
+        """Output and scope caption for a reply whose only code is a SQL query."""
+        if sql_df is None:
+            return f"❌ Error executing SQL: {sql_error}", None
+        return sql_df.to_string(max_rows=50), sql_scope()
+
+    def run_code_block(
+        code_block: str, sql_df: Optional[pd.DataFrame] = None, sql_error: Optional[str] = None,
+        question: str = ""
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        Validate and execute a generated code block; returns (output_str, figure id, scope caption).
+
+        `question` is the user message the code answers. The result of a
+        preceding SQL block is exposed as `sql_df`. If that query failed,
+        code relying on it is regenerated to use `df` alone.
+        A `final_df` the code creates is held as the pending version until the user keeps it.
+        """
+        if dataset is None:
+            return "No DataFrame loaded.", None, None
+
+        full_data = None
+        if sampled is not None and sampled.is_sampled:
+            full_data = sampled.full_data_access()
+        extra_globals = full_data.exec_globals() if full_data else {}
+        if sql_df is not None:
+            extra_globals["sql_df"] = sql_df
+        context = (
+            f"The SQL query failed ({sql_error}); compute the result in Python from `df` instead of `sql_df`.\n"
+            if sql_error else ""
+        )
+        validation = check_code_block(code_block, extra_globals or None, context)
+        if not validation.ok:
+            return f"❌ {validation.feedback()}", None, None
+        code_block = validation.code
+        if USE_SANDBOX:
+            output_str, final_df, figure = get_sandbox_pool().execute(
+                code_block, dataset.frame,
+                key=dataset.version.key, extra_globals=extra_globals or None,
+                plot_reduction=PLOT_REDUCTION if REDUCE_PLOTS else None
+            )
+        else:
+            output_str, final_df, figure = execute_python_code(
+                code_block, dataset.checkout(),
+                extra_globals=extra_globals or None,
+                plot_reduction=PLOT_REDUCTION if REDUCE_PLOTS else None
+            )
+        print(f"Output: {output_str}")
+
+        scope = None
+        if sql_df is not None and sql_scope():
+            scope = sql_scope()
+        elif full_data is not None:
+            scope = (
+                f"Computed on the full data ({sampled.total_rows:,} rows)."
+                if full_data.used else
+                f"Computed on a {len(sampled.sample):,}-row sample of {sampled.total_rows:,} rows."
+            )
+        if final_df is not None:
+            st.session_state.pending_version = (uuid.uuid4().hex, final_df, question or "Transformation")
+        figure_id = None
         if figure is not None:
-            assistant_msg["figure"] = figure  # type: ignore
-        if output_str is not None:
-            assistant_msg["output"] = output_str # type: ignore
+            figure_id = get_artifact_store().put_figure(st.session_state.session_id, figure)
+        return output_str, figure_id, scope
+
+    def render_result(output_str: Optional[str], figure_id: Optional[str], scope: Optional[str]) -> None:
+        if figure_id:
+            show_figure(figure_id)
+        if output_str:
+            st.markdown(f"```\n{output_str}\n```")
+        if scope:
+            st.caption(scope)
+        if st.session_state.pending_version is not None:
+            show_keep_button(st.session_state.pending_version[0])
+
+    if prompt := st.chat_input("Type your question..."):
+        telemetry = get_telemetry()
+        # An exception escaping the turn is recorded as a failed turn and re-raised.
+        with telemetry.turn(
+            st.session_state.session_id, model=model, fingerprint=fingerprint,
+            sampled=sampled is not None and sampled.is_sampled, streamed=STREAM_RESPONSES,
+        ) as turn:
+            turn.add_span("load", load_s)
+            turn.add_span("schema", schema_s)
+            count_retry = lambda error: turn.count("llm_retries")
+            st.session_state.messages.append({"role": "user", "content": prompt}) # type: ignore
+
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            # A transformation not kept before the next question is dropped.
+            st.session_state.pending_version = None
+            # Tell the model about a version it has not seen yet (after a keep, undo or redo).
+            schema_delta = dataset.schema_delta(st.session_state.model_schema) if dataset is not None else None
+            message = f"{schema_delta}\n\n{prompt}" if schema_delta else prompt
+
+            output_str = None
+            figure_id = None
+            scope = None
+            code_block = None
+            sql_block = None
+            sql_df = None
+            sql_error = None
+            cached = None
+
+            with turn.span("prepare"):
+                if USE_RESPONSE_CACHE and df is not None and dataset.is_base:
+                    prior_prompts = [m["content"] for m in st.session_state.messages[:-1] if m["role"] == "user"]
+                    cache_key = ResponseCache.make_key(
+                        model, get_schema_fingerprint(df, fingerprint), fingerprint, prompt, prior_prompts
+                    )
+                    cached = get_response_cache().get(cache_key)
+                    cache_stats = get_response_cache().stats()
+                    st.sidebar.caption(f"Response cache hit rate: {cache_stats['hit_rate']:.0%}")
+
+                if cached is None:
+                    refresh_chat_context()
+            if cached is not None:
+                turn.count("response_cache_hit")
+                # The model did not see this turn; add it so later questions can refer to it.
+                replayed = cached.reply + (f"\n```python\n{cached.code}\n```" if cached.code else "")
+                st.session_state.chat = create_chat(st.session_state.cached_content, history=[
+                    *st.session_state.chat.get_history(),
+                    types.Content(role="user", parts=[types.Part(text=prompt)]),
+                    types.Content(role="model", parts=[types.Part(text=replayed)]),
+                ])
+            elif st.session_state.cached_content:
+                turn.count("context_cache_hit")
+
+            with st.chat_message("assistant"):
+                if cached is not None:
+                    response_without_code = cached.reply
+                    output_str, scope = cached.output, cached.scope
+                    with turn.span("render"):
+                        st.markdown(response_without_code)
+                        if cached.figure_png:
+                            figure_id = get_artifact_store().put(st.session_state.session_id, cached.figure_png, "image/png")
+                        render_result(output_str, figure_id, scope)
+                elif STREAM_RESPONSES:
+                    # Render prose as it arrives and run the code as soon as its fence closes.
+                    started = time.perf_counter()
+                    first_token_s = None
+                    plot_s = None
+                    chunks = []
+
+                    def chunk_texts():
+                        for chunk in gateway.stream_message(st.session_state.chat, message, on_retry=count_retry):
+                            chunks.append(chunk)
+                            yield chunk.text or ""
+
+                    placeholder = st.empty()
+                    shown = ""
+                    for kind, text in iter_stream_events(chunk_texts()):
+                        if first_token_s is None:
+                            first_token_s = time.perf_counter() - started
+                        if kind == "text":
+                            shown += text
+                            with turn.span("render"):
+                                placeholder.markdown(shown)
+                        elif kind == "sql":
+                            if sql_block is None and code_block is None:
+                                sql_block = text
+                                with st.spinner("Running query..."):
+                                    sql_df, sql_error = run_sql_block(sql_block)
+                        elif code_block is None:
+                            code_block = text
+                            with st.spinner("Running code..."), turn.span("exec"):
+                                output_str, figure_id, scope = run_code_block(code_block, sql_df, sql_error, prompt)
+                            with turn.span("render"):
+                                render_result(output_str, figure_id, scope)
+                            plot_s = time.perf_counter() - started
+                            # Prose after the code block goes below the result.
+                            placeholder = st.empty()
+                            shown = ""
+
+                    if code_block is None and sql_block is not None:
+                        output_str, scope = sql_output(sql_df, sql_error)
+                        with turn.span("render"):
+                            render_result(output_str, None, scope)
+
+                    # Model time is the stream's wall time not spent querying, executing or rendering.
+                    turn.add_span("model", time.perf_counter() - started - turn.spans.get("sql", 0.0)
+                                  - turn.spans.get("exec", 0.0) - turn.spans.get("render", 0.0))
+                    turn.set(first_token_s=first_token_s, plot_s=plot_s)
+                    reply = "".join(chunk.text or "" for chunk in chunks)
+                    response_without_code = extract_non_code_text(reply)
+                    if chunks:
+                        for name, value in usage_fields(chunks[-1].usage_metadata).items():
+                            turn.count(name, value)
+                else:
+                    with turn.span("model"):
+                        response = gateway.send_message(st.session_state.chat, message, on_retry=count_retry)
+                    for name, value in usage_fields(response.usage_metadata).items():
+                        turn.count(name, value)
+
+                    response_without_code = extract_non_code_text(response.text or "")
+                    code_blocks = extract_python_code_blocks(response.text or "")
+                    code_block = code_blocks[0] if code_blocks else None
+                    sql_blocks = extract_sql_code_blocks(response.text or "")
+                    sql_block = sql_blocks[0] if sql_blocks else None
+
+                    if sql_block:
+                        sql_df, sql_error = run_sql_block(sql_block)
+                    if code_block:
+                        with turn.span("exec"):
+                            output_str, figure_id, scope = run_code_block(code_block, sql_df, sql_error, prompt)
+                    elif sql_block:
+                        output_str, scope = sql_output(sql_df, sql_error)
+
+                    with turn.span("render"):
+                        st.markdown(response_without_code)
+                        render_result(output_str, figure_id, scope)
+
+            if cached is None and dataset is not None:
+                st.session_state.model_schema = dataset.schema_summary()
+            pending = st.session_state.pending_version
+            failed = output_str is not None and output_str.startswith("❌")
+            # A replayed reply could not offer its `final_df` to keep, so transformations are not cached.
+            if USE_RESPONSE_CACHE and cached is None and df is not None and dataset.is_base and not failed and pending is None:
+                with turn.span("cache_store"):
+                    get_response_cache().put(cache_key, CachedResponse(
+                        reply=response_without_code,
+                        code=code_block,
+                        output=output_str,
+                        figure_png=get_artifact_store().get(st.session_state.session_id, figure_id)[0] if figure_id else None,
+                        scope=scope,
+                    ))
+
+            assistant_msg = {"role": "assistant", "content": response_without_code}
+            if figure_id is not None:
+                assistant_msg["figure_id"] = figure_id  # type: ignore
+            if output_str is not None and len(output_str) > INLINE_OUTPUT_CHARS:
+                assistant_msg["output_id"] = get_artifact_store().put_text(st.session_state.session_id, output_str) # type: ignore
+            elif output_str is not None:
+                assistant_msg["output"] = output_str # type: ignore
+            if scope is not None:
+                assistant_msg["scope"] = scope # type: ignore
+            if pending is not None:
+                assistant_msg["pending_id"] = pending[0] # type: ignore
 
-        st.session_state.messages.append(assistant_msg) # type: ignore
\ No newline at end of file
+            st.session_state.messages.append(assistant_msg) # type: ignore
+            turn.set(has_code=code_block is not None, has_sql=sql_block is not None, failed=failed)
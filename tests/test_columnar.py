@@ -0,0 +1,46 @@
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from models.columnar import iter_csv_columnar, read_columnar_cache, read_csv_columnar, write_columnar_cache
+
+CSV = 'a,b\n1,\n2,x\n,y\n3,""\n'
+
+
+def test_empty_cells_are_missing_like_pandas(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(CSV)
+    expected = pd.read_csv(path).isna().sum()
+
+    df, error = read_csv_columnar(str(path), cache_dir=str(tmp_path / "cache"))
+    assert error is None
+    assert df.isna().sum().equals(expected)
+
+    cached, _ = read_csv_columnar(str(path), cache_dir=str(tmp_path / "cache"))
+    assert cached.isna().sum().equals(expected)
+
+    chunks = list(iter_csv_columnar(str(path), chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert pd.concat(chunks).isna().sum().to_dict() == expected.to_dict()
+
+
+def test_concurrent_cache_writes_of_one_path(tmp_path):
+    table = pa.table({"a": list(range(100_000))})
+    path = str(tmp_path / "cache" / "data.feather")
+    errors = []
+
+    def write():
+        try:
+            write_columnar_cache(table, path)
+        except Exception as e:  # pragma: no cover - the failure being tested for
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert read_columnar_cache(path).equals(table)
+    assert [p.name for p in (tmp_path / "cache").iterdir()] == ["data.feather"]
@@ -0,0 +1,118 @@
+from benchmarks.fake_llm import FakeGeminiClient
+from models.context_cache import ContextCacheManager
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_manager(**options):
+    client = FakeGeminiClient(seed=0)
+    clock = Clock()
+    manager = ContextCacheManager(
+        client, ttl_seconds=3600, refresh_margin_seconds=600, retry_after_seconds=900, clock=clock, **options
+    )
+    return manager, client, clock
+
+
+def test_creates_once_and_reuses():
+    manager, client, _ = make_manager()
+    name = manager.get_cache_name("model", "fp", "prompt")
+    assert name is not None
+    assert manager.get_cache_name("model", "fp", "prompt") == name
+    assert manager.stats()["created"] == 1
+    assert manager.stats()["reused"] == 1
+    assert manager.chat_config("model", "fp", "prompt") == {"cached_content": name}
+
+
+def test_separate_entries_per_dataset_and_instruction():
+    manager, _, _ = make_manager()
+    names = {
+        manager.get_cache_name("model", "fp1", "prompt"),
+        manager.get_cache_name("model", "fp2", "prompt"),
+        manager.get_cache_name("model", "fp1", "other prompt"),
+    }
+    assert len(names) == 3
+
+
+def test_refreshes_near_expiry_and_recreates_after_it():
+    manager, client, clock = make_manager()
+    updates = []
+    update = client.caches.update
+    client.caches.update = lambda name, config: updates.append(name) or update(name=name, config=config)
+
+    name = manager.get_cache_name("model", "fp", "prompt")
+    clock.now += 3600 - 300  # inside the refresh margin
+    assert manager.get_cache_name("model", "fp", "prompt") == name
+    assert updates == [name]
+    assert manager.stats()["refreshed"] == 1
+
+    clock.now += 3600 + 1  # the refreshed entry has expired
+    renewed = manager.get_cache_name("model", "fp", "prompt")
+    assert renewed is not None and renewed != name
+    assert manager.stats()["created"] == 2
+
+
+def test_recreates_when_refresh_fails():
+    manager, client, clock = make_manager()
+    name = manager.get_cache_name("model", "fp", "prompt")
+    client.caches.delete(name=name)  # gone on the provider side, so update raises
+    clock.now += 3600 - 300
+    renewed = manager.get_cache_name("model", "fp", "prompt")
+    assert renewed is not None and renewed != name
+
+
+def test_backs_off_after_a_failed_create():
+    manager, client, clock = make_manager()
+    create = client.caches.create
+    attempts = []
+
+    def failing_create(model, config):
+        attempts.append(model)
+        raise RuntimeError("content below the minimum size for caching")
+
+    client.caches.create = failing_create
+    assert manager.get_cache_name("model", "fp", "prompt") is None
+    assert manager.chat_config("model", "fp", "prompt") == {"system_instruction": "prompt"}
+    assert len(attempts) == 1  # the failure is remembered, not retried every turn
+
+    client.caches.create = create
+    clock.now += 900 + 1
+    assert manager.get_cache_name("model", "fp", "prompt") is not None
+    assert manager.stats()["created"] == 1
+
+
+def test_entries_are_bounded_and_expired_ones_dropped():
+    manager, client, clock = make_manager(max_entries=2)
+    names = []
+    for fingerprint in ("fp1", "fp2", "fp3"):
+        names.append(manager.get_cache_name("model", fingerprint, "prompt"))
+        clock.now += 1
+    assert manager.stats()["entries"] == 2
+    assert client._cache_names == set(names[1:])  # the evicted context was deleted on the provider
+    # The entry expiring soonest went first.
+    assert manager.get_cache_name("model", "fp1", "prompt") is not None
+    assert manager.stats()["created"] == 4
+
+    clock.now += 3600 * 2
+    manager.get_cache_name("model", "fp4", "prompt")
+    assert manager.stats()["entries"] == 1
+
+
+def test_evicted_contexts_are_deleted_outside_the_lock():
+    manager, client, _ = make_manager(max_entries=1)
+    delete = client.caches.delete
+    held = []
+
+    def checking_delete(name):
+        held.append(manager._lock.locked())
+        delete(name=name)
+
+    client.caches.delete = checking_delete
+    manager.get_cache_name("model", "fp1", "prompt")
+    manager.get_cache_name("model", "fp2", "prompt")
+    assert held == [False]
@@ -0,0 +1,50 @@
+import threading
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from models.isolation import install_thread_isolation  # noqa: E402
+from models.utils import execute_python_code  # noqa: E402
+
+CODE = """
+plt.figure()
+plt.title(name)
+barrier.wait()  # both threads now have a figure open
+print(len(plt.get_fignums()), plt.gca().get_title())
+barrier.wait()
+"""
+
+
+def test_figures_and_output_stay_per_thread():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    barrier = threading.Barrier(2, timeout=10)
+    results = {}
+
+    def run(name):
+        results[name] = execute_python_code(
+            CODE, df, extra_globals={"name": name, "barrier": barrier}, thread_safe=True
+        )
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name in ("first", "second"):
+        output, final_df, figure = results[name]
+        assert output == f"1 {name}"
+        assert final_df is None
+        assert figure is not None and figure.axes[0].get_title() == name
+        plt.close(figure)
+
+
+def test_pyplot_still_works_in_the_calling_thread():
+    figure = plt.figure()
+    install_thread_isolation()
+    assert plt.gcf() is figure
+    plt.close("all")
+    assert plt.get_fignums() == []
@@ -0,0 +1,33 @@
+import pytest
+
+from models.response_cache import ResponseCache, normalize_prompt
+
+
+def key(prompt, prior_prompts=()):
+    return ResponseCache.make_key("model", "schema", "content", prompt, prior_prompts)
+
+
+def test_folds_case_whitespace_and_trailing_punctuation():
+    assert normalize_prompt("  Plot   the SALES by region?") == normalize_prompt("plot the sales by region")
+    assert key("Plot the SALES by region?") == key("plot the sales by region")
+
+
+@pytest.mark.parametrize("first, second", [
+    ("rows where sales > 100", "rows where sales < 100"),
+    ("rows where a == b", "rows where a != b"),
+    ("rows where sales >= 100", "rows where sales > 100"),
+    ("plot price * quantity", "plot price / quantity"),
+    ("plot price + tax", "plot price - tax"),
+    ("plot x ^ 2", "plot x 2"),
+    ("count rows where city = 'Paris'", "count rows where city = Paris"),
+])
+def test_questions_differing_by_an_operator_get_different_keys(first, second):
+    assert key(first) != key(second)
+
+
+def test_keeps_decimal_numbers_and_identifiers():
+    assert normalize_prompt("Mean of lead_source above 1.5") == "mean of lead_source above 1.5"
+
+
+def test_prior_questions_are_part_of_the_key():
+    assert key("and by month?", ["plot sales"]) != key("and by month?", ["plot costs"])
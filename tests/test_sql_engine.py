@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+pytest.importorskip("duckdb")
+
+from models.columnar import read_csv_columnar  # noqa: E402
+from models.sql_engine import SqlEngine  # noqa: E402
+
+CSV = "a,b,c\n1,x,2.5\n2,,3.5\n3,y,\n"
+
+
+@pytest.fixture
+def loaded(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(CSV)
+    cache_dir = str(tmp_path / "cache")
+    df, error = read_csv_columnar(str(path), "fp", cache_dir=cache_dir)
+    assert error is None
+    return df, cache_dir
+
+
+def test_matching_schema_scans_the_columnar_cache(loaded, tmp_path):
+    df, cache_dir = loaded
+    engine = SqlEngine(temp_directory=str(tmp_path / "duckdb"), cache_dir=cache_dir)
+
+    result = engine.query("SELECT sum(a) AS s, count(b) AS n FROM df", engine.dataset_source("fp", df))
+    assert result.to_dict("records") == [{"s": 6, "n": 2}]
+    assert not os.path.exists(engine.source_dir) or not os.listdir(engine.source_dir)
+    assert engine.stats()["source_bytes"] == 0
+
+
+def test_copies_are_bounded_and_removed(loaded, tmp_path):
+    df, cache_dir = loaded
+    engine = SqlEngine(temp_directory=str(tmp_path / "duckdb"), cache_dir=cache_dir, max_source_bytes=1)
+
+    engine.dataset_source("fp", df.assign(a=df["a"].astype("float64")))
+    engine.dataset_source("fp", df.assign(a=df["a"].astype("int32")))
+    assert len(os.listdir(engine.source_dir)) == 1  # the older copy went past the limit
+
+    engine.remove_sources()
+    assert os.listdir(engine.source_dir) == []
+    assert os.listdir(cache_dir) == ["fp.feather"]
@@ -0,0 +1,16 @@
+from models.streaming import iter_stream_events
+from models.utils import extract_python_code_blocks
+
+
+def test_closed_block_is_released_as_code():
+    reply = "Here:\n```python\nprint(1)\n```\nDone."
+    events = list(iter_stream_events([reply[:12], reply[12:25], reply[25:]]))
+    assert ("code", "print(1)") in events
+    assert "".join(text for kind, text in events if kind == "text") == "Here:\nDone."
+
+
+def test_unterminated_block_is_text_not_code():
+    reply = "Here:\n```python\ndf.plot(\n"
+    events = list(iter_stream_events([reply[:10], reply[10:]]))
+    assert [kind for kind, _ in events if kind != "text"] == extract_python_code_blocks(reply) == []
+    assert "".join(text for _, text in events) == reply
@@ -0,0 +1,18 @@
+import pandas as pd
+
+from models.versioned_frame import VersionedFrame
+
+
+def test_owned_bytes_follow_columns_through_pruning():
+    base = pd.DataFrame({"a": range(1000), "b": ["x" * 20] * 1000})
+    versions = VersionedFrame(base, "fp", max_versions=3)
+
+    filtered = versions.commit(base[base["a"] % 2 == 0], "Filter").frame  # new rows: nothing shared
+    assert versions.memory()["owned_bytes"] == int(filtered.memory_usage(deep=True).sum())
+
+    # Later versions keep the filtered columns, so pruning the filter version must not lose their bytes.
+    for i in range(3):
+        versions.commit(versions.frame.assign(**{f"c{i}": 1}), f"Add c{i}")
+    latest = versions.frame
+    assert versions.memory()["versions"] == 3
+    assert versions.memory()["owned_bytes"] == int(latest.memory_usage(deep=True).sum())